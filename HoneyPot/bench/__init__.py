@@ -0,0 +1,10 @@
+"""
+Benchmarks for the honeypot.
+
+    python -m bench.load ...    end-to-end load test of run_honeypot.py on localhost
+                                (SSH brute-forcers + HTTP scanners), results saved as JSON
+    python -m bench.micro ...   microbenchmarks of run_command and PseudoFS, compared
+                                against a stored baseline
+
+Run from the HoneyPot/ directory.
+"""
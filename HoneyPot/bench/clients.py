@@ -0,0 +1,221 @@
+"""
+Simulated attackers for the load benchmark (bench/load.py).
+
+- ssh_bruteforcer: one session against SSHHandler. Banner exchange, then the
+  login:/Password: loop with a few wrong passwords, usually ending on a weak one, and a
+  scripted series of shell commands, each waiting for the prompt, then exit.
+- http_scanner: one keep-alive connection to HTTPHandler requesting a few scanner paths.
+
+run_clients() keeps ssh_clients + http_clients of them busy (each starting a new session
+as soon as its last one ends) until the deadline, recording latencies (seconds) and
+counters in a Stats object.
+"""
+import asyncio
+import random
+import time
+from collections import Counter, defaultdict
+
+CLIENT_BANNER = b"SSH-2.0-libssh_0.9.6\r\n"
+# SSHHandler.weak_credentials accepts these
+WEAK = [("root", "123456"), ("root", "admin"), ("admin", "admin"), ("pi", "raspberry"), ("ubuntu", "ubuntu")]
+WRONG = [("root", "qwerty123"), ("admin", "P@ssw0rd"), ("oracle", "oracle"), ("test", "test1"), ("git", "git")]
+SCRIPT = [
+    "uname -a",
+    "cat /proc/cpuinfo | grep name | wc -l",
+    "cd /tmp",
+    "echo 'IyEvYmluL3NoCg==' > .x.sh",
+    "ls -la",
+    "ps aux",
+    "cat /etc/passwd | head -5",
+    "whoami",
+]
+HTTP_PATHS = ["/", "/robots.txt", "/wp-login.php", "/.env", "/phpmyadmin/", "/admin/config.php",
+              "/cgi-bin/luci", "/HNAP1/"]
+
+READ_SIZE = 65536
+
+
+class Stats:
+    """Latency samples per operation and event counters; picklable as a plain dict."""
+
+    def __init__(self):
+        self.latency = defaultdict(list)
+        self.counts = Counter()
+
+    def add(self, name, seconds):
+        self.latency[name].append(seconds)
+
+    def as_dict(self):
+        return {"latency": dict(self.latency), "counts": dict(self.counts)}
+
+    def merge(self, data):
+        for name, samples in data["latency"].items():
+            self.latency[name].extend(samples)
+        self.counts.update(data["counts"])
+
+
+class Conn:
+    """A client connection with a read buffer and expect()."""
+
+    def __init__(self, reader, writer, timeout):
+        self.reader = reader
+        self.writer = writer
+        self.timeout = timeout
+        self.buf = b""
+
+    @classmethod
+    async def open(cls, host, port, timeout):
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+        return cls(reader, writer, timeout)
+
+    async def expect(self, *tokens):
+        """Read until one of tokens; returns it (None on EOF) and consumes up to it."""
+        while True:
+            best = None
+            for token in tokens:
+                i = self.buf.find(token)
+                if i >= 0 and (best is None or i < best[0]):
+                    best = (i, token)
+            if best is not None:
+                self.buf = self.buf[best[0] + len(best[1]):]
+                return best[1]
+            data = await asyncio.wait_for(self.reader.read(READ_SIZE), self.timeout)
+            if not data:
+                return None
+            self.buf += data
+
+    async def read_until(self, token):
+        """Bytes before token (consumed with it), None on EOF."""
+        while True:
+            i = self.buf.find(token)
+            if i >= 0:
+                data, self.buf = self.buf[:i], self.buf[i + len(token):]
+                return data
+            data = await asyncio.wait_for(self.reader.read(READ_SIZE), self.timeout)
+            if not data:
+                return None
+            self.buf += data
+
+    async def read_exact(self, n):
+        while len(self.buf) < n:
+            data = await asyncio.wait_for(self.reader.read(READ_SIZE), self.timeout)
+            if not data:
+                raise ConnectionError("closed mid-response")
+            self.buf += data
+        data, self.buf = self.buf[:n], self.buf[n:]
+        return data
+
+    async def wait_closed(self):
+        """Read (and drop) everything until the server closes the connection."""
+        self.buf = b""
+        while await asyncio.wait_for(self.reader.read(READ_SIZE), self.timeout):
+            pass
+
+    def send(self, data):
+        self.writer.write(data)
+
+    def close(self):
+        self.writer.close()
+
+
+async def ssh_bruteforcer(host, port, stats, attempts=3, success_rate=0.5, script=SCRIPT, timeout=30.0):
+    start = time.perf_counter()
+    conn = await Conn.open(host, port, timeout)
+    try:
+        if await conn.expect(b"\r\n") is None:
+            raise ConnectionError("no banner")
+        stats.add("ssh_banner", time.perf_counter() - start)
+        conn.send(CLIENT_BANNER)
+
+        creds = random.sample(WRONG, attempts)
+        if random.random() < success_rate:
+            creds[-1] = random.choice(WEAK)
+        prompt = None
+        for user, password in creds:
+            if await conn.expect(b"login: ") is None:
+                break
+            conn.send(user.encode() + b"\r\n")
+            await conn.expect(b"Password: ")
+            t = time.perf_counter()
+            conn.send(password.encode() + b"\r\n")
+            user_prompt = f"{user}@honeypot:~$ ".encode()
+            got = await conn.expect(b"Permission denied", user_prompt)
+            stats.add("ssh_auth", time.perf_counter() - t)
+            stats.counts["ssh_auth_attempts"] += 1
+            if got == user_prompt:
+                prompt = user_prompt
+                break
+        if prompt is None:
+            await conn.wait_closed()
+            stats.counts["ssh_sessions_failed_login"] += 1
+            return
+        for command in script:
+            t = time.perf_counter()
+            conn.send(command.encode() + b"\r\n")
+            if await conn.expect(prompt) is None:
+                raise ConnectionError("closed during command")
+            stats.add("ssh_command", time.perf_counter() - t)
+            stats.counts["ssh_commands"] += 1
+        conn.send(b"exit\r\n")
+        await conn.wait_closed()
+        stats.counts["ssh_sessions_shell"] += 1
+    finally:
+        conn.close()
+        stats.add("ssh_session", time.perf_counter() - start)
+        stats.counts["ssh_sessions"] += 1
+
+
+async def http_scanner(host, port, stats, requests=4, timeout=30.0):
+    start = time.perf_counter()
+    conn = await Conn.open(host, port, timeout)
+    stats.add("http_connect", time.perf_counter() - start)
+    try:
+        for i in range(requests):
+            path = random.choice(HTTP_PATHS)
+            last = i == requests - 1
+            t = time.perf_counter()
+            conn.send(f"GET {path} HTTP/1.1\r\nHost: {host}\r\nUser-Agent: Mozilla/5.0 zgrab/0.x\r\n"
+                      f"Accept: */*\r\nConnection: {'close' if last else 'keep-alive'}\r\n\r\n".encode())
+            head = await conn.read_until(b"\r\n\r\n")
+            if head is None:
+                raise ConnectionError("closed mid-response")
+            length = 0
+            for line in head.split(b"\r\n")[1:]:
+                name, _, value = line.partition(b":")
+                if name.lower() == b"content-length":
+                    length = int(value)
+            await conn.read_exact(length)
+            stats.add("http_request", time.perf_counter() - t)
+            stats.counts[f"http_{head[9:12].decode()}"] += 1
+            stats.counts["http_requests"] += 1
+    finally:
+        conn.close()
+        stats.counts["http_connections"] += 1
+
+
+async def _loop(client, deadline, stats, *args):
+    while time.monotonic() < deadline:
+        try:
+            await client(*args)
+        except (OSError, ConnectionError, asyncio.TimeoutError, asyncio.IncompleteReadError) as e:
+            stats.counts[f"errors_{client.__name__}"] += 1
+            stats.counts[f"error_{type(e).__name__}"] += 1
+            await asyncio.sleep(0.05)
+
+
+async def run_clients(host, ssh_port, http_port, ssh_clients, http_clients, duration,
+                      attempts=3, success_rate=0.5, requests=4, timeout=30.0):
+    """Run the simulated attackers for `duration` seconds; returns Stats.as_dict()."""
+    stats = Stats()
+    deadline = time.monotonic() + duration
+    tasks = [_loop(ssh_bruteforcer, deadline, stats, host, ssh_port, stats, attempts, success_rate, SCRIPT, timeout)
+             for _ in range(ssh_clients if ssh_port else 0)]
+    tasks += [_loop(http_scanner, deadline, stats, host, http_port, stats, requests, timeout)
+              for _ in range(http_clients if http_port else 0)]
+    await asyncio.gather(*tasks)
+    return stats.as_dict()
+
+
+def run_clients_process(kwargs):
+    """multiprocessing entry point: one event loop of clients per process."""
+    return asyncio.run(run_clients(**kwargs))
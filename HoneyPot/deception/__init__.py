@@ -4,8 +4,13 @@ This module provides fake file system and command execution
 for SSH honeypot environments.
 """
 
-from .pseudo_fs import PseudoFS, run_command
+from .pseudo_fs import BaseImage, PseudoFS, run_command
+from .commands import REGISTRY, CommandContext, CommandRegistry, command
+from .latency import (LatencyPolicy, FixedLatency, RandomLatency, AdaptiveTarpit,
+                      make_latency_policy)
 
 __version__ = "1.0.0"
 __author__ = "Honeypot Team"
-__all__ = ['PseudoFS', 'run_command']
\ No newline at end of file
+__all__ = ['BaseImage', 'PseudoFS', 'run_command', 'REGISTRY', 'CommandContext', 'CommandRegistry', 'command',
+           'LatencyPolicy', 'FixedLatency', 'RandomLatency',
+           'AdaptiveTarpit', 'make_latency_policy']
\ No newline at end of file
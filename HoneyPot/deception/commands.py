@@ -0,0 +1,637 @@
+"""
+Command registry for the fake shell.
+
+Every emulated command is a plain function registered under one or more names:
+
+    @command("whoami")
+    def _whoami(ctx, args):
+        return ctx.fs.get_user() + '\\n', True
+
+run_command() resolves a pipeline stage with a single dict lookup, so adding commands
+does not slow down the others. Handlers receive a CommandContext (session filesystem,
+stdin, stderr) and the parsed arguments, and either
+
+- return (output, success): on failure the output is the error message and goes to
+  stderr, or
+- are generators yielding output lines ("...\\n"); they read piped input lazily from
+  ctx.stdin, report errors with ctx.error()/ctx.fail(), and stop pulling input as soon
+  as they are done (head), which is what keeps pipelines streaming (see deception.shell).
+
+Each registration also carries metadata used for introspection and coverage stats:
+
+    reads_stdin   the command consumes piped input (cat, grep, ...)
+    mutates_fs    the command changes the session filesystem (rm, cp, wget, ...)
+    output_size   "none", "small" (fixed-size banner) or "large" (grows with the decoy
+                  content, e.g. cat, find)
+
+Third-party modules can add commands the same way (`from deception import command`).
+"""
+
+import inspect
+import random
+import threading
+import time
+from collections import Counter, deque
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+OUTPUT_SIZES = ("none", "small", "large")
+
+CommandResult = Tuple[str, bool]
+
+
+def iter_lines(text: str) -> Iterator[str]:
+    """Yield the lines of text, keeping their "\\n", without building a list."""
+    start, n = 0, len(text)
+    while start < n:
+        end = text.find("\n", start)
+        if end < 0:
+            yield text[start:]
+            return
+        yield text[start:end + 1]
+        start = end + 1
+
+
+class CommandContext:
+    """What a handler gets besides its arguments."""
+
+    __slots__ = ("fs", "name", "stdin", "shell_name", "ok", "stderr", "dispatch")
+
+    def __init__(self, fs, name: str, stdin: Optional[Iterator[str]] = None, shell_name: str = "bash",
+                 stderr: Optional[Callable[[str], None]] = None,
+                 dispatch: Optional[Callable[[List[str]], Iterator[str]]] = None):
+        self.fs = fs
+        # the name the command was invoked as (handlers can be registered under several)
+        self.name = name
+        # lines from the previous pipeline stage (or a < redirection)
+        self.stdin = stdin if stdin is not None else iter(())
+        self.shell_name = shell_name
+        # exit status; streaming handlers clear it on failure
+        self.ok = True
+        self.stderr = stderr or (lambda text: None)
+        # runs another argv in this stage, same stdin/stderr (sudo)
+        self.dispatch = dispatch
+
+    def error(self, text: str) -> None:
+        self.stderr(text)
+
+    def fail(self, text: str) -> None:
+        self.ok = False
+        self.stderr(text)
+
+
+class CommandSpec:
+    __slots__ = ("name", "func", "reads_stdin", "mutates_fs", "output_size", "streaming")
+
+    def __init__(self, name: str, func: Callable[[CommandContext, List[str]], CommandResult],
+                 reads_stdin: bool = False, mutates_fs: bool = False, output_size: str = "small"):
+        if output_size not in OUTPUT_SIZES:
+            raise ValueError(f"output_size must be one of {OUTPUT_SIZES}, got '{output_size}'")
+        self.name = name
+        self.func = func
+        self.reads_stdin = reads_stdin
+        self.mutates_fs = mutates_fs
+        self.output_size = output_size
+        self.streaming = inspect.isgeneratorfunction(func)
+
+    def as_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "handler": self.func.__name__,
+            "reads_stdin": self.reads_stdin,
+            "mutates_fs": self.mutates_fs,
+            "output_size": self.output_size,
+            "streaming": self.streaming,
+        }
+
+
+class CommandRegistry:
+    """Name -> CommandSpec table, plus counters of what attackers actually ran."""
+
+    def __init__(self):
+        self._specs: Dict[str, CommandSpec] = {}
+        self.calls: Counter = Counter()
+        self.unknown: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def register(self, names: Iterable[str], func, reads_stdin: bool = False, mutates_fs: bool = False,
+                 output_size: str = "small") -> None:
+        for name in names:
+            self._specs[name] = CommandSpec(name, func, reads_stdin, mutates_fs, output_size)
+
+    def command(self, *names: str, reads_stdin: bool = False, mutates_fs: bool = False,
+                output_size: str = "small"):
+        """Decorator form of register(); later registrations replace earlier ones."""
+        def decorator(func):
+            self.register(names, func, reads_stdin, mutates_fs, output_size)
+            return func
+        return decorator
+
+    def get(self, name: str) -> Optional[CommandSpec]:
+        return self._specs.get(name)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._specs
+
+    def names(self) -> List[str]:
+        return sorted(self._specs)
+
+    def specs(self) -> List[dict]:
+        return [self._specs[n].as_dict() for n in self.names()]
+
+    def record(self, name: str, known: bool) -> None:
+        with self._lock:
+            (self.calls if known else self.unknown)[name] += 1
+
+    def coverage(self, observed: Optional[Iterable[str]] = None) -> dict:
+        """
+        Coverage of a set of command names (by default everything recorded so far):
+        how many are emulated and which ones fall through to "command not found".
+        """
+        with self._lock:
+            if observed is None:
+                counts = self.calls + self.unknown
+            else:
+                counts = Counter(observed)
+        missing = {n: c for n, c in counts.items() if n not in self._specs}
+        total = sum(counts.values())
+        return {
+            "registered": len(self._specs),
+            "observed": len(counts),
+            "missing": dict(sorted(missing.items(), key=lambda kv: -kv[1])),
+            "hit_rate": (total - sum(missing.values())) / total if total else 1.0,
+        }
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self.calls.clear()
+            self.unknown.clear()
+
+
+REGISTRY = CommandRegistry()
+command = REGISTRY.command
+
+
+# ---------------------------
+# Built-in commands
+# ---------------------------
+
+def _inputs(ctx, files):
+    """(name, lines) for each input: stdin if no files are given, unreadable files reported."""
+    if not files:
+        yield None, ctx.stdin
+        return
+    for f in files:
+        if f == '-':
+            yield f, ctx.stdin
+            continue
+        try:
+            yield f, iter_lines(ctx.fs.read_text(f))
+        except OSError as e:
+            ctx.fail(f"{ctx.name}: {f}: {e.strerror}")
+
+
+def _line_count(ctx, args, default=10):
+    """Parse head/tail style arguments (-n N, -nN, -N); returns (count, files) or (None, None)."""
+    count, files = str(default), []
+    i = 0
+    while i < len(args):
+        a = args[i]
+        if a == '-n' and i + 1 < len(args):
+            count = args[i + 1]
+            i += 1
+        elif a.startswith('-n'):
+            count = a[2:]
+        elif a.startswith('-') and a[1:].isdigit():
+            count = a[1:]
+        elif a.startswith('-') and a != '-':
+            pass
+        else:
+            files.append(a)
+        i += 1
+    if not count.lstrip('+').isdigit():
+        ctx.fail(f"{ctx.name}: invalid number of lines: '{count}'")
+        return None, None
+    return int(count.lstrip('+')), files
+
+@command("ls", output_size="large")
+def _ls(ctx, args):
+    path = None
+    show_hidden = False
+    long_format = False
+    clean_args = []
+    for a in args:
+        if a.startswith('-'):
+            if 'a' in a:
+                show_hidden = True
+            if 'l' in a:
+                long_format = True
+        else:
+            clean_args.append(a)
+    if clean_args:
+        path = clean_args[0]
+    return ctx.fs.ls(path, show_hidden=show_hidden, long_format=long_format), True
+
+
+@command("cat", reads_stdin=True, output_size="large")
+def _cat(ctx, args):
+    files = [a for a in args if a == '-' or not a.startswith('-')]
+    if not files:
+        # cat reads from previous pipe input
+        first = next(ctx.stdin, None)
+        if first is None:
+            ctx.fail("cat: missing file operand")
+            return
+        yield first
+    for _, lines in _inputs(ctx, files):
+        yield from lines
+
+
+@command("cd", output_size="none")
+def _cd(ctx, args):
+    if not args:
+        ctx.fs.change_directory('/home/user')
+        return "", True
+    if ctx.fs.change_directory(args[0]):
+        return "", True
+    return f"bash: cd: {args[0]}: No such file or directory", False
+
+
+@command("ps")
+def _ps(ctx, args):
+    return ctx.fs.fake_ps(), True
+
+
+@command("uname")
+def _uname(ctx, args):
+    if '-a' in args:
+        return f"Linux {ctx.fs.hostname} 4.15.0-20-generic #21-Ubuntu SMP Tue Apr 24 08:16:15 UTC 2018 x86_64 x86_64 x86_64 GNU/Linux", True
+    if '-r' in args:
+        return "4.15.0-20-generic", True
+    return "Linux", True
+
+
+@command("wget", "curl", mutates_fs=True)
+def _download(ctx, args):
+    url = ""
+    for a in args:
+        if not a.startswith('-'):
+            url = a
+            break
+    if not url:
+        if not args:
+            return f"{ctx.name}: missing URL", False
+        url = 'http://unknown.com/file'
+    fname = f"download_{int(time.time())}_{random.randint(1000,9999)}.bin"
+    dummy_size = random.randint(100, 1024)
+    ctx.fs.add_binary_file(fname, b"\x00" * dummy_size)
+    if ctx.name != 'wget':
+        return f"Downloaded {dummy_size} bytes to {fname}", True
+    host = url.split('//')[-1].split('/')[0]
+    return (f"--{time.strftime('%Y-%m-%d %H:%M:%S')}--  {url}\n"
+            f"Resolving {host}... 192.168.1.100\n"
+            f"Connecting to {host}... connected.\n"
+            f"HTTP request sent, awaiting response... 200 OK\n"
+            f"Length: {dummy_size} (1.0K) [application/octet-stream]\n"
+            f"Saving to: '{fname}'\n\n"
+            f"100%[======================================>] {dummy_size}       --.-K/s   in 0s      \n\n"
+            f"{time.strftime('%Y-%m-%d %H:%M:%S')} ({dummy_size} B/s) - '{fname}' saved [{dummy_size}/{dummy_size}]"), True
+
+
+@command("whoami")
+def _whoami(ctx, args):
+    return ctx.fs.get_user() + '\n', True
+
+
+@command("id")
+def _id(ctx, args):
+    user = ctx.fs.get_user()
+    return f"uid=0({user}) gid=0({user}) groups=0({user})\n", True
+
+
+@command("pwd")
+def _pwd(ctx, args):
+    return ctx.fs.get_current_directory() + '\n', True
+
+
+@command("echo")
+def _echo(ctx, args):
+    newline = '\n'
+    if args and args[0] == '-n':
+        args, newline = args[1:], ''
+    text = ' '.join(args)
+    if (text.startswith('"') and text.endswith('"')) or (text.startswith("'") and text.endswith("'")):
+        text = text[1:-1]
+    return text + newline, True
+
+
+@command("mkdir", mutates_fs=True, output_size="none")
+def _mkdir(ctx, args):
+    for a in args:
+        if not a.startswith('-'):
+            ctx.fs.make_dir(a)
+    return "", True
+
+
+@command("rm", mutates_fs=True)
+def _rm(ctx, args):
+    if not args:
+        return "", True
+    # support -r and -f and -rf and simple filename
+    flags = [a for a in args if a.startswith('-')]
+    targets = [a for a in args if not a.startswith('-')]
+    recursive = any('r' in f for f in flags)
+    if not targets:
+        return "rm: missing operand", False
+    ok_all = True
+    for t in targets:
+        ok = ctx.fs.remove_path(t, recursive=recursive)
+        ok_all = ok_all and ok
+    return ("", True) if ok_all else ("rm: failed to remove some files", False)
+
+
+@command("cp", mutates_fs=True)
+def _cp(ctx, args):
+    operands = [a for a in args if not a.startswith('-')]
+    if len(operands) < 2:
+        return "", True
+    recursive = any(a.startswith('-') and ('r' in a or 'R' in a or 'a' in a) for a in args)
+    src, dst = operands[:2]
+    if ctx.fs.copy(src, dst, recursive=recursive):
+        return "", True
+    if ctx.fs.is_dir(src) and not recursive:
+        return f"cp: -r not specified; omitting directory '{src}'", False
+    return f"cp: cannot stat '{src}': No such file or directory", False
+
+
+@command("mv", mutates_fs=True)
+def _mv(ctx, args):
+    operands = [a for a in args if not a.startswith('-')]
+    if len(operands) < 2:
+        return "", True
+    src, dst = operands[:2]
+    if ctx.fs.move(src, dst):
+        return "", True
+    return f"mv: cannot stat '{src}': No such file or directory", False
+
+
+@command("touch", mutates_fs=True, output_size="none")
+def _touch(ctx, args):
+    if args:
+        ctx.fs.write_file(args[0], "")
+    return "", True
+
+
+@command("true", output_size="none")
+def _true(ctx, args):
+    return "", True
+
+
+@command("false", output_size="none")
+def _false(ctx, args):
+    return "", False
+
+
+@command("chmod", "chown", output_size="none")
+def _noop(ctx, args):
+    return "", True
+
+
+@command("find", output_size="large")
+def _find(ctx, args):
+    paths = []
+    name = ftype = maxdepth = None
+    i = 0
+    while i < len(args):
+        a = args[i]
+        if a in ('-name', '-iname', '-type', '-maxdepth') and i + 1 < len(args):
+            if a in ('-name', '-iname'):
+                name = args[i + 1]
+            elif a == '-type':
+                ftype = args[i + 1]
+            else:
+                maxdepth = int(args[i + 1]) if args[i + 1].isdigit() else None
+            i += 2
+            continue
+        if not a.startswith('-'):
+            paths.append(a)
+        i += 1
+    for p in paths or ['.']:
+        try:
+            for hit in ctx.fs.iter_find(p, name, ftype, maxdepth):
+                yield hit + '\n'
+        except FileNotFoundError:
+            ctx.fail(f"find: '{p}': No such file or directory")
+
+
+@command("grep", reads_stdin=True, output_size="large")
+def _grep(ctx, args):
+    flags = "".join(a[1:] for a in args if a.startswith('-') and len(a) > 1)
+    operands = [a for a in args if not a.startswith('-') or a == '-']
+    if not operands:
+        ctx.fail("usage: grep [OPTION]... PATTERN [FILE]...")
+        return
+    pattern, files = operands[0], operands[1:]
+    ignore_case, invert, count, numbers = ('i' in flags), ('v' in flags), ('c' in flags), ('n' in flags)
+    if ignore_case:
+        pattern = pattern.lower()
+    matched = False
+    for name, lines in _inputs(ctx, files):
+        prefix = f"{name}:" if len(files) > 1 else ""
+        hits = 0
+        for no, line in enumerate(lines, 1):
+            if ((pattern in (line.lower() if ignore_case else line)) != invert):
+                hits += 1
+                if not count:
+                    yield f"{prefix}{no}:{line}" if numbers else prefix + line
+        if count:
+            yield f"{prefix}{hits}\n"
+        matched = matched or hits > 0
+    if not matched:
+        # grep exits 1 when nothing matched
+        ctx.ok = False
+
+
+@command("head", reads_stdin=True, output_size="large")
+def _head(ctx, args):
+    n, files = _line_count(ctx, args)
+    if n is None:
+        return
+    for _, lines in _inputs(ctx, files):
+        # islice stops pulling from the pipe after n lines
+        yield from islice(lines, n)
+
+
+@command("tail", reads_stdin=True, output_size="large")
+def _tail(ctx, args):
+    n, files = _line_count(ctx, args)
+    if n is None:
+        return
+    for _, lines in _inputs(ctx, files):
+        yield from deque(lines, maxlen=n)
+
+
+@command("wc", reads_stdin=True)
+def _wc(ctx, args):
+    flags = "".join(a[1:] for a in args if a.startswith('-') and len(a) > 1)
+    files = [a for a in args if not a.startswith('-') or a == '-']
+    wanted = [c for c in "lwc" if c in flags] or ["l", "w", "c"]
+    words, chars = "w" in wanted, "c" in wanted
+    for name, lines in _inputs(ctx, files):
+        counts = {"l": 0, "w": 0, "c": 0}
+        for line in lines:
+            counts["l"] += 1
+            if words:
+                counts["w"] += len(line.split())
+            if chars:
+                counts["c"] += len(line.encode())
+            if not line.endswith('\n'):
+                # an unterminated last line is not counted by wc -l
+                counts["l"] -= 1
+        values = [counts[c] for c in wanted]
+        if len(values) == 1 and name is None:
+            yield f"{values[0]}\n"
+        else:
+            yield " ".join(f"{v:7d}" for v in values) + (f" {name}" if name else "") + "\n"
+
+
+@command("date")
+def _date(ctx, args):
+    return time.strftime('%a %b %d %H:%M:%S UTC %Y') + '\n', True
+
+
+@command("history", output_size="large")
+def _history(ctx, args):
+    hist = ctx.fs.read_file('.bash_history')
+    numbered = ''
+    i = 1
+    for line in hist.split('\n'):
+        if line:
+            numbered += f" {i:4d}  {line}\n"
+            i += 1
+    return numbered, True
+
+
+@command("which")
+def _which(ctx, args):
+    if not args:
+        return "", True
+    bins = ['/usr/bin', '/bin', '/usr/sbin', '/sbin', '/usr/local/bin']
+    return f"{random.choice(bins)}/{args[0]}\n", True
+
+
+@command("netstat")
+def _netstat(ctx, args):
+    if '-tuln' in args or '-an' in args:
+        return """Active Internet connections (only servers)\nProto Recv-Q Send-Q Local Address           Foreign Address         State      \ntcp        0      0 0.0.0.0:22              0.0.0.0:*               LISTEN     \ntcp        0      0 127.0.0.1:25            0.0.0.0:*               LISTEN     \ntcp6       0      0 :::80                   :::*                    LISTEN     \ntcp6       0      0 :::443                  :::*                    LISTEN     \nudp        0      0 0.0.0.0:68              0.0.0.0:*                           """, True
+    return """Active Internet connections (w/o servers)\nProto Recv-Q Send-Q Local Address           Foreign Address         State      \ntcp        0      0 192.168.1.100:22        192.168.1.50:54321      ESTABLISHED\ntcp        0      0 192.168.1.100:22        192.168.1.51:43210      ESTABLISHED""", True
+
+
+@command("ifconfig", "ip")
+def _ifconfig(ctx, args):
+    return f"""eth0: flags=4163<UP,BROADCAST,RUNNING,MULTICAST>  mtu 1500\n        inet 192.168.1.100  netmask 255.255.255.0  broadcast 192.168.1.255\n        inet6 fe80::20c:29ff:fe12:3456  prefixlen 64  scopeid 0x20<link>\n        ether 00:0c:29:12:34:56  txqueuelen 1000  (Ethernet)\n        RX packets {random.randint(10000, 50000)}  bytes {random.randint(10000000, 50000000)}\n        TX packets {random.randint(5000, 20000)}  bytes {random.randint(5000000, 20000000)}\n\nlo: flags=73<UP,LOOPBACK,RUNNING>  mtu 65536\n        inet 127.0.0.1  netmask 255.0.0.0\n        inet6 ::1  prefixlen 128  scopeid 0x10<host>\n        loop  txqueuelen 1000  (Local Loopback)""", True
+
+
+@command("hostname")
+def _hostname(ctx, args):
+    if '-f' in args or '--fqdn' in args:
+        return f"{ctx.fs.hostname}.local\n", True
+    return f"{ctx.fs.hostname}\n", True
+
+
+@command("uptime")
+def _uptime(ctx, args):
+    uptime_days = random.randint(1, 30)
+    uptime_hours = random.randint(1, 23)
+    users = random.randint(1, 3)
+    load = f"{random.uniform(0.1, 1.5):.2f}, {random.uniform(0.1, 1.5):.2f}, {random.uniform(0.1, 1.5):.2f}"
+    return f" {time.strftime('%H:%M:%S')} up {uptime_days} days, {uptime_hours:02d}:{random.randint(10,59):02d},  {users} user,  load average: {load}\n", True
+
+
+@command("free")
+def _free(ctx, args):
+    return f"""              total        used        free      shared  buff/cache   available\nMem:         1017692       {random.randint(200000,500000)}       {random.randint(300000,600000)}        {random.randint(10000,50000)}       {random.randint(100000,300000)}       {random.randint(400000,700000)}\nSwap:        1048572       {random.randint(0,100000)}       {random.randint(900000,1048572)}""", True
+
+
+@command("df")
+def _df(ctx, args):
+    return f"""Filesystem     1K-blocks    Used Available Use% Mounted on\n/dev/sda1       10188088  {random.randint(2000000,5000000)}   {random.randint(5000000,8000000)}   {random.randint(20,40)}% /\ntmpfs             {random.randint(500000,600000)}     {random.randint(1000,50000)}   {random.randint(450000,550000)}    {random.randint(1,5)}% /dev/shm\ntmpfs              5120        {random.randint(0,100)}       {random.randint(5000,5120)}    {random.randint(1,2)}% /run/lock""", True
+
+
+@command("sudo", reads_stdin=True, mutates_fs=True, output_size="large")
+def _sudo(ctx, args):
+    # treat sudo as pass-through: run the remainder of the command
+    i = 0
+    while i < len(args) and args[i].startswith('-'):
+        # options with a value: -u user, -g group
+        i += 2 if args[i] in ('-u', '-g') else 1
+    if i < len(args) and ctx.dispatch is not None:
+        yield from ctx.dispatch(args[i:])
+    else:
+        yield "usage: sudo -h | -K | -k | -V\n"
+
+
+@command("ssh")
+def _ssh(ctx, args):
+    # Simplified SSH behaviour: if destination provided, simulate connection refused
+    if args:
+        return f"ssh: connect to host {args[0]} port 22: Connection refused\n", False
+    return (
+        "usage: ssh [-46AaCfGgKkMNnqsTtVvXxYy] [-B bind_interface]\n"
+        "           [-b bind_address] [-c cipher_spec] [-D [bind_address:]port]\n"
+        "           [-E log_file] [-e escape_char] [-F configfile] [-I pkcs11]\n"
+        "           [-i identity_file] [-J [user@]host[:port]] [-L address]\n"
+        "           [-l login_name] [-m mac_spec] [-O ctl_cmd] [-o option] [-p port]\n"
+        "           [-Q query_option] [-R address] [-S ctl_path] [-W host:port]\n"
+        "           [-w local_tun[:remote_tun]] destination [command]\n"
+    ), False
+
+
+@command("scp")
+def _scp(ctx, args):
+    return "ssh: connect to host target port 22: Connection timed out\n", False
+
+
+@command("nmap")
+def _nmap(ctx, args):
+    return """Starting Nmap 7.01 ( https://nmap.org ) at 2024-01-15 10:00 UTC\nNote: Host seems down. If it is really up, but blocking our ping probes, try -Pn\nNmap done: 1 IP address (0 hosts up) scanned in 3.00 seconds\n""", False
+
+
+@command("apt", "apt-get")
+def _apt(ctx, args):
+    if not args:
+        return "apt 1.6.12 (amd64)\nUsage: apt command [options]\n", True
+    sub = args[0]
+    if sub == 'update':
+        return """Hit:1 http://archive.ubuntu.com/ubuntu focal InRelease\nGet:2 http://security.ubuntu.com/ubuntu focal-security InRelease [114 kB]\nFetched 228 kB in 1s (230 kB/s)\nReading package lists... Done\n""", True
+    if sub == 'upgrade':
+        return """Reading package lists... Done\nCalculating upgrade... Done\n0 upgraded, 0 newly installed, 0 to remove and 0 not upgraded.\n""", True
+    if sub == 'install' and len(args) >= 2:
+        pkgs = ' '.join(args[1:])
+        return f"Reading package lists... Done\nThe following NEW packages will be installed:\n  {pkgs}\n0 upgraded, 1 newly installed, 0 to remove and 0 not upgraded.\n", True
+    return "", True
+
+
+@command("service", "systemctl")
+def _service(ctx, args):
+    # best-effort simplified handling
+    if len(args) < 2:
+        return "", True
+    if ctx.name == 'service':
+        srv_name, action = args[0], args[1]
+    else:
+        action, srv_name = args[0], args[1]
+    if action == 'status':
+        return (f"● {srv_name}.service - {srv_name} Service\n   Loaded: loaded (/lib/systemd/system/{srv_name}.service; enabled; vendor preset: enabled)\n   Active: active (running) since {time.strftime('%a %Y-%m-%d %H:%M:%S %Z')}; 2 days ago\n Main PID: {random.randint(500, 30000)} ({srv_name})\n"), True
+    return "", True
+
+
+@command("git")
+def _git(ctx, args):
+    if not args:
+        return "usage: git [--version] [--help] [-C <path>] [-c <name>=<value>] ...\n", True
+    sub = args[0]
+    if sub == 'clone' and len(args) >= 2:
+        return (f"Cloning into '{args[1].split('/')[-1].replace('.git','')}'...\n"
+                "remote: Enumerating objects: 100, done.\nReceiving objects: 100% (100/100), 1.20 MiB | 2.40 MiB/s, done.\n"), True
+    return f"git: '{sub}' is not a git command. See 'git --help'.\n", False
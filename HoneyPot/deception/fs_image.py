@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+Compact on-disk filesystem images for PseudoFS.
+
+A realistic decoy tree (tens of thousands of entries) is stored in one file that is
+memory-mapped, never parsed up front:
+
+    header   MAGIC, version, entry count, offsets/lengths of the sections below
+    entries  fixed-size records, breadth-first, so every directory's children are
+             contiguous: (name_off, name_len, flags, mode, mtime, size, ref, count)
+             ref/count = first child index / number of children for directories,
+                         data offset / stored length for files
+    names    UTF-8 names, concatenated
+    data     file bodies (zlib-compressed when that helps, identical bodies stored once)
+
+Loading an image creates only the root node. Directory entries are materialized the
+first time something lists or walks through them, and file bodies are read from the
+mapping only when a command actually reads the file.
+
+Build an image from a real (or chroot'ed) tree:
+
+    python -m deception.fs_image build /srv/ubuntu-root ubuntu.img --max-file-size 65536
+    python -m deception.fs_image info ubuntu.img
+"""
+
+import argparse
+import mmap
+import os
+import stat
+import struct
+import threading
+import zlib
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .pseudo_fs import Inode
+
+MAGIC = b"HPFSIMG1"
+VERSION = 1
+HEADER = struct.Struct("<8sIIQQQQQQ")   # magic, version, n_entries, entries/names/data (offset, length)
+ENTRY = struct.Struct("<IHHIqQQI")      # name_off, name_len, flags, mode, mtime, size, ref, count
+
+F_DIR = 0x1
+F_SYSTEM = 0x2
+F_ZLIB = 0x4
+
+# bodies larger than this are read from the mapping every time instead of cached on the node
+CACHE_LIMIT = 64 * 1024
+
+
+class ImageInode(Inode):
+    """
+    Inode backed by an FSImage record. `children` (directories) and `content` (files)
+    are left unset until first accessed; __getattr__ then loads them from the mapping.
+    """
+
+    __slots__ = ("_image", "_index", "_size")
+
+    def __init__(self, image: "FSImage", index: int, flags: int, mode: int, mtime: int, size: int):
+        self._image = image
+        self._index = index
+        self._size = size
+        if flags & F_DIR:
+            self.content = ""
+        else:
+            self.children = None
+        self.system = bool(flags & F_SYSTEM)
+        self.owner = None
+        self.mode = mode
+        self.mtime = mtime
+
+    def __getattr__(self, attr):
+        if attr == "children":
+            value = self._image.load_children(self._index)
+        elif attr == "content":
+            value = self._image.load_content(self._index)
+            if len(value) > CACHE_LIMIT:
+                return value
+        else:
+            raise AttributeError(attr)
+        # the node is shared by every session: when two threads load it at once, the
+        # first value stored wins, so they all see (and BaseImage fills) one children dict
+        with self._image.lock:
+            try:
+                return object.__getattribute__(self, attr)
+            except AttributeError:
+                setattr(self, attr, value)
+                return value
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+
+class FSImage:
+    """Read-only, memory-mapped image file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        # guards the lazy loading of ImageInode attributes
+        self.lock = threading.Lock()
+        (magic, version, self.n_entries, self._entries_off, _,
+         self._names_off, _, self._data_off, _) = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path}: not a PseudoFS image (or unsupported version)")
+
+    def _entry(self, index: int) -> Tuple[int, ...]:
+        return ENTRY.unpack_from(self._mm, self._entries_off + index * ENTRY.size)
+
+    def _name(self, off: int, length: int) -> str:
+        start = self._names_off + off
+        return self._mm[start:start + length].decode("utf-8", "surrogateescape")
+
+    def _node(self, index: int) -> ImageInode:
+        _, _, flags, mode, mtime, size, _, _ = self._entry(index)
+        return ImageInode(self, index, flags, mode, mtime, size)
+
+    def root(self) -> ImageInode:
+        return self._node(0)
+
+    def load_children(self, index: int) -> Dict[str, Inode]:
+        _, _, flags, _, _, _, first, count = self._entry(index)
+        children: Dict[str, Inode] = {}
+        for i in range(first, first + count):
+            name_off, name_len, cflags, mode, mtime, size, _, _ = self._entry(i)
+            children[self._name(name_off, name_len)] = ImageInode(self, i, cflags, mode, mtime, size)
+        return children
+
+    def load_content(self, index: int) -> str:
+        _, _, flags, _, _, _, off, length = self._entry(index)
+        start = self._data_off + off
+        body = self._mm[start:start + length]
+        if flags & F_ZLIB:
+            body = zlib.decompress(body)
+        return body.decode("utf-8", "replace")
+
+    def close(self) -> None:
+        self._mm.close()
+        self._file.close()
+
+
+# ---------------------------
+# Building images
+# ---------------------------
+
+class _BuildNode:
+    __slots__ = ("children", "flags", "mode", "mtime", "size", "body")
+
+    def __init__(self, is_dir: bool, mode: int = 0, mtime: int = 0, size: int = 0, body: Optional[bytes] = None,
+                 system: bool = False):
+        self.children: Optional[Dict[str, "_BuildNode"]] = {} if is_dir else None
+        self.flags = (F_DIR if is_dir else 0) | (F_SYSTEM if system else 0)
+        self.mode = mode or ((stat.S_IFDIR | 0o755) if is_dir else (stat.S_IFREG | 0o644))
+        self.mtime = int(mtime)
+        self.size = size if size or body is None else len(body)
+        self.body = body
+
+
+def write_image(entries: Iterable[Tuple[str, bool, int, int, int, Optional[bytes], bool]], out_path: str) -> int:
+    """
+    Write an image from (path, is_dir, mode, mtime, size, body, system) tuples.
+    Missing parent directories are created. Returns the number of entries written.
+    """
+    root = _BuildNode(True)
+    for path, is_dir, mode, mtime, size, body, system in entries:
+        parts = [p for p in path.split("/") if p]
+        if not parts:
+            continue
+        node = root
+        for comp in parts[:-1]:
+            child = node.children.get(comp)
+            if child is None or child.children is None:
+                child = node.children[comp] = _BuildNode(True, mtime=mtime)
+            node = child
+        existing = node.children.get(parts[-1])
+        if is_dir and existing is not None and existing.children is not None:
+            existing.mode, existing.mtime = mode or existing.mode, mtime
+            continue
+        node.children[parts[-1]] = _BuildNode(is_dir, mode, mtime, size, body, system)
+
+    # breadth-first numbering keeps each directory's children contiguous
+    order: List[Tuple[str, _BuildNode]] = [("", root)]
+    first_child: List[int] = [0]
+    queue = deque([0])
+    while queue:
+        i = queue.popleft()
+        node = order[i][1]
+        first_child[i] = len(order)
+        if node.children:
+            for name in sorted(node.children):
+                order.append((name, node.children[name]))
+                first_child.append(0)
+                queue.append(len(order) - 1)
+
+    names = bytearray()
+    data = bytearray()
+    seen_bodies: Dict[bytes, Tuple[int, int, int]] = {}
+    records = bytearray()
+    for i, (name, node) in enumerate(order):
+        encoded = name.encode("utf-8", "surrogateescape")
+        name_off = len(names)
+        names += encoded
+        flags = node.flags
+        if node.children is not None:
+            ref, count = first_child[i], len(node.children)
+        elif node.body:
+            stored = seen_bodies.get(node.body)
+            if stored is None:
+                packed = zlib.compress(node.body, 6)
+                zflag = F_ZLIB if len(packed) < len(node.body) else 0
+                payload = packed if zflag else node.body
+                stored = seen_bodies[node.body] = (len(data), len(payload), zflag)
+                data += payload
+            ref, count, zflag = stored
+            flags |= zflag
+        else:
+            ref, count = 0, 0
+        records += ENTRY.pack(name_off, len(encoded), flags, node.mode, node.mtime, node.size, ref, count)
+
+    entries_off = HEADER.size
+    names_off = entries_off + len(records)
+    data_off = names_off + len(names)
+    with open(out_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(order), entries_off, len(records),
+                            names_off, len(names), data_off, len(data)))
+        f.write(records)
+        f.write(names)
+        f.write(data)
+    return len(order)
+
+
+def scan_directory(src: str, max_file_size: int = 64 * 1024,
+                   exclude: Iterable[str] = ("/proc", "/sys", "/dev", "/run")):
+    """
+    Yield write_image() entries for a real directory tree. Bodies are kept only for
+    regular files up to max_file_size; larger files keep their size but no content.
+    """
+    src = os.path.abspath(src)
+    excluded = {e.rstrip("/") for e in exclude}
+    for dirpath, dirnames, filenames in os.walk(src, followlinks=False):
+        rel = os.path.relpath(dirpath, src)
+        rel_dir = "/" if rel == "." else "/" + rel.replace(os.sep, "/")
+        dirnames[:] = [d for d in dirnames if f"{rel_dir.rstrip('/')}/{d}" not in excluded]
+        for name in dirnames + filenames:
+            full = os.path.join(dirpath, name)
+            rel = f"{rel_dir.rstrip('/')}/{name}"
+            try:
+                st = os.lstat(full)
+            except OSError:
+                continue
+            is_dir = stat.S_ISDIR(st.st_mode)
+            body = None
+            if stat.S_ISREG(st.st_mode) and st.st_size <= max_file_size:
+                try:
+                    with open(full, "rb") as f:
+                        body = f.read(max_file_size)
+                except OSError:
+                    body = None
+            yield rel, is_dir, st.st_mode, int(st.st_mtime), 0 if is_dir else st.st_size, body, False
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or inspect PseudoFS images")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build", help="build an image from a directory tree")
+    b.add_argument("src")
+    b.add_argument("out")
+    b.add_argument("--max-file-size", type=int, default=64 * 1024)
+    b.add_argument("--exclude", action="append", default=["/proc", "/sys", "/dev", "/run"])
+    i = sub.add_parser("info", help="print image statistics")
+    i.add_argument("image")
+    args = parser.parse_args(argv)
+
+    if args.cmd == "build":
+        n = write_image(scan_directory(args.src, args.max_file_size, args.exclude), args.out)
+        print(f"[+] Wrote {n} entries to {args.out} ({os.path.getsize(args.out)} bytes)")
+    else:
+        img = FSImage(args.image)
+        print(f"{args.image}: {img.n_entries} entries, {os.path.getsize(args.image)} bytes")
+        img.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Latency policies for the fake shell.
+
+A real host takes a little while to answer a command; answering instantly is an easy
+honeypot tell. The policy only *computes* the delay. Callers decide how to wait:
+the SSH handler awaits asyncio.sleep() so a sleeping attacker costs a timer, not a
+thread, while synchronous callers (run_command's latency argument) use time.sleep().
+"""
+
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Optional
+
+
+class LatencyPolicy:
+    """No delay. Base class for the other policies."""
+
+    def delay(self, ip: Optional[str] = None) -> float:
+        return 0.0
+
+
+class FixedLatency(LatencyPolicy):
+    def __init__(self, seconds: float = 0.05):
+        self.seconds = float(seconds)
+
+    def delay(self, ip: Optional[str] = None) -> float:
+        return self.seconds
+
+
+class RandomLatency(LatencyPolicy):
+    def __init__(self, low: float = 0.02, high: float = 0.15):
+        self.low = float(low)
+        self.high = float(high)
+
+    def delay(self, ip: Optional[str] = None) -> float:
+        return random.uniform(self.low, self.high)
+
+
+class AdaptiveTarpit(LatencyPolicy):
+    """
+    Base random delay, growing for IPs that hammer us.
+
+    Each IP's command timestamps are kept for `window` seconds. Past `threshold`
+    commands per window, every extra command adds `step` seconds, capped at
+    `max_delay`. At most `max_ips` addresses are tracked (least recently seen evicted).
+    """
+
+    def __init__(self, low: float = 0.02, high: float = 0.15, window: float = 10.0, threshold: int = 20,
+                 step: float = 0.05, max_delay: float = 5.0, max_ips: int = 10000):
+        self.base = RandomLatency(low, high)
+        self.window = float(window)
+        self.threshold = int(threshold)
+        self.step = float(step)
+        self.max_delay = float(max_delay)
+        self.max_ips = int(max_ips)
+        self._seen: "OrderedDict[str, deque]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def rate(self, ip: str) -> int:
+        """Commands seen from ip within the current window."""
+        with self._lock:
+            hits = self._seen.get(ip)
+            return len(hits) if hits else 0
+
+    def delay(self, ip: Optional[str] = None) -> float:
+        base = self.base.delay(ip)
+        if ip is None:
+            return base
+        now = time.monotonic()
+        with self._lock:
+            hits = self._seen.get(ip)
+            if hits is None:
+                hits = self._seen[ip] = deque()
+                if len(self._seen) > self.max_ips:
+                    self._seen.popitem(last=False)
+            else:
+                self._seen.move_to_end(ip)
+            hits.append(now)
+            cutoff = now - self.window
+            while hits and hits[0] < cutoff:
+                hits.popleft()
+            excess = len(hits) - self.threshold
+        if excess <= 0:
+            return base
+        return min(base + excess * self.step, self.max_delay)
+
+
+POLICIES = {
+    "none": LatencyPolicy,
+    "fixed": FixedLatency,
+    "random": RandomLatency,
+    "adaptive": AdaptiveTarpit,
+}
+
+# what run_command used to hard-code
+DEFAULT_LATENCY = RandomLatency(0.02, 0.15)
+
+
+def make_latency_policy(cfg: Optional[dict] = None) -> LatencyPolicy:
+    """Build a policy from a config dict, e.g. {"policy": "adaptive", "threshold": 10}."""
+    if not cfg:
+        return DEFAULT_LATENCY
+    cfg = dict(cfg)
+    name = cfg.pop("policy", "random")
+    if name not in POLICIES:
+        raise ValueError(f"Unknown latency policy '{name}', expected one of {sorted(POLICIES)}")
+    return POLICIES[name](**cfg)
@@ -0,0 +1,438 @@
+"""
+Command-line parsing and the streaming pipeline engine behind run_command().
+
+    tokenize()  quote-aware lexer: words ('...', "...", backslash escapes) and operators
+                |  ;  &  &&  ||  <  >  >>  N>  N>>  N>&M  &>  &>>
+    parse()     -> [(connector, [SimpleCommand, ...]), ...] where connector is ";", "&&"
+                or "||" and each inner list is one pipeline
+    execute()   runs the list and returns (output, success) like run_command()
+
+Every pipeline stage is a generator of lines (see deception.commands): a stage pulls
+lines from the previous one only as it needs them, so `cat big | grep x | head -5`
+stops reading `big` after the fifth match, and nothing between stages is held in
+memory except the line in flight. What reaches the terminal (or a redirected file)
+is capped at MAX_OUTPUT characters.
+"""
+
+from collections import deque
+from typing import Deque, List, Optional, Tuple
+
+from .commands import REGISTRY, CommandContext, CommandRegistry, iter_lines
+
+# characters kept per terminal output / redirected file
+MAX_OUTPUT = 1 << 20
+
+WORD = "word"
+OP = "op"
+REDIR = "redir"
+
+
+class ShellSyntaxError(ValueError):
+    pass
+
+
+class SimpleCommand:
+    """One pipeline stage: argv plus (fd, mode, target) redirections in source order."""
+
+    __slots__ = ("argv", "redirects")
+
+    def __init__(self):
+        self.argv: List[str] = []
+        # mode is "<", ">", ">>" (target = path) or ">&" (target = fd to duplicate);
+        # fd -1 means both stdout and stderr (&>, &>>)
+        self.redirects: List[Tuple[int, str, object]] = []
+
+    def __bool__(self) -> bool:
+        return bool(self.argv or self.redirects)
+
+    def __repr__(self):
+        return f"SimpleCommand({self.argv!r}, {self.redirects!r})"
+
+
+# ---------------------------
+# Lexer / parser
+# ---------------------------
+
+def tokenize(line: str) -> List[Tuple[str, object]]:
+    """Split a command line into (WORD, text), (OP, op) and (REDIR, (fd, mode, dup)) tokens."""
+    tokens: List[Tuple[str, object]] = []
+    word: List[str] = []
+    in_word = False
+    quoted = False
+    i, n = 0, len(line)
+
+    def flush():
+        nonlocal in_word, quoted
+        if in_word:
+            tokens.append((WORD, "".join(word)))
+            word.clear()
+        in_word = quoted = False
+
+    while i < n:
+        c = line[i]
+        if c in " \t\r\n":
+            flush()
+            i += 1
+        elif c == "'":
+            end = line.find("'", i + 1)
+            if end < 0:
+                raise ShellSyntaxError("unexpected EOF while looking for matching `''")
+            word.append(line[i + 1:end])
+            in_word = quoted = True
+            i = end + 1
+        elif c == '"':
+            in_word = quoted = True
+            i += 1
+            while True:
+                if i >= n:
+                    raise ShellSyntaxError("unexpected EOF while looking for matching `\"'")
+                c = line[i]
+                if c == '"':
+                    i += 1
+                    break
+                if c == "\\" and i + 1 < n and line[i + 1] in '"\\$`':
+                    word.append(line[i + 1])
+                    i += 2
+                    continue
+                word.append(c)
+                i += 1
+        elif c == "\\":
+            if i + 1 < n:
+                word.append(line[i + 1])
+                in_word = quoted = True
+            i += 2
+        elif c in "<>":
+            # "2>" is a redirection of fd 2, "a2>" or "'2'>" are not
+            fd = None
+            if in_word and not quoted and "".join(word).isdigit():
+                fd = int("".join(word))
+                word.clear()
+                in_word = False
+            flush()
+            if c == "<":
+                tokens.append((REDIR, (0 if fd is None else fd, "<", None)))
+                i += 1
+                continue
+            fd = 1 if fd is None else fd
+            if line.startswith(">>", i):
+                tokens.append((REDIR, (fd, ">>", None)))
+                i += 2
+            elif line.startswith(">&", i):
+                j = i + 2
+                while j < n and line[j].isdigit():
+                    j += 1
+                if j > i + 2:
+                    tokens.append((REDIR, (fd, ">&", int(line[i + 2:j]))))
+                    i = j
+                else:
+                    # ">& file" is the old spelling of "&> file"
+                    tokens.append((REDIR, (-1, ">", None)))
+                    i += 2
+            else:
+                tokens.append((REDIR, (fd, ">", None)))
+                i += 1
+        elif c == "&":
+            flush()
+            if line.startswith("&&", i):
+                tokens.append((OP, "&&"))
+                i += 2
+            elif line.startswith("&>>", i):
+                tokens.append((REDIR, (-1, ">>", None)))
+                i += 3
+            elif line.startswith("&>", i):
+                tokens.append((REDIR, (-1, ">", None)))
+                i += 2
+            else:
+                tokens.append((OP, "&"))
+                i += 1
+        elif c == "|":
+            flush()
+            if line.startswith("||", i):
+                tokens.append((OP, "||"))
+                i += 2
+            else:
+                tokens.append((OP, "|"))
+                i += 1
+        elif c == ";":
+            flush()
+            tokens.append((OP, ";"))
+            i += 1
+        elif c == "#" and not in_word:
+            break
+        else:
+            word.append(c)
+            in_word = True
+            i += 1
+    flush()
+    return tokens
+
+
+def _unexpected(token: Optional[Tuple[str, object]]) -> ShellSyntaxError:
+    if token is None:
+        text = "newline"
+    elif token[0] == OP:
+        text = token[1]
+    else:
+        fd, mode, _ = token[1]
+        text = ("&" if fd == -1 else "") + mode
+    return ShellSyntaxError(f"syntax error near unexpected token `{text}'")
+
+
+def parse(line: str) -> List[Tuple[str, List[SimpleCommand]]]:
+    """Parse a command line into a list of (connector, pipeline)."""
+    tokens = tokenize(line)
+    items: List[Tuple[str, List[SimpleCommand]]] = []
+    connector = ";"
+    pipeline: List[SimpleCommand] = []
+    cmd = SimpleCommand()
+    i = 0
+    while i < len(tokens):
+        kind, value = tokens[i]
+        if kind == WORD:
+            cmd.argv.append(value)
+        elif kind == REDIR:
+            fd, mode, dup = value
+            if mode == ">&":
+                cmd.redirects.append((fd, mode, dup))
+            else:
+                nxt = tokens[i + 1] if i + 1 < len(tokens) else None
+                if nxt is None or nxt[0] != WORD:
+                    raise _unexpected(nxt)
+                cmd.redirects.append((fd, mode, nxt[1]))
+                i += 1
+        elif value == "|":
+            if not cmd:
+                raise _unexpected(tokens[i])
+            pipeline.append(cmd)
+            cmd = SimpleCommand()
+        else:
+            if not cmd:
+                raise _unexpected(tokens[i])
+            pipeline.append(cmd)
+            items.append((connector, pipeline))
+            connector = value if value in ("&&", "||") else ";"
+            pipeline = []
+            cmd = SimpleCommand()
+        i += 1
+    if cmd:
+        pipeline.append(cmd)
+        items.append((connector, pipeline))
+    elif pipeline or connector != ";":
+        # dangling "|", "&&" or "||": an interactive shell would wait for more input
+        raise ShellSyntaxError("syntax error: unexpected end of file")
+    return items
+
+
+# ---------------------------
+# Output sinks
+# ---------------------------
+
+class _Sink:
+    """Collects output up to `limit` characters, keeping separate writes on separate lines."""
+
+    def __init__(self, limit: int = MAX_OUTPUT):
+        self.limit = limit
+        self.chunks: List[str] = []
+        self.size = 0
+
+    @property
+    def full(self) -> bool:
+        return self.size >= self.limit
+
+    def write(self, text: str) -> None:
+        if not text or self.size >= self.limit:
+            return
+        # commands print messages without a trailing newline; don't glue them together
+        if self.chunks and not self.chunks[-1].endswith("\n"):
+            text = "\n" + text
+        text = text[:self.limit - self.size]
+        self.chunks.append(text)
+        self.size += len(text)
+
+    def getvalue(self) -> str:
+        return "".join(self.chunks)
+
+
+class _FileSink(_Sink):
+    def __init__(self, fs, path: str, append: bool):
+        super().__init__()
+        self.fs = fs
+        self.path = path
+        self.append = append
+        if not append:
+            # like the shell, truncate while setting up redirections, before the command runs
+            fs.write_file(path, "")
+
+    def close(self) -> Optional[str]:
+        """Store the output in the file; the error message if it could not be written."""
+        prefix = ""
+        if self.append:
+            try:
+                prefix = self.fs.read_text(self.path)
+            except OSError:
+                pass
+        try:
+            self.fs.write_file(self.path, prefix + self.getvalue())
+        except OSError as e:
+            return e.strerror
+        finally:
+            self.chunks.clear()
+        return None
+
+
+# fd targets besides sinks
+PIPE = "pipe"
+NULL = "null"
+
+
+def _pending_writer(pending: Deque[str]):
+    def write(text: str) -> None:
+        if text:
+            pending.append(text if text.endswith("\n") else text + "\n")
+    return write
+
+
+# ---------------------------
+# Execution
+# ---------------------------
+
+class Shell:
+    """Runs parsed command lines against one session's filesystem."""
+
+    def __init__(self, fs, shell_name: str = "bash", registry: CommandRegistry = REGISTRY,
+                 max_output: int = MAX_OUTPUT):
+        self.fs = fs
+        self.shell_name = shell_name
+        self.registry = registry
+        self.max_output = max_output
+
+    def execute(self, line: str) -> Tuple[str, bool]:
+        try:
+            items = parse(line)
+        except ShellSyntaxError as e:
+            return f"{self.shell_name}: {e}\n", False
+        term = _Sink(self.max_output)
+        ok = True
+        for connector, pipeline in items:
+            if connector == "&&" and not ok or connector == "||" and ok:
+                continue
+            ok = self.run_pipeline(pipeline, term)
+        return term.getvalue(), ok
+
+    def run_pipeline(self, pipeline: List[SimpleCommand], term: _Sink) -> bool:
+        stdin = iter(())
+        stages = []
+        ctx = None
+        for i, cmd in enumerate(pipeline):
+            last = i == len(pipeline) - 1
+            ctx = CommandContext(self.fs, cmd.argv[0] if cmd.argv else "", stdin, self.shell_name)
+            ctx.dispatch = lambda argv, ctx=ctx: self.invoke(argv, ctx)
+            stage = self._stage(cmd, ctx, term, PIPE if not last else term)
+            stages.append(stage)
+            stdin = stage
+        try:
+            # the last stage writes to sinks only; running it pulls the rest of the pipeline
+            for _ in stdin:
+                pass
+        finally:
+            for stage in reversed(stages):
+                stage.close()
+        return ctx.ok
+
+    def _stage(self, cmd: SimpleCommand, ctx: CommandContext, term: _Sink, stdout):
+        """Generator for one stage: applies redirections, yields what goes down the pipe."""
+        fds = {1: stdout, 2: term}
+        files: List[_FileSink] = []
+        infile = None
+        try:
+            for fd, mode, target in cmd.redirects:
+                if mode == "<":
+                    infile = target
+                elif mode == ">&":
+                    fds[fd] = fds.get(target, NULL)
+                else:
+                    sink = NULL if target == "/dev/null" else _FileSink(self.fs, target, mode == ">>")
+                    if sink is not NULL:
+                        files.append(sink)
+                    for f in ((1, 2) if fd == -1 else (fd,)):
+                        fds[f] = sink
+        except Exception:
+            for sink in files:
+                sink.close()
+            raise
+        out, err = fds[1], fds[2]
+        pending: Deque[str] = deque()
+        if err is PIPE:
+            ctx.stderr = _pending_writer(pending)
+        elif err is NULL:
+            ctx.stderr = lambda text: None
+        else:
+            ctx.stderr = err.write
+        return self._run_stage(cmd, ctx, out, pending, infile, files)
+
+    def _run_stage(self, cmd, ctx, out, pending, infile, files):
+        try:
+            if infile is not None:
+                try:
+                    ctx.stdin = iter_lines(self.fs.read_text(infile))
+                except OSError as e:
+                    ctx.fail(f"{self.shell_name}: {infile}: {e.strerror}")
+                    return
+            if not cmd.argv:
+                return
+            for line in self.invoke(cmd.argv, ctx):
+                while pending:
+                    yield pending.popleft()
+                if out is PIPE:
+                    yield line
+                elif out is not NULL:
+                    out.write(line)
+                    if out.full:
+                        break
+            while pending:
+                yield pending.popleft()
+        finally:
+            for sink in files:
+                error = sink.close()
+                if error:
+                    ctx.fail(f"{self.shell_name}: {cmd.argv[0] if cmd.argv else 'write'}: write error: {error}\n")
+
+    def invoke(self, argv: List[str], ctx: CommandContext):
+        """Look up argv[0] and run it as a generator of lines."""
+        name = argv[0]
+        ctx.name = name
+        spec = self.registry.get(name)
+        self.registry.record(name, spec is not None)
+        if spec is None:
+            _drain(ctx.stdin)
+            ctx.fail(f"{self.shell_name}: {name}: command not found\n")
+            return
+        if not spec.reads_stdin:
+            # the upstream stage still runs (and has its side effects) even if nobody reads it
+            _drain(ctx.stdin)
+            ctx.stdin = iter(())
+        result = spec.func(ctx, argv[1:])
+        if spec.streaming:
+            yield from result
+            return
+        text, ok = result
+        ctx.ok = ok
+        if ok:
+            # a program's output ends with a newline even where the handler's text doesn't
+            # (wc -l must count its last line); unterminated lines are left to file contents
+            if text and not text.endswith("\n"):
+                text += "\n"
+            yield from iter_lines(text)
+        else:
+            # plain handlers return their error message as the output
+            ctx.stderr(text)
+
+
+def _drain(lines) -> None:
+    for _ in lines:
+        pass
+
+
+def execute(line: str, fs, shell_name: str = "bash", registry: CommandRegistry = REGISTRY) -> Tuple[str, bool]:
+    """Run a command line against fs and return (output, success) of the last pipeline."""
+    return Shell(fs, shell_name, registry).execute(line)
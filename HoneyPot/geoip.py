@@ -1,45 +1,180 @@
-from geoip2.database import Reader
-import os 
+from geoip2.database import Reader, MODE_AUTO
+from collections import OrderedDict
+import os
+import threading
+import time
+
+from logger import get_logger
+from metrics import get_metrics
+
+log = get_logger("GeoIP")
+
+
+class LookupCache:
+    """
+    Bounded LRU cache with a per-entry TTL, keyed by IP.
+    Botnets come back from the same few thousand addresses, so most lookups hit here.
+    """
+    def __init__(self, maxsize=4096, ttl=3600):
+        self.maxsize = int(maxsize)
+        self.ttl = float(ttl)
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                value, expires = item
+                if expires > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": (self.hits / total) if total else 0.0,
+        }
 
 
 class GeoIP:
-    def __init__(self):
-        self.city_db_path ="geoip/GeoLite2-City.mmdb"
-        self.asn_db_path = "geoip/GeoLite2-ASN.mmdb"
+    """
+    City + ASN lookups. The .mmdb files are memory-mapped once, so a single instance
+    (see get_geoip()) can be shared by every handler and thread.
+    """
+    def __init__(self, city_db_path="geoip/GeoLite2-City.mmdb", asn_db_path="geoip/GeoLite2-ASN.mmdb",
+                 cache_size=4096, cache_ttl=3600):
+        self.city_db_path = city_db_path
+        self.asn_db_path = asn_db_path
 
         self.city_reader = None
         self.asn_reader = None
+        self.cache = LookupCache(cache_size, cache_ttl)
         self.load_database()
 
     def load_database(self):
+        # MODE_AUTO memory-maps the database (C extension if available, pure Python otherwise)
         if os.path.exists(self.city_db_path):
-            self.city_reader = Reader(self.city_db_path)
-        else: 
-            print("[GeoIP] WARNING: City database missing.")
+            self.city_reader = Reader(self.city_db_path, mode=MODE_AUTO)
+        else:
+            log.warning("City database missing: {path}", path=self.city_db_path)
 
         if os.path.exists(self.asn_db_path):
-            self.adn_reader = Reader(self.asn_db_path)
+            self.asn_reader = Reader(self.asn_db_path, mode=MODE_AUTO)
         else:
-               print("[GeoIP] WARNING: ASN database missing.")
+            log.warning("ASN database missing: {path}", path=self.asn_db_path)
 
     def lookup(self, ip):
-        data ={"country":"Unknown", "city":"Unknown", "asn": None, "org": None}
+        cached = self.cache.get(ip)
+        if cached is not None:
+            # callers put the dict into event payloads, hand out a copy
+            return dict(cached)
+
+        data = self._lookup(ip)
+        self.cache.put(ip, data)
+        return dict(data)
+
+    def _lookup(self, ip):
+        data ={"country":"Unknown", "city":"Unknown", "lat": None, "lon": None, "asn": None, "org": None}
 
         try:
             if self.city_reader:
                 resp = self.city_reader.city(ip)
                 data["city"] = resp.city.name or "Unknown"
                 data["country"] = resp.country.name or "Unknown"
-        except:
+                data["lat"] = resp.location.latitude
+                data["lon"] = resp.location.longitude
+        except Exception:
             pass
 
         try:
             if self.asn_reader:
-                resp = self.asn_reader(ip)
-                data["asn"] = resp.automous_system_number
-                data["org"] = resp.automous_system_organization
-        except:
+                resp = self.asn_reader.asn(ip)
+                data["asn"] = resp.autonomous_system_number
+                data["org"] = resp.autonomous_system_organization
+        except Exception:
             pass
 
 
-        return data
\ No newline at end of file
+        return data
+
+    def close(self):
+        for reader in (self.city_reader, self.asn_reader):
+            if reader:
+                reader.close()
+        self.city_reader = None
+        self.asn_reader = None
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def _open(cfg):
+    return GeoIP(
+        city_db_path=cfg.get("city_db", "geoip/GeoLite2-City.mmdb"),
+        asn_db_path=cfg.get("asn_db", "geoip/GeoLite2-ASN.mmdb"),
+        cache_size=cfg.get("cache_size", 4096),
+        cache_ttl=cfg.get("cache_ttl", 3600),
+    )
+
+
+def init_geoip(cfg=None):
+    """(Re)open the process-wide GeoIP instance from a config.GEOIP-style dict."""
+    global _shared
+    cfg = cfg or {}
+    with _shared_lock:
+        # only an explicit re-init closes the readers of the current instance
+        if _shared is not None:
+            _shared.close()
+        _shared = _open(cfg)
+    return _shared
+
+
+def get_geoip():
+    """Process-wide GeoIP instance, opened on first use and reused by every handler."""
+    global _shared
+    shared = _shared
+    if shared is None:
+        with _shared_lock:
+            # another first caller may have opened it while we waited
+            if _shared is None:
+                _shared = _open({})
+            shared = _shared
+    return shared
+
+
+def _cache_stat(name):
+    # read the current instance without opening one
+    return lambda: _shared.cache.stats()[name] if _shared is not None else None
+
+
+_metrics = get_metrics()
+_metrics.callback("honeypot_geoip_cache_hits_total", "GeoIP lookups answered from the cache", "counter",
+                  _cache_stat("hits"))
+_metrics.callback("honeypot_geoip_cache_misses_total", "GeoIP lookups that read the databases", "counter",
+                  _cache_stat("misses"))
+_metrics.callback("honeypot_geoip_cache_hit_ratio", "Cache hits / lookups since start", "gauge",
+                  _cache_stat("hit_ratio"))
+_metrics.callback("honeypot_geoip_cache_size", "IPs in the GeoIP cache", "gauge", _cache_stat("size"))
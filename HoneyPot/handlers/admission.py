@@ -0,0 +1,193 @@
+"""
+Admission control for incoming connections.
+
+Every accepted socket asks admit(ip) before any per-connection work (a thread, a GeoIP
+lookup, storage events) is spent on it:
+
+- a global cap on concurrent connections (max_connections, all listeners together)
+- a per-IP cap on concurrent connections (max_per_ip)
+- a per-IP token bucket on new connections: per_ip_rate per second, bursts of per_ip_burst
+
+Refused connections are "shed": the handler answers with its cheap pre-encoded reject
+response (or holds them in a tarpit, asyncio engine only, up to max_tarpit at a time)
+and closes. Shed connections are only counted, per reason, with at most one summary
+line per log_interval, so a flood costs neither the database nor the log.
+"""
+import threading
+import time
+from collections import Counter
+
+from logger import get_logger
+from metrics import get_metrics
+
+log = get_logger("Admission")
+
+ACTIONS = ("reject", "tarpit")
+
+# shed reasons
+GLOBAL_CAP = "global_cap"
+IP_CAP = "ip_cap"
+IP_RATE = "ip_rate"
+
+
+class _IPState:
+    __slots__ = ("tokens", "stamp", "active")
+
+    def __init__(self, tokens, stamp):
+        self.tokens = tokens
+        self.stamp = stamp
+        self.active = 0
+
+
+class AdmissionControl:
+    """Thread-safe; shared by every listener of the process (see get_admission())."""
+
+    def __init__(self, max_connections=2048, max_per_ip=16, per_ip_rate=2.0, per_ip_burst=10,
+                 action="reject", tarpit_seconds=30.0, max_tarpit=256, max_tracked_ips=100000,
+                 log_interval=60.0, verbose=True):
+        if action not in ACTIONS:
+            raise ValueError(f"Unknown admission action '{action}', expected one of {ACTIONS}")
+        self.max_connections = int(max_connections)
+        self.max_per_ip = int(max_per_ip)
+        self.per_ip_rate = float(per_ip_rate)
+        self.per_ip_burst = float(per_ip_burst)
+        self.action = action
+        self.tarpit_seconds = float(tarpit_seconds)
+        self.max_tarpit = int(max_tarpit)
+        self.max_tracked_ips = int(max_tracked_ips)
+        self.log_interval = float(log_interval)
+        self.verbose = verbose
+
+        self._ips = {}
+        self._lock = threading.Lock()
+        self.active = 0
+        self.tarpitted = 0
+        self.admitted = 0
+        self.shed = Counter()
+        self._shed_since_log = 0
+        self._last_log = time.monotonic()
+
+    @classmethod
+    def from_config(cls, cfg=None, verbose=True):
+        """Build from a config.ADMISSION-style dict."""
+        cfg = cfg or {}
+        return cls(
+            max_connections=cfg.get("max_connections", 2048),
+            max_per_ip=cfg.get("max_per_ip", 16),
+            per_ip_rate=cfg.get("per_ip_rate", 2.0),
+            per_ip_burst=cfg.get("per_ip_burst", 10),
+            action=cfg.get("action", "reject"),
+            tarpit_seconds=cfg.get("tarpit_seconds", 30.0),
+            max_tarpit=cfg.get("max_tarpit", 256),
+            max_tracked_ips=cfg.get("max_tracked_ips", 100000),
+            log_interval=cfg.get("log_interval", 60.0),
+            verbose=verbose,
+        )
+
+    def admit(self, ip):
+        """None if the connection may proceed (call release(ip) when it ends), else the shed reason."""
+        now = time.monotonic()
+        with self._lock:
+            state = self._ips.get(ip)
+            if state is None:
+                if len(self._ips) >= self.max_tracked_ips:
+                    self._sweep(now)
+                state = self._ips[ip] = _IPState(self.per_ip_burst, now)
+            else:
+                state.tokens = min(self.per_ip_burst, state.tokens + (now - state.stamp) * self.per_ip_rate)
+                state.stamp = now
+
+            if self.active >= self.max_connections:
+                reason = GLOBAL_CAP
+            elif state.active >= self.max_per_ip:
+                reason = IP_CAP
+            elif state.tokens < 1.0:
+                reason = IP_RATE
+            else:
+                state.tokens -= 1.0
+                state.active += 1
+                self.active += 1
+                self.admitted += 1
+                return None
+
+            self.shed[reason] += 1
+            self._shed_since_log += 1
+            if self.verbose and now - self._last_log >= self.log_interval:
+                self._log(now)
+        return reason
+
+    def release(self, ip):
+        with self._lock:
+            self.active -= 1
+            state = self._ips.get(ip)
+            if state is not None:
+                state.active -= 1
+
+    def enter_tarpit(self):
+        """Claim a tarpit slot (False when all max_tarpit slots are taken)."""
+        with self._lock:
+            if self.action != "tarpit" or self.tarpitted >= self.max_tarpit:
+                return False
+            self.tarpitted += 1
+            return True
+
+    def leave_tarpit(self):
+        with self._lock:
+            self.tarpitted -= 1
+
+    def _sweep(self, now):
+        # forget IPs with nothing open whose bucket would be full again anyway
+        full = self.per_ip_burst
+        for ip in [ip for ip, s in self._ips.items()
+                   if not s.active and s.tokens + (now - s.stamp) * self.per_ip_rate >= full]:
+            del self._ips[ip]
+
+    def _log(self, now):
+        reasons = ", ".join(f"{r}={n}" for r, n in sorted(self.shed.items()))
+        log.warning("Shed {shed} connections in the last {seconds:.0f}s (active {active}, totals: {reasons})",
+                    shed=self._shed_since_log, seconds=now - self._last_log, active=self.active, reasons=reasons)
+        self._shed_since_log = 0
+        self._last_log = now
+
+    def stats(self):
+        with self._lock:
+            return {
+                "active": self.active,
+                "tarpitted": self.tarpitted,
+                "admitted": self.admitted,
+                "shed": dict(self.shed),
+                "tracked_ips": len(self._ips),
+            }
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def init_admission(cfg=None, verbose=True):
+    """(Re)create the process-wide admission control from a config.ADMISSION-style dict."""
+    global _shared
+    with _shared_lock:
+        _shared = AdmissionControl.from_config(cfg, verbose)
+    return _shared
+
+
+def get_admission():
+    """Process-wide admission control shared by every listener (defaults until init_admission())."""
+    if _shared is None:
+        return init_admission()
+    return _shared
+
+
+def _stat(name):
+    return lambda: get_admission().stats()[name]
+
+
+_metrics = get_metrics()
+_metrics.callback("honeypot_admission_active", "Admitted connections open, all listeners", "gauge", _stat("active"))
+_metrics.callback("honeypot_admission_tarpitted", "Shed connections held in the tarpit", "gauge", _stat("tarpitted"))
+_metrics.callback("honeypot_admission_admitted_total", "Connections admitted", "counter", _stat("admitted"))
+_metrics.callback("honeypot_admission_shed_total", "Connections shed, by reason", "counter",
+                  lambda: {(reason,): n for reason, n in get_admission().stats()["shed"].items()}, ("reason",))
+_metrics.callback("honeypot_admission_tracked_ips", "Source IPs with admission state", "gauge",
+                  _stat("tracked_ips"))
@@ -1,24 +1,192 @@
 
+import asyncio
+import socket
 import threading
 
+from handlers.admission import get_admission
+from handlers.engine import ENGINES, DEFAULT_BACKLOG, get_engine, make_listen_socket, serve_socket
+from handlers.sessions import get_sessions
+from logger import get_logger
+from metrics import get_metrics
+from storage.payloads import get_payloads
+
 class BaseHandler:
     """
     Base class for protocol handlers.
-    Subclasses must implement start_listener() and handle_client().
+    Subclasses must implement the async handle_client(reader, writer) coroutine.
+    The listener engine ("asyncio" or "thread") is picked from the "engine" key of the
+    handler's config.LISTEN entry.
+    Every emitted event also updates the process-wide live session registry
+    (handlers/sessions.py).
+
+    Connections pass the process-wide admission control (handlers/admission.py) before
+    handle_client runs. Shed ones get reject_response, or in the asyncio engine with
+    action="tarpit" are held open for tarpit_seconds, sent tarpit_line every few seconds.
+
+    Captured content (HTTP bodies, files written in the shell) goes to the process-wide
+    payload store (storage/payloads.py); link_payload() ties it to the session.
+
+    Accepted and active connections are counted per listener (labelled with its config
+    name) in the process-wide metrics registry (metrics.py).
     """
+    proto_label = "BASE"
+    # sent to shed connections before closing them (b"" = just close)
+    reject_response = b""
+    tarpit_line = b""
+    tarpit_interval = 5.0
+
     def __init__(self, host, port, cfg, storage, verbose=True):
         self.host = host
         self.port = int(port)
         self.cfg = cfg
         self.storage = storage
         self.verbose = verbose
+        self.log = get_logger(self.proto_label)
+        self.name = cfg.get("name", self.proto_label.lower())
+        self.engine = cfg.get("engine", "thread")
+        self.backlog = int(cfg.get("backlog", DEFAULT_BACKLOG))
+        self.reuse_port = bool(cfg.get("reuse_port", False))
+        self.sessions = get_sessions()
+        self.admission = get_admission()
+        self.payloads = get_payloads()
+        self.metrics = get_metrics()
+        self.accepted = self.metrics.counter(
+            "honeypot_connections_accepted_total", "Connections accepted, admitted or shed",
+            ("handler",)).labels(self.name)
+        self.active = self.metrics.gauge(
+            "honeypot_connections_active", "Admitted connections being served", ("handler",)).labels(self.name)
+        if self.engine not in ENGINES:
+            raise ValueError(f"Unknown engine '{self.engine}' for {cfg.get('name')}, expected one of {ENGINES}")
 
     def emit(self, etype, payload):
+        self.sessions.observe(etype, payload)
         if self.storage:
             self.storage.save_event(etype, payload.get("src_ip","0.0.0.0"), payload.get("src_port",0), payload)
 
+    def link_payload(self, ref, source, name, proto, ip, port, session_id):
+        """Record that session_id produced a payload stored in self.payloads (ref: PayloadRef)."""
+        if ref is None:
+            return
+        self.emit("payload", {
+            "proto": proto,
+            "src_ip": ip,
+            "src_port": port,
+            "session_id": session_id,
+            "sha256": ref.sha256,
+            "size": ref.size,
+            "source": source,
+            "name": name,
+            "new": ref.new,
+            "truncated": ref.truncated
+        })
+
+    async def handle_client(self, reader, writer):
+        raise NotImplementedError
+
+    async def handle_connection(self, reader, writer):
+        """asyncio engine entry point: admission control around handle_client."""
+        ip, _ = self.peer(writer)
+        self.accepted.inc()
+        if self.admission.admit(ip) is not None:
+            await self.shed(writer)
+            return
+        self.active.inc()
+        try:
+            await self.handle_client(reader, writer)
+        finally:
+            self.active.dec()
+            self.admission.release(ip)
+
+    async def shed(self, writer):
+        """Fast path for refused connections: tarpit if a slot is free, else reject."""
+        if self.admission.enter_tarpit():
+            try:
+                remaining = self.admission.tarpit_seconds
+                while remaining > 0 and not writer.is_closing():
+                    if self.tarpit_line:
+                        await self.send(writer, self.tarpit_line)
+                    await asyncio.sleep(min(self.tarpit_interval, remaining))
+                    remaining -= self.tarpit_interval
+            except Exception:
+                pass
+            finally:
+                self.admission.leave_tarpit()
+        elif self.reject_response:
+            writer.write(self.reject_response)
+        writer.close()
+
+    # ---------------------------
+    # Stream helpers for handle_client
+    # ---------------------------
+    @staticmethod
+    def peer(writer):
+        addr = writer.get_extra_info("peername") or ("0.0.0.0", 0)
+        return addr[0], addr[1]
+
+    @staticmethod
+    async def send(writer, data, session=None):
+        writer.write(data)
+        await writer.drain()
+        if session is not None:
+            session.bytes_out += len(data)
+
+    @staticmethod
+    async def recv(reader, n, timeout, session=None):
+        data = await asyncio.wait_for(reader.read(n), timeout)
+        if session is not None:
+            session.bytes_in += len(data)
+        return data
+
+    @staticmethod
+    async def close(writer):
+        try:
+            writer.close()
+            await writer.wait_closed()
+        except Exception:
+            pass
+
+    # ---------------------------
+    # Listeners
+    # ---------------------------
+    def start_listener(self):
+        """Thread engine accept loop: one thread per accepted socket."""
+        s = make_listen_socket(self.host, self.port, self.backlog, self.reuse_port)
+        if self.verbose:
+            self.log.info("Listening on {host}:{port}", host=self.host, port=self.port)
+        while True:
+            client, addr = s.accept()
+            self.accepted.inc()
+            if self.admission.admit(addr[0]) is not None:
+                # shed before a thread is spent on it (no tarpit in this engine)
+                self.reject(client)
+                continue
+            self.active.inc()
+            t = threading.Thread(target=self._serve_admitted, args=(client, addr[0]), daemon=True)
+            t.start()
+
+    def _serve_admitted(self, client, ip):
+        try:
+            serve_socket(self, client)
+        finally:
+            self.active.dec()
+            self.admission.release(ip)
+
+    def reject(self, client):
+        try:
+            if self.reject_response:
+                client.send(self.reject_response, socket.MSG_DONTWAIT)
+        except OSError:
+            pass
+        client.close()
+
     def start(self):
-        t = threading.Thread(target=self.start_listener, daemon=True)
-        t.start()
+        if self.engine == "asyncio":
+            engine = get_engine()
+            engine.add(self)
+            engine.start()
+        else:
+            t = threading.Thread(target=self.start_listener, daemon=True)
+            t.start()
         if self.verbose:
-            print(f"[+] Started handler {self.__class__.__name__} on {self.host}:{self.port}")
+            self.log.info("Started handler {handler} on {host}:{port}",
+                          handler=self.__class__.__name__, host=self.host, port=self.port)
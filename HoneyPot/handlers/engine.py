@@ -0,0 +1,161 @@
+# handlers/engine.py
+"""
+Listener engines.
+
+Every handler speaks the same async contract (BaseHandler.handle_client(reader, writer)),
+and an engine decides how sockets are accepted and which event loop runs the coroutine.
+Both check admission control (handlers/admission.py) first:
+
+- "asyncio": all handlers share ONE event loop running in a single thread. An idle
+  attacker session costs a coroutine frame and a transport, not an OS thread, so a
+  single process can hold tens of thousands of concurrent sessions.
+- "thread": legacy mode. Blocking accept loop, one thread (with its own short-lived
+  event loop) per accepted socket.
+
+The engine is selected per listener with the "engine" key in config.LISTEN.
+"""
+import asyncio
+import socket
+import threading
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+
+ENGINES = ("asyncio", "thread")
+DEFAULT_BACKLOG = 1024
+
+
+def raise_nofile_limit():
+    """Lift the soft RLIMIT_NOFILE to the hard limit so we can hold many sockets."""
+    if resource is None:
+        return None
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY or soft < hard:
+        target = hard if hard != resource.RLIM_INFINITY else max(soft, 65536)
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+            soft = target
+        except (ValueError, OSError):
+            pass
+    return soft
+
+
+def make_listen_socket(host, port, backlog=DEFAULT_BACKLOG, reuse_port=False):
+    # proto=IPPROTO_TCP, not 0: accepted sockets inherit it, and asyncio only turns on
+    # TCP_NODELAY for sockets whose proto says TCP (otherwise a prompt written after the
+    # command echo waits ~40 ms for the client's delayed ACK)
+    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP)
+    s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        # several worker processes bind the same port, the kernel balances accepts
+        if not hasattr(socket, "SO_REUSEPORT"):
+            raise OSError("SO_REUSEPORT is not supported on this platform")
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    s.bind((host, port))
+    s.listen(backlog)
+    return s
+
+
+class AsyncEngine:
+    """
+    Runs the listeners of every asyncio-mode handler on one shared event loop.
+    The loop lives in a daemon thread so run_honeypot's main thread stays free.
+    """
+    def __init__(self):
+        self.loop = None
+        self.thread = None
+        self.handlers = []
+        self.servers = []
+        self._ready = threading.Event()
+        self._error = None
+
+    def add(self, handler):
+        self.handlers.append(handler)
+        if self.loop is not None:
+            asyncio.run_coroutine_threadsafe(self._serve(handler), self.loop).result()
+
+    def start(self):
+        if self.thread is not None:
+            return
+        raise_nofile_limit()
+        self.thread = threading.Thread(target=self._run, name="asyncio-engine", daemon=True)
+        self.thread.start()
+        self._ready.wait()
+        if self._error is not None:
+            raise self._error
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            for h in self.handlers:
+                self.loop.run_until_complete(self._serve(h))
+        except Exception as e:
+            # e.g. port already in use: surface it in start() instead of hanging
+            self._error = e
+            self.loop.close()
+            self.loop = None
+            return
+        finally:
+            self._ready.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.close()
+
+    async def _serve(self, handler):
+        sock = make_listen_socket(handler.host, handler.port, handler.backlog, handler.reuse_port)
+        # start_server re-runs listen() on the socket: keep our backlog, not asyncio's 100,
+        # or a burst of connects overflows the accept queue and SYNs are dropped
+        server = await asyncio.start_server(handler.handle_connection, sock=sock, backlog=handler.backlog)
+        self.servers.append(server)
+        if handler.verbose:
+            handler.log.info("Listening on {host}:{port} (asyncio)", host=handler.host, port=handler.port)
+
+    def stop(self):
+        if self.loop is None:
+            return
+
+        async def _close():
+            for server in self.servers:
+                server.close()
+            for server in self.servers:
+                await server.wait_closed()
+
+        try:
+            asyncio.run_coroutine_threadsafe(_close(), self.loop).result(timeout=5)
+        except Exception:
+            pass
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=5)
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    """Process-wide AsyncEngine (one event loop shared by every asyncio handler)."""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = AsyncEngine()
+        return _engine
+
+
+def serve_socket(handler, conn):
+    """Thread engine: drive handler.handle_client for one accepted socket on a private loop."""
+    async def _run():
+        reader, writer = await asyncio.open_connection(sock=conn)
+        await handler.handle_client(reader, writer)
+
+    try:
+        asyncio.run(_run())
+    except Exception:
+        try:
+            conn.close()
+        except Exception:
+            pass
@@ -1,40 +1,155 @@
 # handlers/http_handler.py
-import socket, threading
+import asyncio
+import time
+
 from handlers.base import BaseHandler
+from handlers.http_parser import HTTPParser
+from handlers.http_routes import ResponseCache
+from geoip import get_geoip
+
+READ_SIZE = 65536
+
 
 class HTTPHandler(BaseHandler):
+    """
+    HTTP/1.1 decoy (Apache on Ubuntu). Requests are parsed incrementally (handlers/
+    http_parser.py), connections are kept alive and pipelined requests are answered in
+    order with one write per received chunk. Responses are pre-encoded at startup
+    (handlers/http_routes.py, extended by the listener's "routes"). Every request is
+    logged as an http_request event with its method, target, headers and body; with
+    capture_bodies, bodies are also streamed into the payload store (storage/payloads.py).
+    """
+    proto_label = "HTTP"
+    reject_response = (b"HTTP/1.1 503 Service Unavailable\r\nServer: Apache/2.4.18 (Ubuntu)\r\n"
+                       b"Retry-After: 60\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+
     def __init__(self, host, port, cfg, storage, verbose=True):
         super().__init__(host, port, cfg, storage, verbose)
-        self.banner = cfg.get("banner", "HTTP/1.1 200 OK")
-
-    def start_listener(self):
-        s = socket.socket()
-        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        s.bind((self.host, self.port))
-        s.listen(100)
-        if self.verbose:
-            print(f"[HTTP] Listening on {self.host}:{self.port}")
-        while True:
-            client, addr = s.accept()
-            t = threading.Thread(target=self.handle_client, args=(client, addr), daemon=True)
-            t.start()
-
-    def handle_client(self, conn, addr):
-        ip, port = addr[0], addr[1]
-        try:
-            conn.settimeout(2.0)
-            data = conn.recv(8192)
-            req_line = data.decode(errors='ignore').splitlines()[0] if data else ""
-        except Exception:
-            req_line = ""
-        self.emit("connection", {"proto":"http", "src_ip":ip, "src_port":port, "request":req_line})
-        body = "<html><body><h1>Apache/2.4.18 (Ubuntu)</h1></body></html>"
-        resp = "HTTP/1.1 200 OK\r\nServer: Apache/2.4.18 (Ubuntu)\r\nContent-Length: %d\r\nContent-Type: text/html\r\n\r\n%s" % (len(body), body)
+        # Apache defaults: KeepAliveTimeout 5, MaxKeepAliveRequests 100
+        self.keepalive_timeout = float(cfg.get("keepalive_timeout", 5))
+        self.max_requests = int(cfg.get("max_requests", 100))
+        # a request must arrive completely within this many seconds (slowloris)
+        self.request_timeout = float(cfg.get("request_timeout", 20))
+        # captured bodies are streamed to disk, so they may be larger than buffered ones
+        self.capture_bodies = bool(cfg.get("capture_bodies", True))
+        self.max_body = int(cfg.get("max_body", (16 << 20) if self.capture_bodies else (1 << 20)))
+        # bodies longer than this are logged truncated (body_size has the full length)
+        self.max_log_body = int(cfg.get("max_log_body", 64 * 1024))
+        self.requests = self.metrics.counter(
+            "honeypot_http_requests_total", "HTTP requests answered, by status", ("handler", "status"))
+        self.responses = ResponseCache(cfg.get("routes"), host="localhost", port=self.port,
+                                       keepalive_timeout=self.keepalive_timeout, max_requests=self.max_requests)
+        # one child per status this listener can answer with, so counting a request is one inc()
+        self.requests_by_status = {status: self.requests.labels(self.name, status)
+                                   for status in self.responses.statuses()}
+
+    async def handle_client(self, reader, writer):
+        ip, port = self.peer(writer)
+        start = time.time()
+        session_id = f"{ip}_{port}_{int(start)}"
+        self.emit("connection", {
+            "proto": "http",
+            "src_ip": ip,
+            "src_port": port,
+            "geo": get_geoip().lookup(ip),
+            "session_id": session_id
+        })
+        session = self.sessions.get(session_id)
+
+        spool = (lambda req: self.payloads.writer()) if self.capture_bodies else None
+        parser = HTTPParser(max_body=self.max_body, spool=spool, keep_body=self.max_log_body)
+        served = 0
+        deadline = None
         try:
-            conn.sendall(resp.encode())
-        except Exception:
+            while served < self.max_requests:
+                # idle between requests: keep-alive timeout; mid-request: what is left of request_timeout
+                now = time.monotonic()
+                if parser.pending:
+                    deadline = deadline or now + self.request_timeout
+                    timeout = deadline - now
+                else:
+                    deadline = None
+                    timeout = self.keepalive_timeout if served else self.request_timeout
+                try:
+                    data = await self.recv(reader, READ_SIZE, max(timeout, 0.001), session)
+                except asyncio.TimeoutError:
+                    if parser.pending:
+                        await self.send(writer, self.responses.error(408), session)
+                    break
+                if not data:
+                    break
+                requests = parser.feed(data)
+                if not requests and parser.error is None:
+                    continue
+                deadline = None
+
+                out = []
+                close = False
+                for req in requests:
+                    served += 1
+                    keep = req.keep_alive and served < self.max_requests
+                    response = self.responses.lookup(req.method, req.path)
+                    out.append(self.responses.render(response, keep, req.method == "HEAD"))
+                    self.log_request(ip, port, session_id, req, response.status)
+                    if not keep:
+                        close = True
+                        break
+                if parser.error is not None and not close:
+                    # answer what was complete before the bad request, then the error, and close
+                    out.append(self.responses.error(parser.error.status))
+                    self.log_error(ip, port, session_id, parser.error, data)
+                    close = True
+                await self.send(writer, b"".join(out), session)
+                if close:
+                    break
+        except (ConnectionError, OSError):
             pass
-        try:
-            conn.close()
-        except:
-            pass
\ No newline at end of file
+        finally:
+            parser.close()
+            self.emit("session_end", {
+                "proto": "http",
+                "src_ip": ip,
+                "src_port": port,
+                "session_id": session_id,
+                "duration": time.time() - start
+            })
+            await self.close(writer)
+
+    def count_request(self, status):
+        child = self.requests_by_status.get(status)
+        if child is None:
+            child = self.requests_by_status[status] = self.requests.labels(self.name, status)
+        child.inc()
+
+    def log_request(self, ip, port, session_id, req, status):
+        self.count_request(status)
+        if req.payload is not None:
+            self.link_payload(req.payload, "http_body", req.path, "http", ip, port, session_id)
+        self.emit("http_request", {
+            "proto": "http",
+            "src_ip": ip,
+            "src_port": port,
+            "session_id": session_id,
+            "method": req.method,
+            "path": req.path,
+            "query": req.query,
+            "version": req.version,
+            "headers": req.header_dict(),
+            "body": req.body[:self.max_log_body].decode("utf-8", "replace"),
+            "body_size": req.body_size,
+            "status": status,
+            "sha256": req.payload.sha256 if req.payload is not None else None,
+            "truncated": req.payload.truncated if req.payload is not None else False
+        })
+
+    def log_error(self, ip, port, session_id, err, data):
+        self.count_request(err.status)
+        self.emit("http_request", {
+            "proto": "http",
+            "src_ip": ip,
+            "src_port": port,
+            "session_id": session_id,
+            "error": str(err),
+            "raw": data[:1024].decode("latin-1"),
+            "status": err.status
+        })
@@ -0,0 +1,268 @@
+"""
+Incremental HTTP/1.x request parser.
+
+feed() takes whatever the socket returned and gives back every request completed by it,
+so a connection can deliver requests split across many packets or several pipelined in
+one. Bodies are read by Content-Length or chunked Transfer-Encoding. Scanners are
+sloppy, so bare-LF line endings and blank lines before a request are accepted, like
+Apache does.
+
+Bodies are consumed as they arrive. With a `spool` (a callable returning a writer with
+write/close/abort for a request, e.g. storage.payloads.PayloadStore.writer), body bytes
+go straight to it and only the first keep_body bytes stay in memory; close()'s result
+ends up in request.payload.
+
+Malformed or oversized input stops the parser: the requests completed before it are
+still returned, and `error` holds the HTTPError with the status to answer before closing.
+"""
+from urllib.parse import unquote
+
+MAX_LINE = 8190          # Apache LimitRequestLine / LimitRequestFieldSize
+MAX_HEADER = 65536       # whole header block
+MAX_HEADERS = 100        # Apache LimitRequestFields
+MAX_BODY = 1 << 20
+
+_HEAD, _LENGTH, _CHUNK_SIZE, _CHUNK_DATA, _CHUNK_END, _TRAILER = range(6)
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message=""):
+        super().__init__(message or str(status))
+        self.status = status
+
+
+class HTTPRequest:
+    __slots__ = ("method", "target", "path", "query", "version", "headers", "fields", "body", "body_size",
+                 "payload", "keep_alive")
+
+    def __init__(self, method, target, version, headers):
+        self.method = method
+        self.target = target
+        path, _, self.query = target.partition("?")
+        self.path = unquote(path)
+        self.version = version
+        self.headers = headers                                 # [(name, value)] as received
+        self.fields = {k.lower(): v for k, v in headers}       # last value wins
+        self.body = b""          # whole body, or its first keep_body bytes when spooled
+        self.body_size = 0
+        self.payload = None      # what the spool writer's close() returned
+        conn = self.fields.get("connection", "").lower()
+        if version == "HTTP/1.1":
+            self.keep_alive = "close" not in conn
+        else:
+            self.keep_alive = "keep-alive" in conn
+
+    def header(self, name, default=None):
+        return self.fields.get(name.lower(), default)
+
+    def header_dict(self):
+        """Headers with their received names, repeated ones joined with ", " (for logging)."""
+        out = {}
+        for k, v in self.headers:
+            out[k] = f"{out[k]}, {v}" if k in out else v
+        return out
+
+
+class HTTPParser:
+    def __init__(self, max_line=MAX_LINE, max_header=MAX_HEADER, max_body=MAX_BODY, spool=None, keep_body=0):
+        self.max_line = max_line
+        self.max_header = max_header
+        self.max_body = max_body
+        self.spool = spool
+        self.keep_body = keep_body
+        self._buf = bytearray()
+        self._state = _HEAD
+        self._req = None
+        self._remaining = 0
+        self._chunk_left = 0
+        self._body = bytearray()
+        self._body_size = 0
+        self._sink = None
+        self.error = None
+
+    @property
+    def pending(self):
+        """True while a request is partially received."""
+        return self._state != _HEAD or bool(self._buf.strip(b"\r\n"))
+
+    def feed(self, data):
+        """Add received bytes; return the list of requests they completed (check `error` after)."""
+        done = []
+        if self.error is not None:
+            return done
+        self._buf += data
+        try:
+            self._parse(done)
+        except HTTPError as e:
+            self.error = e
+            self.close()
+        return done
+
+    def close(self):
+        """Abort the spool writer of a request left incomplete (call when the connection ends)."""
+        if self._sink is not None:
+            self._sink.abort()
+            self._sink = None
+
+    def _parse(self, done):
+        buf = self._buf
+        while True:
+            state = self._state
+            if state == _HEAD:
+                # blank lines between pipelined requests are tolerated
+                skip = 0
+                while skip < len(buf) and buf[skip] in b"\r\n":
+                    skip += 1
+                if skip:
+                    del buf[:skip]
+                end = buf.find(b"\n\r\n")
+                lf = buf.find(b"\n\n")
+                if lf >= 0 and (end < 0 or lf < end):
+                    head_len, sep = lf, 2
+                elif end >= 0:
+                    head_len, sep = end, 3
+                else:
+                    if len(buf) > self.max_header:
+                        raise HTTPError(431)
+                    if buf.find(b"\n") < 0 and len(buf) > self.max_line:
+                        raise HTTPError(414)
+                    return
+                if head_len > self.max_header:
+                    raise HTTPError(431)
+                head = bytes(buf[:head_len])
+                del buf[:head_len + sep]
+                req = self._req = self._parse_head(head)
+                te = req.fields.get("transfer-encoding")
+                if te is not None:
+                    if te.lower().rsplit(",", 1)[-1].strip() != "chunked":
+                        raise HTTPError(501)
+                    self._state = _CHUNK_SIZE
+                    self._remaining = 0
+                    self._start_body(req)
+                    continue
+                length = req.fields.get("content-length")
+                if length:
+                    if not length.isdigit():
+                        raise HTTPError(400, "bad Content-Length")
+                    n = int(length)
+                    if n > self.max_body:
+                        raise HTTPError(413)
+                    if n:
+                        self._remaining = n
+                        self._state = _LENGTH
+                        self._start_body(req)
+                        continue
+                done.append(self._finish())
+            elif state == _LENGTH:
+                if not buf:
+                    return
+                n = min(self._remaining, len(buf))
+                self._add_body(buf, n)
+                self._remaining -= n
+                if self._remaining:
+                    return
+                done.append(self._finish())
+            elif state == _CHUNK_SIZE:
+                nl = buf.find(b"\n")
+                if nl < 0:
+                    if len(buf) > self.max_line:
+                        raise HTTPError(400, "bad chunk size")
+                    return
+                line = bytes(buf[:nl]).split(b";", 1)[0].strip()
+                del buf[:nl + 1]
+                try:
+                    size = int(line, 16)
+                except ValueError:
+                    raise HTTPError(400, "bad chunk size")
+                self._remaining += size
+                if self._remaining > self.max_body:
+                    raise HTTPError(413)
+                if size == 0:
+                    self._state = _TRAILER
+                else:
+                    self._state = _CHUNK_DATA
+                    self._chunk_left = size
+            elif state == _CHUNK_DATA:
+                if not buf:
+                    return
+                n = min(self._chunk_left, len(buf))
+                self._add_body(buf, n)
+                self._chunk_left -= n
+                if self._chunk_left:
+                    return
+                self._state = _CHUNK_END
+            elif state == _CHUNK_END:
+                # CRLF (or bare LF) after the chunk data
+                if not buf or (buf[0] == 0x0d and len(buf) < 2):
+                    return
+                if buf[0] == 0x0a:
+                    del buf[:1]
+                elif buf[0] == 0x0d and buf[1] == 0x0a:
+                    del buf[:2]
+                else:
+                    raise HTTPError(400, "bad chunk data")
+                self._state = _CHUNK_SIZE
+            else:  # _TRAILER: header lines until an empty one, ignored
+                nl = buf.find(b"\n")
+                if nl < 0:
+                    if len(buf) > self.max_header:
+                        raise HTTPError(431)
+                    return
+                line = buf[:nl].strip()
+                del buf[:nl + 1]
+                if not line:
+                    done.append(self._finish())
+
+    def _start_body(self, req):
+        self._body = bytearray()
+        self._body_size = 0
+        if self.spool is not None:
+            self._sink = self.spool(req)
+
+    def _add_body(self, buf, n):
+        data = bytes(buf[:n])
+        del buf[:n]
+        self._body_size += n
+        if self._sink is None:
+            self._body += data
+            return
+        self._sink.write(data)
+        keep = self.keep_body - len(self._body)
+        if keep > 0:
+            self._body += data[:keep]
+
+    def _finish(self):
+        req, self._req = self._req, None
+        self._state = _HEAD
+        if self._body_size:
+            req.body = bytes(self._body)
+            req.body_size = self._body_size
+            self._body = bytearray()
+            self._body_size = 0
+        if self._sink is not None:
+            req.payload = self._sink.close()
+            self._sink = None
+        return req
+
+    def _parse_head(self, head):
+        lines = head.decode("latin-1").splitlines()
+        parts = lines[0].split()
+        if len(parts) != 3 or not parts[2].startswith("HTTP/"):
+            raise HTTPError(400, "bad request line")
+        if len(lines[0]) > self.max_line:
+            raise HTTPError(414)
+        method, target, version = parts
+        if len(lines) > MAX_HEADERS + 1:
+            raise HTTPError(431)
+        max_line = self.max_line
+        headers = []
+        append = headers.append
+        for line in lines[1:]:
+            name, sep, value = line.partition(":")
+            # no whitespace inside or around a field name (request smuggling vector)
+            if not sep or not name or " " in name or "\t" in name:
+                raise HTTPError(400, "bad header line")
+            if len(line) > max_line:
+                raise HTTPError(431)
+            append((name, value.strip()))
+        return HTTPRequest(method, target, version, headers)
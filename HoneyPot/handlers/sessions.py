@@ -0,0 +1,148 @@
+"""
+In-memory registry of live attacker sessions.
+
+BaseHandler.emit() feeds every event to the registry before it goes to storage:
+
+    connection    (with a session_id) opens a session
+    auth_attempt  counts login attempts, remembers the username and whether it worked
+    command       counts shell commands (http_request: HTTP requests, same counter)
+    session_end   closes the session and adds its totals to the event payload, which
+                  storage writes as the single consolidated `sessions` row
+
+Byte counts come from BaseHandler.send()/recv() when the handler passes the session.
+The live view (active(), by_ip(), len()) is plain memory, so monitoring "who is
+connected right now" never touches the database. Each process has its own registry:
+with --workers N every worker sees only the sessions it accepted.
+"""
+import threading
+import time
+
+from metrics import get_metrics
+
+
+class Session:
+    __slots__ = ("session_id", "proto", "src_ip", "src_port", "country", "username", "start", "last_seen",
+                 "attempts", "authenticated", "commands", "bytes_in", "bytes_out")
+
+    def __init__(self, session_id, proto, src_ip, src_port, country=None, start=None):
+        self.session_id = session_id
+        self.proto = proto
+        self.src_ip = src_ip
+        self.src_port = src_port
+        self.country = country
+        self.username = ""
+        self.start = self.last_seen = start or time.time()
+        self.attempts = 0
+        self.authenticated = False
+        self.commands = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def as_dict(self):
+        d = {name: getattr(self, name) for name in self.__slots__}
+        d["duration"] = time.time() - self.start
+        return d
+
+
+class SessionRegistry:
+    """Live sessions keyed by session_id. Thread-safe (thread engine handlers share it)."""
+
+    def __init__(self):
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.closed = 0
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def __contains__(self, session_id):
+        return session_id in self._sessions
+
+    def get(self, session_id):
+        return self._sessions.get(session_id)
+
+    def observe(self, etype, payload):
+        """Update the registry from an emitted event (payload may be extended in place)."""
+        sid = payload.get("session_id")
+        if sid is None:
+            return
+        if etype == "connection":
+            geo = payload.get("geo") or {}
+            session = Session(sid, payload.get("proto"), payload.get("src_ip"), payload.get("src_port"),
+                              geo.get("country"))
+            with self._lock:
+                self._sessions[sid] = session
+                self.opened += 1
+            return
+        if etype == "session_end":
+            with self._lock:
+                session = self._sessions.pop(sid, None)
+                if session is not None:
+                    self.closed += 1
+            if session is not None:
+                payload.update(self.summary(session, payload))
+            return
+        session = self._sessions.get(sid)
+        if session is None:
+            return
+        session.last_seen = time.time()
+        if etype == "auth_attempt":
+            session.attempts += 1
+            session.username = payload.get("user", session.username)
+            if payload.get("success"):
+                session.authenticated = True
+        elif etype == "command" or etype == "http_request":
+            session.commands += 1
+
+    @staticmethod
+    def summary(session, payload):
+        """Totals added to the session_end payload."""
+        return {
+            "start_time": session.start,
+            "duration": time.time() - session.start,
+            "user": payload.get("user") or session.username,
+            "authenticated": session.authenticated,
+            "attempts": session.attempts,
+            "commands": session.commands,
+            "bytes_in": session.bytes_in,
+            "bytes_out": session.bytes_out,
+        }
+
+    # ---------------------------
+    # Live view
+    # ---------------------------
+    def active(self):
+        """Snapshots (dicts) of every open session, oldest first."""
+        with self._lock:
+            sessions = list(self._sessions.values())
+        return [s.as_dict() for s in sorted(sessions, key=lambda s: s.start)]
+
+    def by_ip(self):
+        """{src_ip: open sessions} for the currently connected attackers."""
+        counts = {}
+        with self._lock:
+            for s in self._sessions.values():
+                counts[s.src_ip] = counts.get(s.src_ip, 0) + 1
+        return counts
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def get_sessions():
+    """Process-wide registry used by every handler."""
+    global _shared
+    if _shared is None:
+        with _shared_lock:
+            if _shared is None:
+                _shared = SessionRegistry()
+    return _shared
+
+
+_metrics = get_metrics()
+_metrics.callback("honeypot_sessions_active", "Sessions open in this process", "gauge",
+                  lambda: len(get_sessions()))
+_metrics.callback("honeypot_sessions_opened_total", "Sessions opened", "counter", lambda: get_sessions().opened)
+_metrics.callback("honeypot_sessions_closed_total", "Sessions closed", "counter", lambda: get_sessions().closed)
@@ -1,13 +1,46 @@
-import socket, threading, time
+import asyncio, time
+from concurrent.futures import ThreadPoolExecutor
 from handlers.base import BaseHandler
-from deception import PseudoFS, run_command
-from geoip import GeoIP
+from handlers.terminal import LineDiscipline, LINE, INTERRUPT, EOF
+from deception import BaseImage, PseudoFS, run_command, make_latency_policy
+from deception.pseudo_fs import MAX_FILE_SIZE, SESSION_QUOTA
+from geoip import get_geoip
+
+READ_SIZE = 4096
+
 
 class SSHHandler(BaseHandler):
+    proto_label = "SSH"
+    # like sshd over MaxStartups: shed connections are closed without a banner;
+    # tarpitted ones get empty lines, which clients skip while waiting for the version
+    tarpit_line = b"\r\n"
+
     def __init__(self, host, port, cfg, storage, verbose=True):
         super().__init__(host, port, cfg, storage, verbose)
         self.banner = cfg.get("banner", "SSH-2.0-OpenSSH_7.6p1")
         self.session_timeout = cfg.get("session_timeout", 60)
+        # realism / tarpit delay before each command, awaited so it holds no thread
+        self.latency = make_latency_policy(cfg.get("latency"))
+        # decoy filesystem, loaded once and shared copy-on-write by every session
+        self.fs_image = BaseImage.get(image_path=cfg.get("fs_image"))
+        # files written in the shell (echo/printf/cat redirections) go to the payload store
+        self.capture_files = bool(cfg.get("capture_files", True))
+        # what one session may write into its decoy filesystem (see deception.pseudo_fs)
+        self.max_file_size = int(cfg.get("max_file_size", MAX_FILE_SIZE))
+        self.fs_quota = int(cfg.get("fs_quota", SESSION_QUOTA))
+        # commands run here, not on the event loop: a session grepping a big file
+        # must not stall every other session of the process
+        self.shell_pool = ThreadPoolExecutor(int(cfg.get("shell_threads", 4)), thread_name_prefix="ssh-shell")
+
+        self.auth_attempts = self.metrics.counter(
+            "honeypot_auth_attempts_total", "Login attempts checked", ("handler",)).labels(self.name)
+        self.auth_successes = self.metrics.counter(
+            "honeypot_auth_successes_total", "Login attempts accepted", ("handler",)).labels(self.name)
+        self.commands = self.metrics.counter(
+            "honeypot_commands_total", "Shell commands run", ("handler",)).labels(self.name)
+        # run_command only: the realism/tarpit delay before it is not included
+        self.command_seconds = self.metrics.histogram(
+            "honeypot_command_seconds", "run_command latency", ("handler",)).labels(self.name)
 
         self.weak_credentials = {
             "root": ["root", "admin", "password", "123456", "toor", ""],
@@ -18,44 +51,55 @@ class SSHHandler(BaseHandler):
             "": [""],
         }
 
-    def start_listener(self):
-        s = socket.socket()
-        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        s.bind((self.host, self.port))
-        s.listen(100)
-        if self.verbose:
-            print(f"[SSH] Listening on {self.host}:{self.port}")
-
-        while True:
-            client, addr = s.accept()
-            t = threading.Thread(target=self.handle_client, args=(client, addr), daemon=True)
-            t.start()
-
     def check_credentials(self, username, password):
+        self.auth_attempts.inc()
         if username in self.weak_credentials:
             if password in self.weak_credentials[username]:
+                self.auth_successes.inc()
                 return True
         return False
 
-    def handle_client(self, conn, addr):
-        ip, port = addr[0], addr[1]
-        session_id = f"{ip}_{int(time.time())}"
+    async def read_line(self, reader, term, timeout, session=None):
+        """
+        Return the next complete line from the terminal, reading more input in
+        chunks as needed. None means the client closed or sent ^D.
+        """
+        while True:
+            event = term.next_event()
+            if event is not None:
+                kind, text, _ = event
+                if kind == LINE:
+                    return text
+                if kind == EOF:
+                    return None
+                continue    # ^C at the login prompt: keep waiting
+            data = await self.recv(reader, READ_SIZE, timeout, session)
+            if not data:
+                return None
+            term.feed(data)
+
+    async def handle_client(self, reader, writer):
+        ip, port = self.peer(writer)
+        start = time.time()
+        # the port keeps two connections from one IP in the same second apart
+        session_id = f"{ip}_{port}_{int(start)}"
 
         # GeoIP lookup
-        geo = GeoIP()
-        geo_data = geo.lookup(ip)
+        geo_data = get_geoip().lookup(ip)
 
         # send banner
         try:
-            conn.sendall((self.banner + "\r\n").encode())
+            await self.send(writer, (self.banner + "\r\n").encode())
         except Exception:
-            conn.close()
+            await self.close(writer)
             return
 
+        # login input is not echoed; anything the client sends ahead stays buffered
+        term = LineDiscipline(echo=False)
+
         # Read client banner
         try:
-            conn.settimeout(5.0)
-            client_banner = conn.recv(4096).decode(errors='ignore').strip()
+            client_banner = (await self.read_line(reader, term, 5.0) or "").strip()
         except Exception:
             client_banner = ""
 
@@ -69,6 +113,8 @@ class SSHHandler(BaseHandler):
             "geo": geo_data,                  # ← GEOIP DATA ADDED
             "session_id": session_id
         })
+        # live registry entry, counts bytes from here on
+        session = self.sessions.get(session_id)
 
         max_attempts = 3
         authenticated = False
@@ -76,15 +122,22 @@ class SSHHandler(BaseHandler):
 
         for attempt in range(max_attempts):
             try:
-                conn.sendall(b"login: ")
+                await self.send(writer, b"login: ", session)
                 # FIX 1: Add a timeout to prevent indefinite blocking during login
-                conn.settimeout(30.0) 
-                username = conn.recv(1024).decode(errors='ignore').strip()
+                username = await self.read_line(reader, term, 30.0, session)
 
-                conn.sendall(b"Password: ")
-                # FIX 1: Add a timeout to prevent indefinite blocking during password entry
-                conn.settimeout(30.0) 
-                password = conn.recv(1024).decode(errors='ignore').strip()
+                if username is not None:
+                    await self.send(writer, b"Password: ", session)
+                    # FIX 1: Add a timeout to prevent indefinite blocking during password entry
+                    password = await self.read_line(reader, term, 30.0, session)
+                else:
+                    password = None
+                if username is None or password is None:
+                    # client went away mid-login
+                    username = ""
+                    break
+                username, password = username.strip(), password.strip()
+                authenticated = self.check_credentials(username, password)
 
                 self.emit("auth_attempt", {
                     "proto": "ssh",
@@ -93,118 +146,143 @@ class SSHHandler(BaseHandler):
                     "user": username,
                     "pass": password,
                     "attempt": attempt + 1,
-                    "session_id": session_id
+                    "session_id": session_id,
+                    "success": authenticated
                 })
 
-                if self.check_credentials(username, password):
-                    authenticated = True
-                    conn.sendall(b"\r\nWelcome to Ubuntu 20.04.3 LTS (GNU/Linux 5.4.0-42-generic x86_64)\r\n\r\n")
-                    conn.sendall(f"Last login: {time.strftime('%a %b %d %H:%M:%S %Y')} from 192.168.1.1\r\n".encode())
+                if authenticated:
+                    await self.send(writer, b"\r\nWelcome to Ubuntu 20.04.3 LTS (GNU/Linux 5.4.0-42-generic x86_64)\r\n\r\n"
+                                    + f"Last login: {time.strftime('%a %b %d %H:%M:%S %Y')} from 192.168.1.1\r\n".encode(),
+                                    session)
                     break
                 else:
-                    conn.sendall(b"\r\nPermission denied, please try again.\r\n")
+                    await self.send(writer, b"\r\nPermission denied, please try again.\r\n", session)
 
             except Exception as e:
                 if self.verbose:
-                    print(f"[SSH] Auth error from {ip}: {e}")
+                    self.log.error("Auth error from {ip}: {error}", ip=ip, error=e)
                 break
 
         if not authenticated:
             try:
-                conn.sendall(b"\r\nToo many authentication failures\r\n")
-                conn.close()
-            except:
+                await self.send(writer, b"\r\nToo many authentication failures\r\n", session)
+            except Exception:
                 pass
+            self.emit("session_end", {
+                "proto": "ssh",
+                "src_ip": ip,
+                "src_port": port,
+                "user": username,
+                "session_id": session_id,
+                "duration": time.time() - start
+            })
+            await self.close(writer)
             return
 
-        # Start shell
-        self.run_shell_session(conn, ip, port, username, session_id)
-
-    def run_shell_session(self, conn, ip, port, username, session_id):
-        fs = PseudoFS()
+        # Start shell, keeping any type-ahead the client already sent
+        term.echo = True
+        await self.run_shell_session(reader, writer, ip, port, username, session_id, term)
+
+    async def run_shell_session(self, reader, writer, ip, port, username, session_id, term=None):
+        fs = PseudoFS(image=self.fs_image, max_file_size=self.max_file_size, quota=self.fs_quota)
+        term = term or LineDiscipline()
+        start = time.time()
+        session = self.sessions.get(session_id)
+        # path -> last content written; captured once when the session ends, so a file
+        # built up with `>>` is stored as its final content, not once per append
+        written = {}
+        if self.capture_files:
+            fs.on_write = written.__setitem__
 
         try:
-            prompt = f"{username}@honeypot:~$ "
-            conn.sendall(prompt.encode())
+            prompt = f"{username}@honeypot:~$ ".encode()
+            await self.send(writer, prompt, session)
+
+            done = False
+            while not done and time.time() - start < self.session_timeout:
+                # replay lines buffered during login before reading more
+                if not term.events:
+                    try:
+                        data = await self.recv(reader, READ_SIZE, 30, session)
+                    except asyncio.TimeoutError:
+                        break
+                    if not data:
+                        break
+                    term.feed(data)
 
-            start = time.time()
-            command_buffer = ""
+                # one write for the chunk: each line's echo, then what that line printed
+                out = bytearray()
 
-            while time.time() - start < self.session_timeout:
-                conn.settimeout(30)
+                while term.events:
+                    kind, line, echo = term.next_event()
+                    out += echo
 
-                try:
-                    data = conn.recv(1)
-                    if not data:
+                    if kind == EOF:
+                        done = True
                         break
 
-                    char = data.decode(errors='ignore')
-
-                    if char in ('\r', '\n'):
-                        if command_buffer.strip():
-                            cmd = command_buffer.strip()
-
-                            self.emit("command", {
-                                "proto": "ssh",
-                                "src_ip": ip,
-                                "src_port": port,
-                                "user": username,
-                                "command": cmd,
-                                "session_id": session_id
-                            })
-
-                            if cmd.lower() in ("exit", "quit", "logout"):
-                                conn.sendall(b"\r\nlogout\r\n")
-                                break
-
-                            output_result = run_command(cmd, fs, shell_name="bash")
-                            
-                            # FIX 2: Check for tuple return and extract the string output.
-                            # The 'tuple' object has no attribute 'encode' error is fixed here.
-                            if isinstance(output_result, tuple):
-                                # Assuming the output string is the first element.
-                                output = output_result[0]
-                            else:
-                                output = output_result
-                            
-                            if output:
-                                conn.sendall(b"\r\n" + output.encode() + b"\r\n")
-                            else:
-                                conn.sendall(b"\r\n")
-                        else:
-                            conn.sendall(b"\r\n")
-
-                        command_buffer = ""
-                        conn.sendall(prompt.encode())
+                    if kind == INTERRUPT:
+                        out += b"\r\n" + prompt
                         continue
 
-                    elif char in ('\x7f', '\x08'):
-                        if command_buffer:
-                            command_buffer = command_buffer[:-1]
-                            conn.sendall(b'\x08 \x08')
+                    cmd = line.strip()
+                    if not cmd:
+                        out += prompt
                         continue
 
-                    elif char == '\x03':
-                        command_buffer = ""
-                        conn.sendall(b"^C\r\n" + prompt.encode())
-                        continue
-
-                    elif char == '\x04':
+                    self.emit("command", {
+                        "proto": "ssh",
+                        "src_ip": ip,
+                        "src_port": port,
+                        "user": username,
+                        "command": cmd,
+                        "session_id": session_id
+                    })
+
+                    if cmd.lower() in ("exit", "quit", "logout"):
+                        out += b"logout\r\n"
+                        done = True
                         break
 
-                    elif ord(char) >= 32:
-                        command_buffer += char
-                        conn.sendall(data)
-                        continue
-
-                except socket.timeout:
-                    break
+                    if out:
+                        await self.send(writer, bytes(out), session)
+                        out.clear()
+
+                    delay = self.latency.delay(ip)
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    t = time.perf_counter()
+                    output_result = await asyncio.get_running_loop().run_in_executor(
+                        self.shell_pool, run_command, cmd, fs, "bash", None)
+                    self.command_seconds.observe(time.perf_counter() - t)
+                    self.commands.inc()
+
+                    # FIX 2: Check for tuple return and extract the string output.
+                    # The 'tuple' object has no attribute 'encode' error is fixed here.
+                    if isinstance(output_result, tuple):
+                        # Assuming the output string is the first element.
+                        output = output_result[0]
+                    else:
+                        output = output_result
+
+                    if output:
+                        out += output.encode() + b"\r\n"
+                    out += prompt
+
+                # what was typed after the last complete line
+                if not term.events:
+                    out += term.take_echo()
+                if out:
+                    await self.send(writer, bytes(out), session)
 
             # The shell error (if it happens) is caught here.
         except Exception as e:
-            print(f"[SSH] Shell error from {ip}: {e}")
+            self.log.error("Shell error from {ip}: {error}", ip=ip, error=e)
 
         finally:
+            for path, content in written.items():
+                self.link_payload(self.payloads.put(content.encode("utf-8", "surrogateescape")),
+                                  "shell_write", path, "ssh", ip, port, session_id)
             self.emit("session_end", {
                 "proto": "ssh",
                 "src_ip": ip,
@@ -214,7 +292,4 @@ class SSHHandler(BaseHandler):
                 "duration": time.time() - start
             })
 
-            try:
-                conn.close()
-            except:
-                pass
+            await self.close(writer)
@@ -0,0 +1,97 @@
+# handlers/terminal.py
+"""
+Buffered line discipline for the fake SSH terminal.
+
+Input is fed in large chunks (whatever one recv() returned) and processed in bulk:
+runs of printable characters are appended and echoed in one piece, and the control
+characters the shell cares about are handled in place:
+
+    \\r, \\n, \\r\\n   end of line   -> ("line", text, echo), echo "\\r\\n"
+    \\x7f, \\x08     backspace     -> erase last char, echo "\\b \\b"
+    \\x03           ^C            -> ("interrupt", None, echo), line discarded, echo "^C"
+    \\x04           ^D            -> ("eof", None, echo)
+
+Other control characters are dropped. Each event carries the echo of the input that
+led up to it, terminator included, and take_echo() returns what was typed after the
+last one, so the handler can put every line's echo right before that command's output
+(as a tty does) and still answer a pasted script with one write.
+"""
+import codecs
+import re
+from collections import deque
+
+_CONTROL = re.compile(r"[\x00-\x1f\x7f]")
+
+LINE = "line"
+INTERRUPT = "interrupt"
+EOF = "eof"
+
+
+class LineDiscipline:
+    def __init__(self, echo=True, max_line=65536):
+        self.echo = echo
+        self.max_line = max_line
+        self.events = deque()
+        self._buf = ""
+        self._echo = bytearray()
+        self._after_cr = False
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+
+    def feed(self, data):
+        """Process one chunk of raw input; completed events are queued on self.events."""
+        text = self._decoder.decode(data)
+        pos = 0
+        for m in _CONTROL.finditer(text):
+            if m.start() > pos:
+                self._append(text[pos:m.start()])
+            self._control(m.group())
+            pos = m.end()
+        if pos < len(text):
+            self._append(text[pos:])
+
+    def _append(self, run):
+        self._after_cr = False
+        room = self.max_line - len(self._buf)
+        if room <= 0:
+            return
+        run = run[:room]
+        self._buf += run
+        if self.echo:
+            self._echo += run.encode()
+
+    def _control(self, ch):
+        after_cr, self._after_cr = self._after_cr, False
+        if ch in ("\r", "\n"):
+            if ch == "\n" and after_cr:
+                # second half of a \r\n pair
+                return
+            self._event(LINE, self._buf, b"\r\n")
+            self._buf = ""
+            self._after_cr = ch == "\r"
+        elif ch in ("\x7f", "\x08"):
+            if self._buf:
+                self._buf = self._buf[:-1]
+                if self.echo:
+                    self._echo += b"\x08 \x08"
+        elif ch == "\x03":
+            self._buf = ""
+            self._event(INTERRUPT, None, b"^C")
+        elif ch == "\x04":
+            self._event(EOF, None, b"")
+        elif ch == "\x00" and after_cr:
+            # telnet-style \r\0 line ending
+            self._after_cr = True
+
+    def _event(self, kind, text, echo):
+        if self.echo:
+            self._echo += echo
+        self.events.append((kind, text, self.take_echo()))
+
+    def take_echo(self):
+        """Return (and clear) the echo collected since the last event (or call)."""
+        out = bytes(self._echo)
+        self._echo.clear()
+        return out
+
+    def next_event(self):
+        return self.events.popleft() if self.events else None
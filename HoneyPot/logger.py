@@ -0,0 +1,270 @@
+"""
+Queue-backed structured logging for the server.
+
+Handlers, storage and the supervisor log through a Logger bound to a component name:
+
+    log = get_logger("SSH")
+    log.error("Auth error from {ip}: {error}", ip=ip, error=e)
+
+The calling thread (possibly the event loop serving every attacker) only checks the
+level and puts (time, level, component, template, fields) on a queue. One background
+thread does everything else: str.format, JSON encoding, duplicate suppression and the
+write itself, so a slow or blocked console can never stall a session. When the queue is
+full, records are dropped and counted instead of waiting.
+
+Output is one line per record, "text" (time, level, [component] message) or "json" (an
+object with ts, level, component, pid, msg and the raw fields). A template, component and
+source ip logged more than suppress_after times within suppress_interval seconds is
+muted for the rest of the interval, then summarized in one line:
+
+    [SSH] 312 more like "Auth error from 203.0.113.9: timed out" suppressed in the last 10s
+
+init_logging(config.LOGGING) configures the process-wide sink; loggers created before
+that (at import time) pick up the new configuration. Forked workers get a fresh queue
+and thread.
+"""
+import atexit
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+from metrics import get_metrics
+
+DEBUG, INFO, WARNING, ERROR = 10, 20, 30, 40
+LEVELS = {"debug": DEBUG, "info": INFO, "warning": WARNING, "error": ERROR}
+LEVEL_NAMES = {v: k for k, v in LEVELS.items()}
+FORMATS = ("text", "json")
+
+_STOP = object()
+
+
+def _render(template, fields):
+    if not fields:
+        return template
+    try:
+        return template.format(**fields)
+    except (KeyError, IndexError, ValueError):
+        # a template that doesn't match its fields still logs everything
+        return template + " " + " ".join(f"{k}={v}" for k, v in fields.items())
+
+
+class LogSink:
+    """The queue and the background thread that formats and writes records."""
+
+    def __init__(self, level="info", format="text", file=None, queue_size=10000,
+                 suppress_after=5, suppress_interval=10.0, stream=None):
+        if level not in LEVELS:
+            raise ValueError(f"Unknown log level '{level}', expected one of {tuple(LEVELS)}")
+        if format not in FORMATS:
+            raise ValueError(f"Unknown log format '{format}', expected one of {FORMATS}")
+        self.level = LEVELS[level]
+        self.format = format
+        self.file = file
+        self.queue_size = int(queue_size)
+        self.suppress_after = int(suppress_after)
+        self.suppress_interval = float(suppress_interval)
+        self._stream = stream
+        self.dropped = 0
+        self.suppressed = 0
+        # (component, template, ip) -> [window start, count in window, muted count, last record]
+        self._windows = {}
+        self._start()
+
+    @classmethod
+    def from_config(cls, cfg=None):
+        """Build from a config.LOGGING-style dict."""
+        cfg = cfg or {}
+        return cls(
+            level=cfg.get("level", "info"),
+            format=cfg.get("format", "text"),
+            file=cfg.get("file"),
+            queue_size=cfg.get("queue_size", 10000),
+            suppress_after=cfg.get("suppress_after", 5),
+            suppress_interval=cfg.get("suppress_interval", 10.0),
+        )
+
+    def _start(self):
+        self._queue = queue.SimpleQueue()
+        # tells --workers processes apart in JSON output
+        self._pid = os.getpid()
+        self._out = self._stream or (open(self.file, "a", buffering=1) if self.file else sys.stdout)
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def _after_fork(self):
+        # the thread did not survive the fork; records queued before it belong to the parent
+        self._windows = {}
+        self._start()
+
+    def put(self, level, component, template, fields):
+        """Runs on the caller's thread: enqueue or drop, never block."""
+        if self._queue.qsize() >= self.queue_size:
+            self.dropped += 1
+            return
+        self._queue.put((time.time(), level, component, template, fields))
+
+    def close(self, timeout=5.0):
+        """Write out everything queued so far and stop the thread."""
+        if not self._thread.is_alive():
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        if self.file and self._stream is None:
+            self._out.close()
+
+    # ---------------------------
+    # Log thread
+    # ---------------------------
+    def _run(self):
+        get = self._queue.get
+        next_sweep = time.monotonic() + 1.0
+        while True:
+            try:
+                record = get(timeout=1.0)
+            except queue.Empty:
+                record = None
+            if record is _STOP:
+                self._flush_windows(time.time(), force=True)
+                try:
+                    self._out.flush()
+                except (OSError, ValueError):
+                    # stdout may already be closed at interpreter exit
+                    pass
+                return
+            if record is not None:
+                try:
+                    self._handle(record)
+                except Exception as e:
+                    # never let one bad record kill the thread
+                    self._write_line(f"[Log] Could not write a record: {e!r}")
+            # once a second, even under a flood: summarize and forget expired windows
+            if time.monotonic() >= next_sweep:
+                self._flush_windows(time.time())
+                next_sweep = time.monotonic() + 1.0
+
+    def _handle(self, record):
+        ts, level, component, template, fields = record
+        if self.suppress_after > 0:
+            key = (component, template, fields.get("ip"))
+            window = self._windows.get(key)
+            if window is None or ts - window[0] >= self.suppress_interval:
+                if window is not None and window[2]:
+                    self._summarize(key, window)
+                window = self._windows[key] = [ts, 0, 0, None]
+            window[1] += 1
+            if window[1] > self.suppress_after:
+                window[2] += 1
+                window[3] = record
+                self.suppressed += 1
+                return
+        self._write(ts, level, component, _render(template, fields), fields)
+
+    def _flush_windows(self, now, force=False):
+        for key, window in list(self._windows.items()):
+            if force or now - window[0] >= self.suppress_interval:
+                if window[2]:
+                    self._summarize(key, window)
+                del self._windows[key]
+
+    def _summarize(self, key, window):
+        ts, level, component, template, fields = window[3]
+        msg = _render(template, fields)
+        elapsed = max(ts - window[0], 1.0)
+        self._write(ts, level, component,
+                    f'{window[2]} more like "{msg}" suppressed in the last {elapsed:.0f}s',
+                    dict(fields, suppressed=window[2]))
+        window[2] = 0
+
+    def _write(self, ts, level, component, msg, fields):
+        if self.format == "json":
+            doc = {"ts": round(ts, 6), "level": LEVEL_NAMES.get(level, level), "component": component,
+                   "pid": self._pid, "msg": msg}
+            for k, v in fields.items():
+                doc.setdefault(k, v)
+            self._write_line(json.dumps(doc, default=str))
+        else:
+            stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(ts))
+            self._write_line(f"{stamp} {LEVEL_NAMES.get(level, level).upper():<7} [{component}] {msg}")
+
+    def _write_line(self, line):
+        try:
+            self._out.write(line + "\n")
+            if self._queue.empty():
+                self._out.flush()
+        except (OSError, ValueError):
+            # closed or broken console: keep draining the queue
+            pass
+
+
+class Logger:
+    """A component name bound to the process-wide sink; cheap to create and to keep."""
+
+    __slots__ = ("component",)
+
+    def __init__(self, component):
+        self.component = component
+
+    # the level check is repeated in each method so a filtered-out call is one comparison
+    def log(self, level, template, **fields):
+        sink = _sink
+        if level >= sink.level:
+            sink.put(level, self.component, template, fields)
+
+    def debug(self, template, **fields):
+        sink = _sink
+        if DEBUG >= sink.level:
+            sink.put(DEBUG, self.component, template, fields)
+
+    def info(self, template, **fields):
+        sink = _sink
+        if INFO >= sink.level:
+            sink.put(INFO, self.component, template, fields)
+
+    def warning(self, template, **fields):
+        sink = _sink
+        if WARNING >= sink.level:
+            sink.put(WARNING, self.component, template, fields)
+
+    def error(self, template, **fields):
+        sink = _sink
+        if ERROR >= sink.level:
+            sink.put(ERROR, self.component, template, fields)
+
+
+_sink = LogSink()
+_sink_lock = threading.Lock()
+
+
+def init_logging(cfg=None):
+    """(Re)configure the process-wide sink from a config.LOGGING-style dict."""
+    global _sink
+    with _sink_lock:
+        old, _sink = _sink, LogSink.from_config(cfg)
+        old.close()
+    return _sink
+
+
+def get_logger(component):
+    """Logger for `component` (e.g. "SSH", "Storage"), writing through the process-wide sink."""
+    return Logger(component)
+
+
+def get_sink():
+    return _sink
+
+
+def _close():
+    _sink.close()
+
+
+atexit.register(_close)
+os.register_at_fork(after_in_child=lambda: _sink._after_fork())
+
+_metrics = get_metrics()
+_metrics.callback("honeypot_log_dropped_total", "Log records dropped because the log queue was full", "counter",
+                  lambda: _sink.dropped)
+_metrics.callback("honeypot_log_suppressed_total", "Repeated log records muted", "counter",
+                  lambda: _sink.suppressed)
@@ -0,0 +1,325 @@
+"""
+Prometheus-style metrics.
+
+Counters, gauges and histograms live in one process-wide registry (get_metrics()) and
+are rendered in the Prometheus text format (version 0.0.4) by a small HTTP exporter
+bound to a local port (init_metrics(config.METRICS), GET /metrics):
+
+    counter   = get_metrics().counter("honeypot_x_total", "help text", ("handler",))
+    accepted  = counter.labels("ssh_like")       # resolve the labels once...
+    accepted.inc()                               # ...the hot path is one add
+
+Updates never take a lock: every thread adds to its own cell (a small list keyed by
+the thread ident) and a scrape sums the cells. Thread idents are reused once a thread
+exits, so thread-per-connection handlers don't grow the cells without bound. With the
+asyncio engine every handler runs on one thread and there is a single cell.
+
+Values that are already kept elsewhere (admission stats, the session registry, the
+storage queue depth, GeoIP cache hits) are not counted twice: callback() registers a
+function that is only called at scrape time.
+
+With --workers N every process has its own registry: the writer process serves on
+"port", worker i on port + 1 + i.
+"""
+import math
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+KINDS = ("counter", "gauge", "histogram")
+
+# seconds; from a cheap fake-shell command (~10 us) to a slow batch commit
+DEFAULT_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+                   0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+get_ident = threading.get_ident
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_str(names, values, extra=""):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Child:
+    """One labelled series: per-thread cells of `width` numbers."""
+    __slots__ = ("_cells", "_lock", "_width")
+
+    def __init__(self, width=1):
+        self._cells = {}
+        self._lock = threading.Lock()
+        self._width = width
+
+    def _cell(self):
+        cell = self._cells.get(get_ident())
+        if cell is None:
+            # first update from this thread: the only time a lock is taken
+            with self._lock:
+                cell = self._cells.setdefault(get_ident(), [0] * self._width)
+        return cell
+
+    def _totals(self):
+        totals = [0] * self._width
+        for cell in list(self._cells.values()):
+            for i, v in enumerate(cell):
+                totals[i] += v
+        return totals
+
+
+class CounterChild(_Child):
+    __slots__ = ()
+
+    def inc(self, amount=1):
+        cell = self._cells.get(get_ident()) or self._cell()
+        cell[0] += amount
+
+    def value(self):
+        return self._totals()[0]
+
+
+class GaugeChild(CounterChild):
+    """A gauge moved with inc()/dec(); the sum over threads is the value."""
+    __slots__ = ()
+
+    def dec(self, amount=1):
+        cell = self._cells.get(get_ident()) or self._cell()
+        cell[0] -= amount
+
+
+class HistogramChild(_Child):
+    """Cells hold one count per bucket (+Inf last), then the sum and the count."""
+    __slots__ = ("bounds",)
+
+    def __init__(self, bounds):
+        super().__init__(len(bounds) + 3)
+        self.bounds = bounds
+
+    def observe(self, value):
+        cell = self._cells.get(get_ident()) or self._cell()
+        cell[bisect_left(self.bounds, value)] += 1
+        cell[-2] += value
+        cell[-1] += 1
+
+    def snapshot(self):
+        """(cumulative bucket counts, sum, count)"""
+        totals = self._totals()
+        cumulative, running = [], 0
+        for n in totals[:-2]:
+            running += n
+            cumulative.append(running)
+        return cumulative, totals[-2], totals[-1]
+
+
+class Metric:
+    """A named metric and its labelled children (labels() with no labelnames = the metric itself)."""
+
+    def __init__(self, name, help, kind, labelnames=(), buckets=DEFAULT_BUCKETS):
+        if kind not in KINDS:
+            raise ValueError(f"Unknown metric kind '{kind}', expected one of {KINDS}")
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._default = self.labels()
+
+    def labels(self, *values):
+        values = tuple(str(v) for v in values)
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            with self._lock:
+                child = self._children.get(values)
+                if child is None:
+                    if self.kind == "histogram":
+                        child = HistogramChild(self.buckets)
+                    elif self.kind == "gauge":
+                        child = GaugeChild()
+                    else:
+                        child = CounterChild()
+                    self._children[values] = child
+        return child
+
+    # unlabelled shortcuts
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+    def dec(self, amount=1):
+        self._default.dec(amount)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+    def render(self, out):
+        for values, child in sorted(self._children.items()):
+            if self.kind != "histogram":
+                out.append(f"{self.name}{_label_str(self.labelnames, values)} {_format_value(child.value())}")
+                continue
+            cumulative, total, count = child.snapshot()
+            for bound, n in zip(self.buckets + (math.inf,), cumulative):
+                le = f'le="{_format_value(float(bound))}"'
+                out.append(f"{self.name}_bucket{_label_str(self.labelnames, values, le)} {n}")
+            out.append(f"{self.name}_sum{_label_str(self.labelnames, values)} {_format_value(total)}")
+            out.append(f"{self.name}_count{_label_str(self.labelnames, values)} {count}")
+
+
+class Callback:
+    """A counter or gauge read from fn() at scrape time: a number, or {label values tuple: number}."""
+
+    def __init__(self, name, help, kind, fn, labelnames=()):
+        if kind not in ("counter", "gauge"):
+            raise ValueError(f"Callback metric {name} must be a counter or gauge, got '{kind}'")
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.fn = fn
+        self.labelnames = tuple(labelnames)
+
+    def render(self, out):
+        try:
+            value = self.fn()
+        except Exception as e:
+            # a broken source must not take the whole scrape down
+            out.append(f"# {self.name} unavailable: {_escape(e)}")
+            return
+        if value is None:
+            return
+        items = value.items() if isinstance(value, dict) else [((), value)]
+        for values, v in sorted(items, key=lambda item: item[0]):
+            if not isinstance(values, tuple):
+                values = (values,)
+            out.append(f"{self.name}{_label_str(self.labelnames, values)} {_format_value(v)}")
+
+
+class Registry:
+    """Every metric of the process. counter()/gauge()/histogram() return the existing metric on repeat calls."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, name, help, kind, labelnames, buckets=DEFAULT_BUCKETS):
+        metric = self._metrics.get(name)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(name)
+                if metric is None:
+                    metric = self._metrics[name] = Metric(name, help, kind, labelnames, buckets)
+        if not isinstance(metric, Metric) or metric.kind != kind or metric.labelnames != tuple(labelnames):
+            raise ValueError(f"Metric {name} is already registered with a different type or labels")
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self._get(name, help, "counter", labelnames)
+
+    def gauge(self, name, help, labelnames=()):
+        return self._get(name, help, "gauge", labelnames)
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._get(name, help, "histogram", labelnames, buckets)
+
+    def callback(self, name, help, kind, fn, labelnames=()):
+        """Register (or replace) a metric computed by fn() at scrape time."""
+        with self._lock:
+            self._metrics[name] = Callback(name, help, kind, fn, labelnames)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        out = []
+        for name in sorted(self._metrics):
+            metric = self._metrics[name]
+            out.append(f"# HELP {name} {metric.help}")
+            out.append(f"# TYPE {name} {metric.kind}")
+            metric.render(out)
+        return "\n".join(out) + "\n"
+
+
+class _ExporterHandler(BaseHTTPRequestHandler):
+    registry = None
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # scrapes every few seconds would flood the console
+        pass
+
+
+class Exporter:
+    """GET /metrics on host:port, served from a daemon thread (never the attacker-facing loop)."""
+
+    def __init__(self, registry, host="127.0.0.1", port=9108):
+        handler = type("ExporterHandler", (_ExporterHandler,), {"registry": registry})
+        self.server = ThreadingHTTPServer((host, int(port)), handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, name="metrics-exporter", daemon=True)
+
+    @property
+    def address(self):
+        return self.server.server_address
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+_shared = Registry()
+_exporter = None
+_exporter_lock = threading.Lock()
+
+
+def init_metrics(cfg=None, port_offset=0, verbose=True):
+    """
+    Start the exporter from a config.METRICS-style dict ({"enabled", "host", "port"});
+    port_offset separates the processes of --workers mode. Returns the registry.
+    """
+    global _exporter
+    cfg = cfg or {}
+    with _exporter_lock:
+        if _exporter is not None:
+            _exporter.stop()
+            _exporter = None
+        if cfg.get("enabled", False):
+            host, port = cfg.get("host", "127.0.0.1"), int(cfg.get("port", 9108)) + port_offset
+            _exporter = Exporter(_shared, host, port).start()
+            if verbose:
+                # imported here: logger itself reports through this module's registry
+                from logger import get_logger
+                get_logger("Metrics").info("Serving http://{host}:{port}/metrics", host=host,
+                                           port=_exporter.address[1])
+    return _shared
+
+
+def get_metrics():
+    """Process-wide registry; metrics are collected whether or not the exporter runs."""
+    return _shared
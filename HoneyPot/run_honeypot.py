@@ -1,10 +1,25 @@
 import config
-from storage.sqlite_storage import SQLiteStorage
+from storage.backends import create_storage
+from storage.queue_storage import QueueStorage, run_writer
+from handlers.engine import get_engine
+from handlers.admission import init_admission
+from storage.payloads import init_payloads
+from geoip import init_geoip
+from metrics import init_metrics
+from logger import init_logging, get_logger
+from supervisor import Supervisor
+import argparse
+import importlib.util
+import signal
+import sys
+import threading
 import time
 
 # dynamic imports for handlers
 from importlib import import_module
 
+log = get_logger("Main")
+
 
 def create_handler(handler_name, host, port, cfg, storage, verbose=True):
     mapping = {
@@ -22,9 +37,13 @@ def create_handler(handler_name, host, port, cfg, storage, verbose=True):
     return cls(host, port, cfg, storage, verbose=verbose)
 
 
-def main():
-    # Initialize storage
-    db = SQLiteStorage("honeypot.db")
+def start_handlers(storage, reuse_port=False):
+    # Shared GeoIP reader for every handler
+    init_geoip(getattr(config, "GEOIP", {}))
+    # connection limits shared by every listener in this process
+    init_admission(getattr(config, "ADMISSION", {}), verbose=config.GENERAL.get("verbose", True))
+    # content-addressed store for captured HTTP bodies and shell-written files
+    init_payloads(config.STORAGE)
 
     handlers = []
 
@@ -33,6 +52,8 @@ def main():
         name = item.get("name")
         host = item.get("host", "0.0.0.0")
         port = item.get("port")
+        if reuse_port:
+            item = dict(item, reuse_port=True)
 
         # FIX: pass db instead of storage
         h = create_handler(
@@ -40,21 +61,93 @@ def main():
             host,
             port,
             item,          # cfg
-            db,            # storage
+            storage,       # storage
             verbose=config.GENERAL.get("verbose", True)
         )
 
         h.start()
         handlers.append(h)
 
-    print("[*] Honeypot started with handlers:", [h.__class__.__name__ for h in handlers])
+    return handlers
+
+
+def run_worker(index, event_queue):
+    """Worker process for --workers mode: serve every listener, send events to the writer."""
+    # Ctrl-C reaches the whole process group; the supervisor stops us with SIGTERM
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+
+    # the writer process serves metrics on the configured port, workers on the next ones
+    init_metrics(getattr(config, "METRICS", {}), port_offset=index + 1,
+                 verbose=config.GENERAL.get("verbose", True))
+    storage = QueueStorage(event_queue)
+    start_handlers(storage, reuse_port=True)
+    while not stop.wait(1):
+        pass
+    get_engine().stop()
+    storage.close()
+
+
+def load_config(path):
+    """Use the Python file at path (same names as config.py) instead of config.py."""
+    global config
+    spec = importlib.util.spec_from_file_location("config", path)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    sys.modules["config"] = mod
+    config = mod
+    return mod
+
+
+def run_supervised(workers, db_path=None):
+    sup = Supervisor(
+        workers,
+        worker_target=run_worker,
+        writer_target=run_writer,
+        writer_args=(db_path, config.STORAGE, getattr(config, "METRICS", {})),
+        queue_size=config.STORAGE.get("queue_size", 100000),
+        verbose=config.GENERAL.get("verbose", True),
+    )
+    log.info("Honeypot starting {workers} workers (SO_REUSEPORT)", workers=workers)
+    if not sup.run():
+        sys.exit(1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Modular honeypot")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="fork N worker processes sharing the listen ports via SO_REUSEPORT (0 = single process)")
+    parser.add_argument("--config", help="Python config file to use instead of config.py")
+    parser.add_argument("--db", help="SQLite database path (default: STORAGE['db_path'] of the config)")
+    args = parser.parse_args(argv)
+
+    if args.config:
+        load_config(args.config)
+    # before anything logs; forked workers and the writer inherit it
+    init_logging(getattr(config, "LOGGING", {}))
+
+    if args.workers > 0:
+        run_supervised(args.workers, args.db)
+        return
+
+    init_metrics(getattr(config, "METRICS", {}), verbose=config.GENERAL.get("verbose", True))
+
+    # Initialize storage (the backend named by STORAGE["backend"])
+    db = create_storage(config.STORAGE, args.db)
+
+    handlers = start_handlers(db)
+
+    log.info("Honeypot started with handlers: {handlers}", handlers=[h.__class__.__name__ for h in handlers])
 
     try:
         while True:
             time.sleep(1)
     except KeyboardInterrupt:
-        print("\n[*] Stopping honeypot")
+        log.info("Stopping honeypot")
+        get_engine().stop()
+        db.close()
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,72 @@
+"""
+Storage backends.
+
+BaseHandler.emit() hands every event to a storage object through one method,
+save_event(); StorageBackend spells out that contract, and create_storage() builds the
+backend named by config.STORAGE["backend"]:
+
+    "sqlite"   SQLiteStorage (storage/sqlite_storage.py): write-behind batches into SQLite
+    "log"      LogStorage (storage/log_storage.py): append-only segment log, compacted
+               into the same SQLite database in the background
+
+Both keep the SQLite schema and the read API (query(), reader(), export(), the reports
+of storage/queries.py), so dashboards don't care which one ingested the events.
+Another backend is added with register_backend("name", "module.path", "ClassName").
+"""
+from importlib import import_module
+
+DEFAULT_DB_PATH = "honeypot.db"
+
+# name -> (module, class); imported on first use, like the handlers in run_honeypot.py
+BACKENDS = {
+    "sqlite": ("storage.sqlite_storage", "SQLiteStorage"),
+    "log": ("storage.log_storage", "LogStorage"),
+}
+
+
+class StorageBackend:
+    """
+    What handlers and the process entry points need from storage.
+
+    save_event() runs on the attacker-facing path (possibly the event loop serving every
+    session): it must not block on I/O, and sheds the event (counting it in `dropped`)
+    rather than wait. Everything else happens on the backend's own threads.
+    """
+    dropped = 0
+
+    @classmethod
+    def from_config(cls, db_path, cfg=None):
+        """Build from a config.STORAGE-style dict."""
+        raise NotImplementedError
+
+    def save_event(self, etype, ip, port, paylaod, ts=None):
+        """
+        Accept one event; True if it was queued, False if it was dropped. ts (epoch
+        seconds) is when it happened if it was recorded elsewhere first; None = now.
+        """
+        raise NotImplementedError
+
+    def flush(self, timeout=None):
+        """Block until every event accepted so far is stored (a no-op where that can't be observed)."""
+
+    def close(self):
+        """Flush and release threads, files and connections."""
+
+
+def register_backend(name, module_path, class_name):
+    """Make `name` selectable as config.STORAGE["backend"]."""
+    BACKENDS[name] = (module_path, class_name)
+
+
+def create_storage(cfg=None, db_path=None):
+    """
+    The backend named by cfg["backend"] (default "sqlite"), built from the rest of cfg.
+    db_path (e.g. from --db) overrides cfg["db_path"].
+    """
+    cfg = cfg or {}
+    name = cfg.get("backend", "sqlite")
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown storage backend '{name}', expected one of {tuple(BACKENDS)}")
+    module_path, class_name = BACKENDS[name]
+    cls = getattr(import_module(module_path), class_name)
+    return cls.from_config(db_path or cfg.get("db_path", DEFAULT_DB_PATH), cfg)
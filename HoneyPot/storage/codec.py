@@ -0,0 +1,314 @@
+"""
+Compact binary encoding for events.payload.
+
+Payloads used to be stored as json.dumps() text, repeating every field name and most
+values (protocol, username, banner, country, ...) in every row. A record is now:
+
+    version   1 byte
+    schema    1 byte, an id from SCHEMAS (0 = none)
+    mask      varint, bit i set = the schema's field i is present
+    values    the present fields' values, in schema order (no names)
+    extras    varint count, then (key, value) pairs for fields outside the schema
+
+Values are tagged (None/False/True, zigzag varint ints, doubles, strings, lists, dicts).
+Field names and the values of INTERNED fields are replaced by varint ids into the
+`strings` table, which the writer keeps in memory and appends to in the same transaction
+as the events that use it. Ids are never reused, so a record always decodes the same way.
+
+Older rows still hold JSON text; decode() accepts both. SQLiteStorage registers
+decode_json() as the SQL function payload_json(), which the events_json view uses.
+"""
+import json
+import struct
+import threading
+
+VERSION = 1
+
+# schema id -> (event type, field order). Stored in every record: never renumber, reorder
+# or remove fields; appending is safe (old records just lack the bit). Fields outside a
+# schema are still encoded, as extras.
+SCHEMAS = {
+    1: ("connection", ("proto", "src_ip", "src_port", "banner", "client_banner", "geo", "session_id", "request")),
+    2: ("auth_attempt", ("proto", "src_ip", "src_port", "user", "pass", "attempt", "session_id", "success")),
+    3: ("command", ("proto", "src_ip", "src_port", "user", "command", "session_id")),
+    4: ("session_end", ("proto", "src_ip", "src_port", "user", "session_id", "duration",
+                        "start_time", "authenticated", "attempts", "commands", "bytes_in", "bytes_out")),
+    5: ("http_request", ("proto", "src_ip", "src_port", "session_id", "method", "path", "query", "version",
+                         "headers", "body", "body_size", "status", "sha256", "truncated")),
+    6: ("payload", ("proto", "src_ip", "src_port", "session_id", "sha256", "size", "source", "name", "new",
+                    "truncated")),
+}
+
+# string values under these keys (at any depth) come from a small set and are stored as
+# ids; attacker-chosen values (passwords, commands, paths, IPs, header values) mostly occur
+# once and would only use up the table, so they stay inline
+INTERNED = frozenset({"proto", "banner", "client_banner", "user", "country", "city", "org", "method",
+                      "version", "source"})
+MAX_INTERNED_LEN = 256
+
+# header names stored as ids in http_request "headers"; other names (any client can
+# invent them) stay inline
+HEADER_NAMES = frozenset({"Host", "User-Agent", "Accept", "Accept-Encoding", "Accept-Language", "Connection",
+                          "Content-Type", "Content-Length", "Cookie", "Authorization", "Referer", "Origin",
+                          "Cache-Control", "Upgrade", "X-Forwarded-For", "host", "user-agent", "accept",
+                          "accept-encoding", "accept-language", "connection", "content-type", "content-length"})
+
+T_NONE, T_FALSE, T_TRUE, T_INT, T_FLOAT, T_STR, T_REF, T_LIST, T_DICT = range(9)
+
+_DOUBLE = struct.Struct("<d")
+# event type -> (schema id, ((bit, field, interned), ...), field set)
+_BY_TYPE = {etype: (sid, tuple((1 << i, f, f in INTERNED) for i, f in enumerate(fields)), frozenset(fields))
+            for sid, (etype, fields) in SCHEMAS.items()}
+# keys (of extras and nested dicts) stored as ids: the fixed names the handlers emit
+INTERNED_KEYS = frozenset(f for _, fields in SCHEMAS.values() for f in fields) | HEADER_NAMES | {
+    "lat", "lon", "asn", "error", "raw"}
+
+STRINGS_TABLE = """
+    CREATE TABLE IF NOT EXISTS strings (
+        id INTEGER PRIMARY KEY,
+        value TEXT NOT NULL
+    );
+"""
+
+
+def _varint(n: int) -> bytes:
+    out = bytearray()
+    while n > 0x7f:
+        out.append((n & 0x7f) | 0x80)
+        n >>= 7
+    out.append(n)
+    return bytes(out)
+
+
+def _int(n: int) -> bytes:
+    return bytes((T_INT,)) + _varint(n << 1 if n >= 0 else (-n << 1) - 1)
+
+
+_SMALL_INTS = {i: _int(i) for i in range(-64, 65536)}
+_CONST = {None: bytes((T_NONE,)), False: bytes((T_FALSE,)), True: bytes((T_TRUE,))}
+_HEADERS = {sid: bytes((VERSION, sid)) for sid in list(SCHEMAS) + [0]}
+_VARINTS = [_varint(n) for n in range(256)]
+_STR_PREFIX = [bytes((T_STR,)) + v for v in _VARINTS]
+_MISSING = object()
+
+
+class StringTable:
+    """
+    Writer-side string -> id dictionary mirroring the `strings` table. New strings are
+    pending until flush() inserts them and commit() is called; if the transaction fails,
+    load() the table again. At most `limit` strings are interned, later ones stay inline.
+    """
+
+    def __init__(self, limit=100000):
+        self.limit = int(limit)
+        self.refs = {}       # value -> encoded T_REF bytes
+        self.next_id = 1
+        self.pending = []    # (id, value) not yet committed
+
+    def load(self, conn):
+        self.refs.clear()
+        self.pending = []
+        self.next_id = 1
+        for sid, value in conn.execute("SELECT id, value FROM strings ORDER BY id"):
+            if len(self.refs) < self.limit:
+                self.refs[value] = bytes((T_REF,)) + _varint(sid)
+            self.next_id = sid + 1
+
+    def ref(self, value):
+        """Encoded reference for value, or None once the table is full."""
+        if len(self.refs) >= self.limit:
+            return None
+        sid = self.next_id
+        self.next_id += 1
+        self.pending.append((sid, value))
+        ref = self.refs[value] = bytes((T_REF,)) + _varint(sid)
+        return ref
+
+    def flush(self, cur):
+        if self.pending:
+            cur.executemany("INSERT INTO strings (id, value) VALUES (?, ?)", self.pending)
+
+    def commit(self):
+        self.pending = []
+
+
+class Encoder:
+    """Encodes payload dicts; runs on the writer thread only."""
+
+    def __init__(self, strings: StringTable):
+        self.strings = strings
+
+    def encode(self, etype, payload) -> bytes:
+        schema = _BY_TYPE.get(etype)
+        if schema is None:
+            out = [_HEADERS[0]]
+            self._pairs(payload, payload, out)
+            return b"".join(out)
+        sid, fields, field_set = schema
+        out = [_HEADERS[sid], b""]
+        refs = self.strings.refs
+        mask = present = 0
+        # the common cases (interned strings, small ints) inlined; the rest via _value()
+        for bit, name, interned in fields:
+            v = payload.get(name, _MISSING)
+            if v is _MISSING:
+                continue
+            mask |= bit
+            present += 1
+            t = type(v)
+            if t is str and interned:
+                ref = refs.get(v)
+                if ref is not None:
+                    out.append(ref)
+                    continue
+            elif t is int:
+                ref = _SMALL_INTS.get(v)
+                if ref is not None:
+                    out.append(ref)
+                    continue
+            self._value(name, v, out)
+        out[1] = _VARINTS[mask] if mask < 256 else _varint(mask)
+        extras = [k for k in payload if k not in field_set] if present != len(payload) else ()
+        if not extras:
+            out.append(b"\x00")
+        else:
+            self._pairs(payload, extras, out)
+        return b"".join(out)
+
+    def _pairs(self, d, keys, out):
+        out.append(_varint(len(keys)))
+        for k in keys:
+            name = str(k)
+            self._str(name in INTERNED_KEYS, name, out)
+            self._value(k, d[k], out)
+
+    def _str(self, intern, s, out):
+        if intern:
+            ref = self.strings.refs.get(s)
+            if ref is None and len(s) <= MAX_INTERNED_LEN:
+                ref = self.strings.ref(s)
+            if ref is not None:
+                out.append(ref)
+                return
+        b = s.encode("utf-8", "surrogatepass")
+        out.append(_STR_PREFIX[len(b)] if len(b) < 256 else bytes((T_STR,)) + _varint(len(b)))
+        out.append(b)
+
+    def _value(self, key, v, out):
+        t = type(v)
+        if t is str:
+            self._str(key in INTERNED, v, out)
+        elif t is int:
+            out.append(_SMALL_INTS.get(v) or _int(v))
+        elif v is None or t is bool:
+            out.append(_CONST[v])
+        elif t is float:
+            out.append(bytes((T_FLOAT,)) + _DOUBLE.pack(v))
+        elif isinstance(v, dict):
+            out.append(bytes((T_DICT,)))
+            self._pairs(v, list(v), out)
+        elif isinstance(v, (list, tuple)):
+            out.append(bytes((T_LIST,)) + _varint(len(v)))
+            for item in v:
+                self._value(key, item, out)
+        elif isinstance(v, int):
+            out.append(_CONST[v] if isinstance(v, bool) else _int(int(v)))
+        elif isinstance(v, float):
+            out.append(bytes((T_FLOAT,)) + _DOUBLE.pack(float(v)))
+        elif isinstance(v, str):
+            self._str(key in INTERNED, str(v), out)
+        else:
+            raise TypeError(f"Object of type {t.__name__} is not serializable")
+
+
+class Decoder:
+    """
+    Decodes records (and legacy JSON text). `fetch(min_id)` returns [(id, value)] from
+    the strings table and is called when a record references an id not seen yet.
+    Safe to share between threads.
+    """
+
+    def __init__(self, fetch):
+        self.fetch = fetch
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def _string(self, sid):
+        value = self.values.get(sid)
+        if value is None:
+            with self._lock:
+                if sid not in self.values:
+                    self.values.update(self.fetch(max(self.values, default=0) + 1))
+            value = self.values[sid]
+        return value
+
+    def decode(self, data):
+        if data is None:
+            return None
+        if isinstance(data, str):
+            return json.loads(data)
+        data = bytes(data)
+        if data[0] != VERSION:
+            raise ValueError(f"Unsupported payload version {data[0]}")
+        schema = data[1]
+        pos = 2
+        result = {}
+        if schema:
+            mask, pos = _read_varint(data, pos)
+            for i, name in enumerate(SCHEMAS[schema][1]):
+                if mask >> i & 1:
+                    result[name], pos = self._read(data, pos)
+        n, pos = _read_varint(data, pos)
+        for _ in range(n):
+            key, pos = self._read(data, pos)
+            result[key], pos = self._read(data, pos)
+        return result
+
+    def decode_json(self, data):
+        """payload as JSON text, whatever its storage format (the payload_json() SQL function)."""
+        if data is None or isinstance(data, str):
+            return data
+        return json.dumps(self.decode(data))
+
+    def _read(self, data, pos):
+        tag = data[pos]
+        pos += 1
+        if tag == T_REF:
+            sid, pos = _read_varint(data, pos)
+            return self._string(sid), pos
+        if tag == T_STR:
+            n, pos = _read_varint(data, pos)
+            return data[pos:pos + n].decode("utf-8", "surrogatepass"), pos + n
+        if tag == T_INT:
+            z, pos = _read_varint(data, pos)
+            return (z >> 1) ^ -(z & 1), pos
+        if tag == T_FLOAT:
+            return _DOUBLE.unpack_from(data, pos)[0], pos + 8
+        if tag <= T_TRUE:
+            return (None, False, True)[tag], pos
+        if tag == T_LIST:
+            n, pos = _read_varint(data, pos)
+            items = []
+            for _ in range(n):
+                item, pos = self._read(data, pos)
+                items.append(item)
+            return items, pos
+        if tag == T_DICT:
+            n, pos = _read_varint(data, pos)
+            d = {}
+            for _ in range(n):
+                key, pos = self._read(data, pos)
+                d[key], pos = self._read(data, pos)
+            return d, pos
+        raise ValueError(f"Bad payload tag {tag} at offset {pos - 1}")
+
+
+def _read_varint(data, pos):
+    shift = result = 0
+    while True:
+        b = data[pos]
+        pos += 1
+        result |= (b & 0x7f) << shift
+        if b < 0x80:
+            return result, pos
+        shift += 7
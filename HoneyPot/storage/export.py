@@ -0,0 +1,348 @@
+"""
+Incremental export of the analysis tables to compressed JSONL and Parquet files.
+
+    cd HoneyPot
+    python -m storage.export --db honeypot.db --out exports
+    python -m storage.export --db honeypot.db --out exports --format jsonl,parquet --tables events,commands
+
+Each table is exported in id order, starting after the high-water mark recorded in
+<out>/export_state.json by the previous run, so a nightly run only reads what is new:
+
+    <out>/<table>/<table>-<first id>-<last id>.jsonl.gz
+    <out>/<table>/<table>-<first id>-<last id>.parquet
+
+A file is rotated every rows_per_file rows. It is written under a .part name and renamed
+when complete, and the high-water mark only moves past rows whose files are complete, so
+an interrupted export resumes where it stopped. Event payloads are exported decoded, as
+JSON text (the events_json format).
+
+Memory stays bounded: rows are read with fetchmany(batch_size), and Parquet buffers at
+most row_group_size rows. Reads run on read-only connections in keyset pages of
+page_size rows (WHERE id > last ORDER BY id LIMIT page_size), each page its own short
+read transaction, so with WAL the writer is never blocked and checkpoints aren't held
+back for the length of a multi-GB export. Partitioned events are read shard by shard.
+
+Parquet needs pyarrow (optional); JSONL only needs the standard library.
+"""
+import argparse
+import gzip
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from json.encoder import encode_basestring_ascii
+from urllib.parse import quote
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet output is optional
+    pa = pq = None
+
+FORMATS = ("jsonl", "parquet")
+STATE_FILE = "export_state.json"
+
+# table -> ((column, type)); "JSON" columns hold JSON text and are embedded as-is in JSONL
+EXPORT_TABLES = {
+    "events": (("id", "INTEGER"), ("type", "TEXT"), ("src_ip", "TEXT"), ("src_port", "INTEGER"),
+               ("payload", "JSON"), ("timestamp", "TEXT")),
+    "auth_attempts": (("id", "INTEGER"), ("session_id", "TEXT"), ("src_ip", "TEXT"), ("username", "TEXT"),
+                      ("password", "TEXT"), ("attempt_number", "INTEGER"), ("timestamp", "TEXT")),
+    "commands": (("id", "INTEGER"), ("session_id", "TEXT"), ("src_ip", "TEXT"), ("username", "TEXT"),
+                 ("command", "TEXT"), ("timestamp", "TEXT")),
+    "geoip": (("id", "INTEGER"), ("src_ip", "TEXT"), ("country", "TEXT"), ("city", "TEXT"), ("lat", "REAL"),
+              ("lon", "REAL"), ("asn", "INTEGER"), ("org", "TEXT"), ("first_seen", "TEXT")),
+    "sessions": (("id", "INTEGER"), ("session_id", "TEXT"), ("proto", "TEXT"), ("src_ip", "TEXT"),
+                 ("src_port", "INTEGER"), ("username", "TEXT"), ("start_time", "TEXT"), ("end_time", "TEXT"),
+                 ("duration", "REAL"), ("authenticated", "INTEGER"), ("auth_attempts", "INTEGER"),
+                 ("commands", "INTEGER"), ("bytes_in", "INTEGER"), ("bytes_out", "INTEGER")),
+    "payload_links": (("id", "INTEGER"), ("sha256", "TEXT"), ("session_id", "TEXT"), ("src_ip", "TEXT"),
+                      ("source", "TEXT"), ("name", "TEXT"), ("timestamp", "TEXT")),
+}
+DEFAULT_TABLES = ("events", "auth_attempts", "commands", "geoip")
+
+
+class JSONLWriter:
+    """gzip-compressed JSON lines, one object per row."""
+    suffix = ".jsonl.gz"
+
+    def __init__(self, path, columns, compresslevel=6, **_):
+        self.path = path
+        self.file = gzip.open(path, "wt", compresslevel=compresslevel, encoding="utf-8")
+        # '{"id":' ... ',"type":' ...: the keys are encoded once, values per row
+        self._prefixes = [("{" if i == 0 else ",") + json.dumps(name) + ":" for i, (name, _) in enumerate(columns)]
+        self._raw = [ctype == "JSON" for _, ctype in columns]
+        self._encode = json.JSONEncoder(check_circular=False).encode
+
+    def write(self, rows):
+        encode, prefixes, raw = self._encode, self._prefixes, self._raw
+        lines = []
+        for row in rows:
+            parts = []
+            for prefix, is_raw, value in zip(prefixes, raw, row):
+                parts.append(prefix)
+                # the common SQLite types without a JSONEncoder call per value
+                if value is None:
+                    parts.append("null")
+                elif is_raw:
+                    parts.append(value)
+                elif type(value) is str:
+                    parts.append(encode_basestring_ascii(value))
+                elif type(value) is int:
+                    parts.append(str(value))
+                else:
+                    parts.append(encode(value))
+            parts.append("}\n")
+            lines.append("".join(parts))
+        self.file.write("".join(lines))
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetWriter:
+    """Columnar Parquet file, one row group per row_group_size rows (requires pyarrow)."""
+    suffix = ".parquet"
+
+    def __init__(self, path, columns, compression="zstd", row_group_size=65536, **_):
+        if pq is None:
+            raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+        types = {"INTEGER": pa.int64(), "REAL": pa.float64(), "TEXT": pa.string(), "JSON": pa.string()}
+        self.path = path
+        self.schema = pa.schema([(name, types[ctype]) for name, ctype in columns])
+        self.writer = pq.ParquetWriter(path, self.schema, compression=compression)
+        self.row_group_size = int(row_group_size)
+        self._pending = []
+
+    def write(self, rows):
+        self._pending.extend(rows)
+        if len(self._pending) >= self.row_group_size:
+            self._flush()
+
+    def _flush(self):
+        if not self._pending:
+            return
+        columns = list(zip(*self._pending))
+        self._pending = []
+        arrays = []
+        for values, field in zip(columns, self.schema):
+            try:
+                arrays.append(pa.array(values, type=field.type))
+            except (UnicodeEncodeError, pa.ArrowInvalid):
+                # attacker input can hold undecodable bytes (lone surrogates): replace them
+                arrays.append(pa.array([_clean(v) for v in values], type=field.type))
+        self.writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        self._flush()
+        self.writer.close()
+
+
+WRITERS = {"jsonl": JSONLWriter, "parquet": ParquetWriter}
+
+
+def _clean(value):
+    if isinstance(value, str):
+        return value.encode("utf-8", "surrogateescape").decode("utf-8", "replace")
+    return value
+
+
+def load_state(out_dir):
+    """{table: last exported id} from a previous run ({} if none)."""
+    try:
+        with open(os.path.join(out_dir, STATE_FILE)) as f:
+            return json.load(f).get("tables", {})
+    except FileNotFoundError:
+        return {}
+
+
+def save_state(out_dir, tables):
+    path = os.path.join(out_dir, STATE_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump({"updated": time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime()), "tables": tables}, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+class _Files:
+    """The set of files (one per format) holding the rows from first_id on."""
+
+    def __init__(self, out_dir, table, first_id, formats, options):
+        self.dir = os.path.join(out_dir, table)
+        os.makedirs(self.dir, exist_ok=True)
+        self.table = table
+        self.first_id = first_id
+        self.rows = 0
+        self.writers = [WRITERS[fmt](os.path.join(self.dir, f"{table}-{first_id:012d}{WRITERS[fmt].suffix}.part"),
+                                     EXPORT_TABLES[table], **options)
+                        for fmt in formats]
+
+    def write(self, rows):
+        for w in self.writers:
+            w.write(rows)
+        self.rows += len(rows)
+
+    def finish(self, last_id):
+        """Close and move the files to their final names; returns them."""
+        done = []
+        for w in self.writers:
+            w.close()
+            final = os.path.join(self.dir, f"{self.table}-{self.first_id:012d}-{last_id:012d}{type(w).suffix}")
+            os.replace(w.path, final)
+            done.append(final)
+        return done
+
+    def abort(self):
+        for w in self.writers:
+            try:
+                w.close()
+            except Exception:
+                pass
+            try:
+                os.unlink(w.path)
+            except OSError:
+                pass
+
+
+def _sources(reader, table):
+    """Tables to read for `table`, in id order (the event shards when partitioned)."""
+    if table != "events":
+        return [table]
+    with reader() as conn:
+        if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'event_shards'").fetchone():
+            return ["events"]
+        # by lowest id, not start_ts: a migrated legacy shard holds the oldest ids but can
+        # start later than the shard of the day it was migrated on
+        first = []
+        for (name,) in conn.execute("SELECT name FROM event_shards").fetchall():
+            lo = conn.execute(f"SELECT min(id) FROM {name}").fetchone()[0]
+            if lo is not None:
+                first.append((lo, name))
+    return [name for _, name in sorted(first)]
+
+
+def export_table(reader, table, out_dir, state, formats=("jsonl",), decode=None, batch_size=5000,
+                 page_size=100000, rows_per_file=1000000, options=None):
+    """Export the rows of `table` above state[table]; updates state and returns (rows, files)."""
+    columns = EXPORT_TABLES[table]
+    names = ", ".join(name for name, _ in columns)
+    json_cols = [i for i, (_, ctype) in enumerate(columns) if ctype == "JSON"]
+    last = int(state.get(table, 0))
+    files, rows_total, done = None, 0, []
+    try:
+        for source in _sources(reader, table):
+            sql = f"SELECT {names} FROM {source} WHERE id > ? ORDER BY id LIMIT {int(page_size)}"
+            while True:
+                # one page = one short read transaction
+                n_page = 0
+                with reader() as conn:
+                    cur = conn.execute(sql, (last,))
+                    while True:
+                        rows = cur.fetchmany(batch_size)
+                        if not rows:
+                            break
+                        n_page += len(rows)
+                        if json_cols and decode is not None:
+                            rows = [_decoded(row, json_cols, decode) for row in rows]
+                        while rows:
+                            if files is None:
+                                files = _Files(out_dir, table, rows[0][0], formats, options or {})
+                            take = rows[:rows_per_file - files.rows]
+                            rows = rows[len(take):]
+                            files.write(take)
+                            last = take[-1][0]
+                            if files.rows >= rows_per_file:
+                                done += files.finish(last)
+                                files = None
+                                state[table] = last
+                                save_state(out_dir, state)
+                    cur.close()
+                rows_total += n_page
+                if n_page < page_size:
+                    break
+        if files is not None:
+            done += files.finish(last)
+            files = None
+            state[table] = last
+            save_state(out_dir, state)
+    finally:
+        if files is not None:
+            files.abort()
+    return rows_total, done
+
+
+def _decoded(row, json_cols, decode):
+    row = list(row)
+    for i in json_cols:
+        row[i] = decode(row[i])
+    return row
+
+
+def export_tables(reader, out_dir, tables=DEFAULT_TABLES, formats=("jsonl",), decode=None, full=False,
+                  batch_size=5000, page_size=100000, rows_per_file=1000000, compresslevel=6,
+                  compression="zstd", row_group_size=65536):
+    """
+    Export every table in `tables`, incrementally unless full=True.
+    reader: context manager factory yielding a read-only sqlite3 connection.
+    decode: events.payload -> JSON text. Returns {table: (rows, [files])}.
+    """
+    for fmt in formats:
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown export format '{fmt}', expected one of {FORMATS}")
+    if "parquet" in formats and pq is None:
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+    for table in tables:
+        if table not in EXPORT_TABLES:
+            raise ValueError(f"Cannot export table '{table}', expected one of {tuple(EXPORT_TABLES)}")
+    os.makedirs(out_dir, exist_ok=True)
+    state = {} if full else load_state(out_dir)
+    options = {"compresslevel": compresslevel, "compression": compression, "row_group_size": row_group_size}
+    return {table: export_table(reader, table, out_dir, state, formats, decode, batch_size, page_size,
+                                rows_per_file, options)
+            for table in tables}
+
+
+def main(argv=None):
+    from storage.codec import Decoder
+    from storage.sqlite_storage import DEFAULT_PRAGMAS, READER_PRAGMAS, STATEMENT_CACHE, apply_pragmas
+
+    parser = argparse.ArgumentParser(description="Export honeypot tables to compressed JSONL / Parquet")
+    parser.add_argument("--db", default="honeypot.db", help="SQLite database (default: honeypot.db)")
+    parser.add_argument("--out", default="exports", help="output directory (default: exports)")
+    parser.add_argument("--format", default="jsonl", help=f"comma-separated formats out of {FORMATS}")
+    parser.add_argument("--tables", default=",".join(DEFAULT_TABLES),
+                        help=f"comma-separated tables out of {tuple(EXPORT_TABLES)}")
+    parser.add_argument("--full", action="store_true", help="ignore the high-water marks and export everything")
+    parser.add_argument("--rows-per-file", type=int, default=1000000)
+    parser.add_argument("--compresslevel", type=int, default=6, help="gzip level for JSONL (1 = fastest)")
+    parser.add_argument("--compression", default="zstd", help="Parquet codec (zstd, snappy, gzip, none)")
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(f"file:{quote(args.db)}?mode=ro", uri=True, cached_statements=STATEMENT_CACHE)
+    apply_pragmas(conn, DEFAULT_PRAGMAS, only=READER_PRAGMAS)
+    conn.execute("PRAGMA query_only=1")
+    decoder = Decoder(lambda min_id: conn.execute("SELECT id, value FROM strings WHERE id >= ?",
+                                                  (min_id,)).fetchall())
+
+    @contextmanager
+    def reader():
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+
+    start = time.perf_counter()
+    results = export_tables(reader, args.out, tables=args.tables.split(","), formats=args.format.split(","),
+                            decode=decoder.decode_json, full=args.full, rows_per_file=args.rows_per_file,
+                            compresslevel=args.compresslevel, compression=args.compression)
+    conn.close()
+    for table, (rows, files) in results.items():
+        print(f"[+] {table}: {rows} rows, {len(files)} files")
+        for path in files:
+            print(f"    {path} ({os.path.getsize(path)} bytes)")
+    print(f"[*] Export finished in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,463 @@
+"""
+Log-structured event storage: an append-only segment log in front of SQLite.
+
+Events are appended to numbered segment files in log_dir (segment-000000000042.log)
+as length-prefixed records:
+
+    4 bytes  body length   (little-endian uint32)
+    4 bytes  CRC-32 of the body
+    body     marshal (format 4) of [ts, type, src_ip, src_port, payload]
+
+marshal is the fastest serializer in the standard library, several times quicker than
+json both ways; segments are only ever read back by this module, and the CRC keeps it
+from seeing anything it didn't write.
+
+One appender thread writes each batch with a single write and a single fsync (group
+commit), so ingesting an event costs a sequential append no matter how many tables and
+indexes it will touch. A segment is sealed once it reaches segment_size bytes or has
+been open segment_age seconds.
+
+A compactor thread replays sealed segments into an ordinary SQLiteStorage (same tables,
+indexes and shards; the events keep their original timestamps) and deletes them, so the
+analysis tables trail ingest by about segment_age + compact_interval seconds, longer
+while a spike is being worked off. Replay is exactly-once: each chunk of compact_chunk
+events is committed in one SQLite transaction together with the log position it reached
+(its row of the log_checkpoint table), so a crash or a rolled-back chunk resumes right after the
+last committed one and nothing is written twice. A chunk SQLite refuses or rolls back
+stays in its segment, which is kept and retried every compact_interval. A torn record
+at the end of the log (a crash mid-write) is cut off on the next start.
+"""
+import atexit
+import fcntl
+import json
+import marshal
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+
+from logger import get_logger
+from metrics import get_metrics
+from storage.backends import StorageBackend
+from storage.sqlite_storage import SQLiteStorage
+
+_STOP = object()
+
+log = get_logger("EventLog")
+
+# record header: body length, CRC-32 of the body
+HEADER = struct.Struct("<II")
+# a longer length is a corrupt header, not a record
+MAX_RECORD = 1 << 30
+
+SEGMENT_PREFIX = "segment-"
+SEGMENT_SUFFIX = ".log"
+# where the checkpoint was kept before it moved into the database; read if the database has none
+CHECKPOINT = "compaction.json"
+LOCK = "LOCK"
+
+# the data is what must survive a crash; file metadata (mtime) can lag
+_fsync = getattr(os, "fdatasync", os.fsync)
+MARSHAL_VERSION = 4
+
+
+def segment_path(log_dir, seq):
+    return os.path.join(log_dir, f"{SEGMENT_PREFIX}{seq:012d}{SEGMENT_SUFFIX}")
+
+
+def list_segments(log_dir):
+    """[(seq, path)] of the segment files in log_dir, oldest first."""
+    segments = []
+    for name in os.listdir(log_dir):
+        if not (name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX)):
+            continue
+        try:
+            seq = int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)])
+        except ValueError:
+            continue
+        segments.append((seq, os.path.join(log_dir, name)))
+    return sorted(segments)
+
+
+def encode_record(ts, etype, ip, port, payload):
+    body = marshal.dumps([ts, etype, ip, port, payload], MARSHAL_VERSION)
+    return HEADER.pack(len(body), zlib.crc32(body)) + body
+
+
+def read_records(f, offset=0):
+    """
+    Yield (end offset, body) for each intact record of the open segment f from offset;
+    stops at the end of the file or at the first torn or corrupt record.
+    """
+    f.seek(offset)
+    read = f.read
+    while True:
+        header = read(HEADER.size)
+        if len(header) < HEADER.size:
+            return
+        length, crc = HEADER.unpack(header)
+        if length > MAX_RECORD:
+            return
+        body = read(length)
+        if len(body) < length or zlib.crc32(body) != crc:
+            return
+        offset += HEADER.size + length
+        yield offset, body
+
+
+class LogStorage(StorageBackend):
+    """
+    Append-only event log compacted into `db` (a SQLiteStorage) in the background.
+
+    save_event() only enqueues, like SQLiteStorage's. The appender gathers up to
+    batch_size events or whatever arrives within fsync_interval seconds, then writes
+    and fsyncs them at once (fsync=False leaves flushing to the OS: a process crash
+    loses nothing, a power cut loses the last few seconds).
+
+    flush() returns once every event saved before it is in SQLite; close() compacts
+    whatever is left before closing the database.
+
+    Reads (query(), reader(), export(), the reports of storage/queries.py) are served
+    by `db`. log_dir is locked: one process appends to it at a time.
+    """
+    def __init__(self, db, log_dir="eventlog", segment_size=67108864, segment_age=2.0, fsync=True,
+                 fsync_interval=0.05, batch_size=5000, queue_size=100000, compact_interval=1.0,
+                 compact_chunk=5000):
+        self.db = db
+        self.log_dir = log_dir
+        self.segment_size = int(segment_size)
+        self.segment_age = float(segment_age)
+        self.fsync = bool(fsync)
+        self.fsync_interval = float(fsync_interval)
+        self.batch_size = int(batch_size)
+        self.queue_size = int(queue_size)
+        self.compact_interval = float(compact_interval)
+        # events per SQLite transaction during replay
+        self.compact_chunk = max(1, int(compact_chunk))
+        self.queue = queue.SimpleQueue()
+        self.dropped = 0
+        self._closed = False
+        # appender -> compactor: lists of flush() waiters, then _STOP
+        self._requests = queue.SimpleQueue()
+        os.makedirs(log_dir, exist_ok=True)
+        self._lock_dir()
+        # identifies this log's row in the database's log_checkpoint table
+        self._key = os.path.realpath(log_dir)
+        self._checkpoint = self._load_checkpoint()
+        self._recover()
+        self._init_metrics()
+
+        self._appender = threading.Thread(target=self._append_loop, name="eventlog-appender", daemon=True)
+        self._compactor = threading.Thread(target=self._compact_loop, name="eventlog-compactor", daemon=True)
+        self._appender.start()
+        self._compactor.start()
+        atexit.register(self.close)
+
+    @classmethod
+    def from_config(cls, db_path, cfg=None):
+        """
+        Build from a config.STORAGE-style dict: cfg["log"] configures the log, the
+        rest the SQLite database it is compacted into.
+        """
+        cfg = cfg or {}
+        log_cfg = cfg.get("log") or {}
+        return cls(
+            SQLiteStorage.from_config(db_path, cfg),
+            log_dir=log_cfg.get("dir", "eventlog"),
+            segment_size=log_cfg.get("segment_size", 67108864),
+            segment_age=log_cfg.get("segment_age", 2.0),
+            fsync=log_cfg.get("fsync", True),
+            fsync_interval=log_cfg.get("fsync_interval", 0.05),
+            batch_size=log_cfg.get("batch_size", 5000),
+            queue_size=cfg.get("queue_size", 100000),
+            compact_interval=log_cfg.get("compact_interval", 1.0),
+            compact_chunk=log_cfg.get("compact_chunk", 5000),
+        )
+
+    def _init_metrics(self):
+        metrics = get_metrics()
+        # replaces the compaction target's: in this backend the front queue is the one that can fill up
+        metrics.callback("honeypot_storage_queue_depth", "Events waiting for the event log appender", "gauge",
+                         self.queue.qsize)
+        metrics.callback("honeypot_storage_dropped_total", "Events dropped because the queue was full",
+                         "counter", lambda: self.dropped)
+        metrics.callback("honeypot_eventlog_segments", "Sealed segments waiting for compaction", "gauge",
+                         self.pending_segments)
+        self._appended = metrics.counter("honeypot_eventlog_appended_total", "Events appended to the event log")
+        self._appended_bytes = metrics.counter("honeypot_eventlog_bytes_total", "Bytes appended to the event log")
+        self._fsync_seconds = metrics.histogram("honeypot_eventlog_fsync_seconds",
+                                                "Time to write and fsync one batch")
+        self._compacted = metrics.counter("honeypot_eventlog_compacted_total", "Events replayed into SQLite")
+
+    def __getattr__(self, name):
+        # everything that isn't ingest (the read API) is the database's
+        db = self.__dict__.get("db")
+        if db is None:
+            raise AttributeError(name)
+        return getattr(db, name)
+
+    def _lock_dir(self):
+        self._lock_file = open(os.path.join(self.log_dir, LOCK), "a")
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self._lock_file.close()
+            raise RuntimeError(f"Event log {self.log_dir} is in use by another process")
+
+    def _recover(self):
+        """Cut a torn tail off the newest segment; every existing segment is sealed from now on."""
+        segments = list_segments(self.log_dir)
+        # the active segment: opened on the first write, everything below it is sealed.
+        # Numbering continues after the checkpointed segment even when every segment has
+        # been compacted and deleted, so the old offset never applies to a new file.
+        self._seq = max(segments[-1][0] if segments else 0, self._checkpoint[0]) + 1
+        self._file = None
+        if not segments:
+            return
+        seq, path = segments[-1]
+        with open(path, "r+b") as f:
+            end = 0
+            for end, _ in read_records(f):
+                pass
+            size = f.seek(0, os.SEEK_END)
+            if end < size:
+                log.warning("Cut {bytes} unreadable bytes off the end of {segment}", bytes=size - end,
+                            segment=path)
+                f.truncate(end)
+        log.info("{segments} segments from a previous run will be compacted", segments=len(segments))
+
+    def pending_segments(self):
+        """Sealed segments not yet compacted into SQLite."""
+        return sum(1 for seq, _ in list_segments(self.log_dir) if seq < self._seq)
+
+    #MAIN event saver (called by baseHandler.emit)
+    def save_event(self, etype, ip, port, paylaod, ts=None):
+        """Enqueue an event for the appender thread. Never blocks the caller. ts: as in SQLiteStorage."""
+        if self._closed:
+            return False
+        if self.queue.qsize() >= self.queue_size:
+            # shedding is better than stalling the attacker-facing path
+            self.dropped += 1
+            return False
+        self.queue.put((time.time() if ts is None else ts, etype, ip, port, paylaod))
+        return True
+
+    def flush(self, timeout=None):
+        """Block until every event saved so far has been appended and compacted into SQLite."""
+        if not self._appender.is_alive():
+            return
+        done = threading.Event()
+        self.queue.put((None, None, done, None, None))
+        done.wait(timeout)
+
+    def close(self):
+        """Append and compact everything saved so far, stop both threads and close the database."""
+        if self._closed:
+            return
+        self._closed = True
+        self.queue.put(_STOP)
+        self._appender.join()
+        self._compactor.join()
+        self.db.close()
+        self._lock_file.close()
+
+    # ---------------------------
+    # Appender thread
+    # ---------------------------
+    def _next_batch(self):
+        """Wait for one item (None after segment_age idle seconds), then gather until batch_size or fsync_interval."""
+        get, get_nowait = self.queue.get, self.queue.get_nowait
+        try:
+            batch = [get(timeout=self.segment_age)]
+        except queue.Empty:
+            return None
+        deadline = time.monotonic() + self.fsync_interval
+        while len(batch) < self.batch_size and batch[-1] is not _STOP:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(get(timeout=remaining) if remaining > 0 else get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _append_loop(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                self._seal_if_due()
+                continue
+            stop = batch[-1] is _STOP
+            if stop:
+                batch.pop()
+            waiters = self._append(batch)
+            if waiters or stop:
+                # the compactor only reads sealed segments
+                self._seal()
+                self._requests.put(waiters)
+            else:
+                self._seal_if_due()
+            if stop:
+                self._requests.put(_STOP)
+                return
+
+    def _append(self, batch):
+        """Write the batch as one chunk and fsync it; returns the flush() waiters found in it."""
+        waiters, parts = [], []
+        for ts, etype, ip, port, payload in batch:
+            if etype is None:
+                waiters.append(ip)
+                continue
+            try:
+                parts.append(encode_record(ts, etype, ip, port, payload))
+            except (TypeError, ValueError) as e:
+                log.error("Dropping unserializable {etype} event from {ip}: {error}", etype=etype, ip=ip, error=e)
+        if not parts:
+            return waiters
+        data = b"".join(parts)
+        started = time.perf_counter()
+        try:
+            if self._file is None:
+                self._open_segment()
+            self._file.write(data)
+            self._file.flush()
+            if self.fsync:
+                _fsync(self._file.fileno())
+        except OSError as e:
+            log.error("Event log write failed, {events} events lost: {error}", events=len(parts), error=e)
+            self.dropped += len(parts)
+            self._discard_tail()
+            return waiters
+        self._seg_bytes += len(data)
+        self._appended.inc(len(parts))
+        self._appended_bytes.inc(len(data))
+        self._fsync_seconds.observe(time.perf_counter() - started)
+        return waiters
+
+    def _open_segment(self):
+        self._file = open(segment_path(self.log_dir, self._seq), "ab")
+        self._seg_bytes = 0
+        self._seg_opened = time.monotonic()
+        if self.fsync:
+            # make the new file's directory entry durable too
+            fd = os.open(self.log_dir, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    def _seal(self):
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        # from here on the compactor may read it
+        self._seq += 1
+
+    def _seal_if_due(self):
+        if self._file is None:
+            return
+        if self._seg_bytes >= self.segment_size or time.monotonic() - self._seg_opened >= self.segment_age:
+            self._seal()
+
+    def _discard_tail(self):
+        # a partial write would hide every record after it: cut the segment back and start a new one
+        path = segment_path(self.log_dir, self._seq)
+        try:
+            self._file.close()
+        except OSError:
+            pass
+        self._file = None
+        try:
+            os.truncate(path, self._seg_bytes)
+        except OSError as e:
+            log.error("Could not truncate {segment}: {error}", segment=path, error=e)
+        self._seq += 1
+
+    # ---------------------------
+    # Compactor thread
+    # ---------------------------
+    def _compact_loop(self):
+        stop = False
+        while not stop:
+            try:
+                requests = [self._requests.get(timeout=self.compact_interval)]
+            except queue.Empty:
+                requests = []
+            # one pass serves every request already queued
+            while True:
+                try:
+                    requests.append(self._requests.get_nowait())
+                except queue.Empty:
+                    break
+            stop = _STOP in requests
+            try:
+                self._compact()
+            except Exception as e:
+                log.error("Compaction failed: {error}", error=e)
+            for waiters in requests:
+                if waiters is not _STOP:
+                    for done in waiters:
+                        done.set()
+
+    def _compact(self):
+        for seq, path in list_segments(self.log_dir):
+            if seq >= self._seq:
+                break
+            # fully replayed, but the crash came before it was deleted
+            if seq >= self._checkpoint[0]:
+                offset = self._checkpoint[1] if self._checkpoint[0] == seq else 0
+                self._compact_segment(seq, path, offset)
+            os.remove(path)
+
+    def _compact_segment(self, seq, path, offset):
+        """Replay one segment from offset; raises (keeping the segment) if SQLite lost any of it."""
+        end, chunk = offset, []
+        with open(path, "rb") as f:
+            for end, body in read_records(f, offset):
+                try:
+                    ts, etype, ip, port, payload = marshal.loads(body)
+                except (ValueError, EOFError, TypeError) as e:
+                    log.error("Skipping unreadable record in {segment}: {error}", segment=path, error=e)
+                    continue
+                chunk.append((etype, ip, port, payload, ts))
+                if len(chunk) >= self.compact_chunk:
+                    self._commit(seq, end, chunk)
+                    chunk = []
+            size = f.seek(0, os.SEEK_END)
+        if chunk or end != offset:
+            self._commit(seq, end, chunk)
+        if end < size:
+            log.error("Skipped {bytes} corrupt bytes at the end of {segment}", bytes=size - end, segment=path)
+
+    def _commit(self, seq, offset, chunk):
+        """
+        Commit a replayed chunk in one SQLite transaction with the position it reached.
+        If SQLite refuses or rolls it back, neither moves and the chunk is replayed on the
+        next pass.
+        """
+        errors = self.db.commit_errors
+        if not self.db.save_replayed(chunk, (self._key, seq, offset)):
+            raise RuntimeError(f"SQLite queue full, retrying {segment_path(self.log_dir, seq)} "
+                               f"in {self.compact_interval}s")
+        self.db.flush()
+        if self.db.commit_errors != errors:
+            raise RuntimeError(f"SQLite did not commit {len(chunk)} events of {segment_path(self.log_dir, seq)}, "
+                               f"retrying in {self.compact_interval}s")
+        self._checkpoint = (seq, offset)
+        self._compacted.inc(len(chunk))
+
+    def _load_checkpoint(self):
+        checkpoint = self.db.log_checkpoint(self._key)
+        if checkpoint is not None:
+            return checkpoint
+        try:
+            with open(os.path.join(self.log_dir, CHECKPOINT)) as f:
+                state = json.load(f)
+            return int(state["segment"]), int(state["offset"])
+        except FileNotFoundError:
+            return 0, 0
+        except (ValueError, KeyError, TypeError) as e:
+            log.warning("Ignoring unreadable {file}: {error}", file=CHECKPOINT, error=e)
+            return 0, 0
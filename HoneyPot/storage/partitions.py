@@ -0,0 +1,71 @@
+"""
+Time partitioning helpers for the events table.
+
+With partitioning on, events live in one table per day (events_20240115) or ISO week
+(events_2024w03), all in the main database file. The event_shards table records each
+shard's [start, end) time range, and a view named `events` is the UNION ALL of every
+shard, so existing queries keep working. Retention drops whole shards (DROP TABLE is
+O(pages) with no index maintenance, unlike DELETE) and the freed pages are returned to
+the OS with PRAGMA incremental_vacuum.
+
+Times are the same UTC "YYYY-MM-DD HH:MM:SS" strings as CURRENT_TIMESTAMP, so they
+compare correctly as text.
+"""
+from datetime import datetime, timedelta, timezone
+
+PARTITIONS = ("day", "week")
+
+# the legacy, unpartitioned table is kept as a shard under this name
+LEGACY_SHARD = "events_legacy"
+
+# SQLite's default SQLITE_MAX_COMPOUND_SELECT is 500 terms per compound SELECT
+_MAX_UNION = 250
+
+EVENT_COLUMNS = "id, type, src_ip, src_port, payload, timestamp"
+# the same columns with the payload decoded to JSON text (see storage/codec.py)
+EVENT_JSON_COLUMNS = "id, type, src_ip, src_port, payload_json(payload) AS payload, timestamp"
+
+
+def format_ts(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def shard_for(ts: float, partition: str):
+    """(table, start, end) of the shard that holds UTC time ts."""
+    day = datetime.fromtimestamp(ts, timezone.utc).date()
+    if partition == "day":
+        start, end = day, day + timedelta(days=1)
+        name = f"events_{day:%Y%m%d}"
+    elif partition == "week":
+        start = day - timedelta(days=day.weekday())
+        end = start + timedelta(days=7)
+        year, week, _ = day.isocalendar()
+        name = f"events_{year}w{week:02d}"
+    else:
+        raise ValueError(f"Unknown partition '{partition}', expected one of {PARTITIONS}")
+    return name, f"{start} 00:00:00", f"{end} 00:00:00"
+
+
+def create_shard_sql(name: str):
+    return [
+        f"""CREATE TABLE IF NOT EXISTS {name} (
+                id INTEGER PRIMARY KEY,
+                type TEXT NOT NULL,
+                src_ip TEXT NOT NULL,
+                src_port INTEGER,
+                payload BLOB,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+            )""",
+        f"CREATE INDEX IF NOT EXISTS idx_{name}_ip ON {name}(src_ip)",
+        # covers per-type counts by IP (e.g. connections per country)
+        f"CREATE INDEX IF NOT EXISTS idx_{name}_type_ip ON {name}(type, src_ip)",
+    ]
+
+
+def union_sql(names) -> str:
+    """SELECT over all the given shards, nested so no compound SELECT exceeds SQLite's limit."""
+    selects = [f"SELECT {EVENT_COLUMNS} FROM {n}" for n in names]
+    while len(selects) > _MAX_UNION:
+        selects = [f"SELECT {EVENT_COLUMNS} FROM ({' UNION ALL '.join(selects[i:i + _MAX_UNION])})"
+                   for i in range(0, len(selects), _MAX_UNION)]
+    return " UNION ALL ".join(selects)
@@ -0,0 +1,380 @@
+"""
+Content-addressed store for captured payloads (HTTP bodies, files written in the shell).
+
+A payload is saved once under its SHA-256, however many times it is captured:
+
+    <root>/ab/cd/abcd...ef      (two levels of fan-out so no directory grows huge)
+
+Writers hash while data arrives, on the caller's thread (possibly the event loop serving
+every session), and never touch the disk there: up to spill_size bytes are kept in
+memory, and beyond that the chunks are handed to the store's writer thread, which
+streams them to a temp file under <root>/tmp, so a large body is never held whole. On
+close the digest decides: content this process has captured before costs no further
+I/O, new content is written or renamed into place atomically by the writer thread, so
+readers never see a partial file. flush() waits for the writer thread.
+
+Which session captured what is not kept here: handlers emit a "payload" event with
+the digest, and SQLiteStorage indexes it in the payloads / payload_links tables.
+"""
+import atexit
+import hashlib
+import os
+import queue
+import tempfile
+import threading
+
+from logger import get_logger
+from metrics import get_metrics
+
+DEFAULT_SPILL = 256 * 1024
+# spilled bytes waiting for the writer thread; captures past it are truncated
+DEFAULT_MAX_PENDING = 64 * 1024 * 1024
+
+log = get_logger("Payloads")
+
+
+class PayloadRef:
+    """
+    What a capture produced: digest, size, whether it is the first capture of that content
+    in this process, and whether it was cut short (the digest is then of the prefix kept).
+    """
+
+    __slots__ = ("sha256", "size", "new", "truncated")
+
+    def __init__(self, sha256, size, new, truncated=False):
+        self.sha256 = sha256
+        self.size = size
+        self.new = new
+        self.truncated = truncated
+
+    def __repr__(self):
+        return f"PayloadRef({self.sha256[:12]}..., size={self.size}, new={self.new}, truncated={self.truncated})"
+
+
+class PayloadWriter:
+    """
+    Streaming capture of one payload; write() chunks, then close() (or abort()). Both run
+    on the caller's thread; the file work they queue runs on the store's writer thread.
+    """
+
+    def __init__(self, store, max_size=None):
+        self.store = store
+        self.max_size = max_size
+        self.size = 0
+        self.truncated = False
+        self._hash = hashlib.sha256()
+        self._buf = bytearray()
+        self._spilled = False
+        self._done = False
+        # writer thread only
+        self._file = None
+        self._failed = False
+
+    def write(self, data):
+        if self._done or not data:
+            return
+        if self.max_size is not None and self.size + len(data) > self.max_size:
+            data = data[:self.max_size - self.size]
+            self.truncated = True
+            if not data:
+                return
+        if self._spilled:
+            if not self.store._reserve(len(data)):
+                # the disk is not keeping up: keep what was captured so far
+                self.truncated = True
+                self._done_writing()
+                return
+            data = bytes(data)
+            self.store._submit(self._append, data)
+        else:
+            self._buf += data
+        self.size += len(data)
+        self._hash.update(data)
+        if not self._spilled and len(self._buf) > self.store.spill_size:
+            if self.store._reserve(len(self._buf)):
+                self._spilled = True
+                self.store._submit(self._append, bytes(self._buf))
+                self._buf = bytearray()
+            else:
+                self.truncated = True
+                self._done_writing()
+
+    def _done_writing(self):
+        # later write() calls are ignored, close() still stores what came before
+        self.max_size = self.size
+
+    def close(self):
+        """Finish the capture; returns a PayloadRef, or None if nothing was written."""
+        if self._done:
+            return None
+        self._done = True
+        if not self.size:
+            self.abort()
+            return None
+        digest = self._hash.hexdigest()
+        new = self.store._claim(digest)
+        if not new:
+            self.store._deduped(self.size)
+            if self._spilled:
+                self.store._submit(self._discard)
+        elif self._spilled:
+            self.store._submit(self._commit_file, digest)
+        else:
+            self.store._submit(self.store._commit_bytes, digest, bytes(self._buf))
+        self._buf = bytearray()
+        return PayloadRef(digest, self.size, new, self.truncated)
+
+    def abort(self):
+        """Drop a capture that did not complete (e.g. the connection closed mid-body)."""
+        self._done = True
+        self._buf = bytearray()
+        if self._spilled:
+            self.store._submit(self._discard)
+
+    # writer thread
+    def _append(self, data):
+        try:
+            if self._failed:
+                return
+            if self._file is None:
+                self._file = self.store._temp()
+            self._file.write(data)
+        except OSError:
+            # the temp file no longer matches the digest: never commit it
+            self._failed = True
+            self._discard()
+            raise
+        finally:
+            self.store._release(len(data))
+
+    def _commit_file(self, digest):
+        if self._file is None:
+            # _append failed (and logged why): nothing to store
+            self.store._commit_failed(digest, None, "temp file write failed")
+            return
+        self._file.close()
+        path, self._file = self._file.name, None
+        self.store._commit_file(digest, path)
+
+    def _discard(self):
+        if self._file is None:
+            return
+        self._file.close()
+        try:
+            os.unlink(self._file.name)
+        except OSError:
+            pass
+        self._file = None
+
+
+class PayloadStore:
+    """Thread-safe; shared by every handler of the process (see get_payloads())."""
+
+    def __init__(self, root="payloads", spill_size=DEFAULT_SPILL, max_size=64 * 1024 * 1024,
+                 max_known=1000000, max_pending=DEFAULT_MAX_PENDING):
+        self.root = root
+        self.spill_size = int(spill_size)
+        self.max_size = int(max_size) if max_size else None
+        # digests captured by this process: a repeat capture needs no I/O at all
+        self.max_known = int(max_known)
+        self.max_pending = int(max_pending)
+        self._known = set()
+        self._lock = threading.Lock()
+        self._dirs_ready = False
+        self._pending = 0
+        self._jobs = queue.SimpleQueue()
+        self._thread = None
+        self.stored = 0
+        self.deduped = 0
+        self.bytes_stored = 0
+        self.bytes_deduped = 0
+
+    @classmethod
+    def from_config(cls, cfg=None):
+        """Build from a config.STORAGE-style dict."""
+        cfg = cfg or {}
+        return cls(
+            root=cfg.get("payload_dir", "payloads"),
+            spill_size=cfg.get("payload_spill", DEFAULT_SPILL),
+            max_size=cfg.get("payload_max_size", 64 * 1024 * 1024),
+            max_pending=cfg.get("payload_max_pending", DEFAULT_MAX_PENDING),
+        )
+
+    def path(self, sha256):
+        return os.path.join(self.root, sha256[:2], sha256[2:4], sha256)
+
+    def exists(self, sha256):
+        """On disk (call flush() first to include captures still being written)."""
+        return os.path.exists(self.path(sha256))
+
+    def open(self, sha256):
+        """Open a stored payload for reading (binary)."""
+        return open(self.path(sha256), "rb")
+
+    def writer(self, max_size=None):
+        """A PayloadWriter for one streamed capture (max_size defaults to the store's)."""
+        return PayloadWriter(self, self.max_size if max_size is None else max_size)
+
+    def put(self, data):
+        """Store bytes already in memory; returns a PayloadRef (None for empty data)."""
+        w = self.writer()
+        w.write(data)
+        return w.close()
+
+    def flush(self, timeout=None):
+        """Block until the writer thread has done everything queued so far."""
+        if self._thread is None:
+            return
+        done = threading.Event()
+        self._jobs.put((done.set, ()))
+        done.wait(timeout)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "stored": self.stored,
+                "deduped": self.deduped,
+                "bytes_stored": self.bytes_stored,
+                "bytes_deduped": self.bytes_deduped,
+                "pending_bytes": self._pending,
+            }
+
+    # ---------------------------
+    # Caller side
+    # ---------------------------
+    def _submit(self, fn, *args):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="payload-writer", daemon=True)
+                    self._thread.start()
+                    atexit.register(self.flush)
+        self._jobs.put((fn, args))
+
+    def _reserve(self, size):
+        with self._lock:
+            if self._pending + size > self.max_pending:
+                return False
+            self._pending += size
+            return True
+
+    def _release(self, size):
+        with self._lock:
+            self._pending -= size
+
+    def _claim(self, digest):
+        """True the first time this process captures digest (until a failed commit unclaims it)."""
+        with self._lock:
+            if digest in self._known:
+                return False
+            if len(self._known) >= self.max_known:
+                self._known.clear()
+            self._known.add(digest)
+            return True
+
+    def _commit_failed(self, digest, temp_path, error):
+        # the next capture of this content must try to store it again
+        with self._lock:
+            self._known.discard(digest)
+        if temp_path is not None:
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+        log.error("Payload {sha256} not stored: {error}", sha256=digest, error=error)
+
+    def _deduped(self, size):
+        with self._lock:
+            self.deduped += 1
+            self.bytes_deduped += size
+
+    # ---------------------------
+    # Writer thread
+    # ---------------------------
+    def _run(self):
+        while True:
+            fn, args = self._jobs.get()
+            try:
+                fn(*args)
+            except Exception as e:
+                log.error("Payload write failed: {error}", error=e)
+
+    def _temp(self):
+        tmp = os.path.join(self.root, "tmp")
+        if not self._dirs_ready:
+            os.makedirs(tmp, exist_ok=True)
+            self._dirs_ready = True
+        return tempfile.NamedTemporaryFile(dir=tmp, delete=False)
+
+    def _stored(self, size):
+        with self._lock:
+            self.stored += 1
+            self.bytes_stored += size
+
+    def _commit_bytes(self, digest, data):
+        # stored by an earlier run or another --workers process
+        if os.path.exists(self.path(digest)):
+            self._deduped(len(data))
+            return False
+        f = None
+        try:
+            with self._temp() as f:
+                f.write(data)
+            return self._place(digest, f.name, len(data))
+        except OSError as e:
+            self._commit_failed(digest, f.name if f is not None else None, e)
+            return False
+
+    def _commit_file(self, digest, temp_path):
+        try:
+            size = os.path.getsize(temp_path)
+            if os.path.exists(self.path(digest)):
+                os.unlink(temp_path)
+                self._deduped(size)
+                return False
+            return self._place(digest, temp_path, size)
+        except OSError as e:
+            self._commit_failed(digest, temp_path, e)
+            return False
+
+    def _place(self, digest, temp_path, size):
+        final = self.path(digest)
+        os.makedirs(os.path.dirname(final), exist_ok=True)
+        # atomic; another worker storing the same content at the same time is harmless
+        os.replace(temp_path, final)
+        self._stored(size)
+        return True
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def init_payloads(cfg=None):
+    """(Re)create the process-wide payload store from a config.STORAGE-style dict."""
+    global _shared
+    with _shared_lock:
+        _shared = PayloadStore.from_config(cfg)
+    return _shared
+
+
+def get_payloads():
+    """Process-wide payload store shared by every handler (defaults until init_payloads())."""
+    if _shared is None:
+        return init_payloads()
+    return _shared
+
+
+def _stat(name):
+    # nothing is reported until a store exists (reading the stats must not create one)
+    return lambda: _shared.stats()[name] if _shared is not None else None
+
+
+_metrics = get_metrics()
+_metrics.callback("honeypot_payloads_stored_total", "Distinct payloads written to the store", "counter",
+                  _stat("stored"))
+_metrics.callback("honeypot_payloads_deduped_total", "Captures already in the store", "counter", _stat("deduped"))
+_metrics.callback("honeypot_payloads_stored_bytes_total", "Bytes written to the store", "counter",
+                  _stat("bytes_stored"))
+_metrics.callback("honeypot_payloads_deduped_bytes_total", "Captured bytes not written again", "counter",
+                  _stat("bytes_deduped"))
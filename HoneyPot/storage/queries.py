@@ -0,0 +1,163 @@
+"""
+Read API for SQLiteStorage (mixed into the class).
+
+Everything runs on the read-only connection pool (SQLiteStorage.reader), so queries
+never block the writer thread. Aggregations are done by SQLite over the typed tables
+(auth_attempts, commands, geoip, events) using the indexes in QUERY_INDEXES, most of
+them covering, i.e. answered from the index alone without touching the table rows.
+Payloads are only decoded for the rows of a returned page.
+
+Long lists use keyset pagination: pass the last `id` you got as `after_id` to get the
+next page (cost stays O(page) however deep you go, unlike OFFSET).
+"""
+# (name, table, columns). Secondary indexes also carry the rowid (= id), so an index on
+# (session_id) already returns a session's rows in id order.
+QUERY_INDEXES = (
+    ("idx_auth_user_pass", "auth_attempts", "username, password, timestamp"),
+    ("idx_auth_pass", "auth_attempts", "password, timestamp"),
+    ("idx_auth_session", "auth_attempts", "session_id"),
+    ("idx_cmd_command", "commands", "command, timestamp"),
+    ("idx_cmd_session", "commands", "session_id"),
+    ("idx_payload_links_session", "payload_links", "session_id, sha256"),
+    ("idx_payload_links_sha", "payload_links", "sha256"),
+    ("idx_payloads_hits", "payloads", "hits, sha256"),
+)
+
+
+def _since(column, since, args):
+    if since is None:
+        return ""
+    args.append(since)
+    return f" WHERE {column} >= ?"
+
+
+class QueryMixin:
+    """Attacker / session queries. Expects query(), events_source() and decode_payload() from SQLiteStorage."""
+
+    # ---------------------------
+    # Credentials
+    # ---------------------------
+    def top_usernames(self, limit=10, since=None):
+        """[(username, attempts)] most tried first; since = UTC "YYYY-MM-DD HH:MM:SS"."""
+        args = []
+        sql = (f"SELECT username, count(*) AS n FROM auth_attempts{_since('timestamp', since, args)} "
+               f"GROUP BY username ORDER BY n DESC, username LIMIT ?")
+        return self.query(sql, args + [int(limit)])
+
+    def top_passwords(self, limit=10, since=None):
+        """[(password, attempts)] most tried first."""
+        args = []
+        sql = (f"SELECT password, count(*) AS n FROM auth_attempts{_since('timestamp', since, args)} "
+               f"GROUP BY password ORDER BY n DESC, password LIMIT ?")
+        return self.query(sql, args + [int(limit)])
+
+    def top_credentials(self, limit=10, since=None):
+        """[(username, password, attempts)] most tried pairs first."""
+        args = []
+        sql = (f"SELECT username, password, count(*) AS n FROM auth_attempts{_since('timestamp', since, args)} "
+               f"GROUP BY username, password ORDER BY n DESC LIMIT ?")
+        return self.query(sql, args + [int(limit)])
+
+    def top_attackers(self, limit=10, since=None):
+        """[(src_ip, login attempts)] busiest IPs first."""
+        args = []
+        sql = (f"SELECT src_ip, count(*) AS n FROM auth_attempts{_since('timestamp', since, args)} "
+               f"GROUP BY src_ip ORDER BY n DESC LIMIT ?")
+        return self.query(sql, args + [int(limit)])
+
+    # ---------------------------
+    # Commands / sessions
+    # ---------------------------
+    def top_commands(self, limit=10, since=None):
+        """[(command, times run)] most frequent first."""
+        args = []
+        sql = (f"SELECT command, count(*) AS n FROM commands{_since('timestamp', since, args)} "
+               f"GROUP BY command ORDER BY n DESC, command LIMIT ?")
+        return self.query(sql, args + [int(limit)])
+
+    def session_replay(self, session_id, after_id=0, limit=500):
+        """
+        A session as recorded: its sessions row (if any), login attempts and one page of
+        commands in execution order. Page further with after_id=result["next_after_id"].
+        """
+        keys = ("session_id", "proto", "src_ip", "src_port", "username", "start_time", "end_time", "duration",
+                "authenticated", "auth_attempts", "commands", "bytes_in", "bytes_out")
+        session = self.query(f"SELECT {', '.join(keys)} FROM sessions WHERE session_id = ?", (session_id,))
+        auth = [] if after_id else self.query(
+            "SELECT id, username, password, attempt_number, timestamp FROM auth_attempts "
+            "WHERE session_id = ? ORDER BY id", (session_id,))
+        commands = self.query("SELECT id, command, timestamp FROM commands "
+                              "WHERE session_id = ? AND id > ? ORDER BY id LIMIT ?",
+                              (session_id, int(after_id), int(limit)))
+        payloads = [] if after_id else self.query(
+            "SELECT id, sha256, source, name, timestamp FROM payload_links "
+            "WHERE session_id = ? ORDER BY id", (session_id,))
+        return {
+            "session": dict(zip(keys, session[0])) if session else None,
+            "auth_attempts": [dict(zip(("id", "username", "password", "attempt", "timestamp"), r)) for r in auth],
+            "commands": [dict(zip(("id", "command", "timestamp"), r)) for r in commands],
+            "payloads": [dict(zip(("id", "sha256", "source", "name", "timestamp"), r)) for r in payloads],
+            "next_after_id": commands[-1][0] if len(commands) == int(limit) else None,
+        }
+
+    # ---------------------------
+    # Captured payloads
+    # ---------------------------
+    def top_payloads(self, limit=10):
+        """[(sha256, size, hits, first_seen, last_seen)] most often captured first."""
+        return self.query("SELECT sha256, size, hits, first_seen, last_seen FROM payloads "
+                          "ORDER BY hits DESC, sha256 LIMIT ?", (int(limit),))
+
+    def payload_sightings(self, sha256, after_id=0, limit=100):
+        """
+        One page of the captures of a payload: [(id, session_id, src_ip, source, name, timestamp)],
+        oldest first. Page further with after_id = the last id.
+        """
+        return self.query("SELECT id, session_id, src_ip, source, name, timestamp FROM payload_links "
+                          "WHERE sha256 = ? AND id > ? ORDER BY id LIMIT ?",
+                          (sha256, int(after_id), int(limit)))
+
+    # ---------------------------
+    # IPs / geography
+    # ---------------------------
+    def ip_timeline(self, ip, after_id=0, limit=100, start=None, end=None):
+        """
+        One page of every event from ip, oldest first, as dicts with the payload decoded.
+        Returns (events, next_after_id); next_after_id is None on the last page.
+        """
+        sql = (f"SELECT id, type, src_port, payload, timestamp FROM {self.events_source(start, end)} "
+               f"WHERE src_ip = ? AND id > ?")
+        args = [ip, int(after_id)]
+        if start is not None:
+            sql += " AND timestamp >= ?"
+            args.append(start)
+        if end is not None:
+            sql += " AND timestamp < ?"
+            args.append(end)
+        rows = self.query(sql + " ORDER BY id LIMIT ?", args + [int(limit)])
+        events = [{"id": i, "type": t, "src_port": p, "payload": self.decode_payload(pl) if pl else None, "timestamp": ts}
+                  for i, t, p, pl, ts in rows]
+        return events, (rows[-1][0] if len(rows) == int(limit) else None)
+
+    def connections_per_country(self, limit=None, start=None, end=None):
+        """
+        [(country, connections, distinct IPs)] most connections first. Connections are
+        counted per IP from the events index first, then joined with geoip once per IP.
+        """
+        args = []
+        where = "type = 'connection'"
+        if start is not None:
+            where += " AND timestamp >= ?"
+            args.append(start)
+        if end is not None:
+            where += " AND timestamp < ?"
+            args.append(end)
+        sql = (f"SELECT coalesce(g.country, 'Unknown') AS country, sum(c.n) AS n, count(*) AS ips "
+               f"FROM (SELECT src_ip, count(*) AS n FROM {self.events_source(start, end)} "
+               f"      WHERE {where} GROUP BY src_ip) AS c "
+               f"LEFT JOIN geoip AS g ON g.src_ip = c.src_ip "
+               f"GROUP BY country ORDER BY n DESC")
+        if limit is not None:
+            sql += " LIMIT ?"
+            args.append(int(limit))
+        return self.query(sql, args)
@@ -0,0 +1,63 @@
+import queue
+import signal
+import time
+
+from metrics import get_metrics, init_metrics
+from storage.backends import StorageBackend, create_storage
+
+
+class QueueStorage(StorageBackend):
+    """
+    Storage front-end used by worker processes in --workers mode.
+
+    save_event() pushes the event onto a multiprocessing queue shared with the single
+    writer process (see run_writer), so SQLite only ever has one writer no matter how
+    many workers accept connections.
+    """
+    def __init__(self, mp_queue):
+        self.queue = mp_queue
+        self.dropped = 0
+        # same names as SQLiteStorage's: in a worker they describe the queue to the writer
+        metrics = get_metrics()
+        metrics.callback("honeypot_storage_queue_depth", "Events waiting for the writer process", "gauge",
+                         self.queue.qsize)
+        metrics.callback("honeypot_storage_dropped_total", "Events dropped because the queue was full",
+                         "counter", lambda: self.dropped)
+
+    def save_event(self, etype, ip, port, paylaod, ts=None):
+        try:
+            # stamped here: the writer may commit it seconds later under a backlog
+            self.queue.put_nowait((etype, ip, port, paylaod, time.time() if ts is None else ts))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def flush(self, timeout=None):
+        pass
+
+    def close(self):
+        # wait for the feeder thread to hand everything to the pipe
+        self.queue.close()
+        self.queue.join_thread()
+
+
+def run_writer(mp_queue, db_path, storage_cfg=None, metrics_cfg=None):
+    """
+    Writer process entry point: drain the shared queue into the configured storage
+    backend (storage/backends.py) until the supervisor sends the None sentinel. Its
+    metrics are served on the configured port (workers use the ones after it).
+    """
+    # Ctrl-C reaches the whole process group; shutdown is driven by the supervisor
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    init_metrics(metrics_cfg)
+    db = create_storage(storage_cfg, db_path)
+    try:
+        while True:
+            item = mp_queue.get()
+            if item is None:
+                break
+            etype, ip, port, payload, ts = item
+            db.save_event(etype, ip, port, payload, ts=ts)
+    finally:
+        db.close()
@@ -1,34 +1,241 @@
+import atexit
+import queue
+import re
 import sqlite3
 import json
 import threading
 import time
-
-class SQLiteStorage:
-    def __init__(self, db_path="honeypot.db"):
+from contextlib import contextmanager
+from urllib.parse import quote
+
+from logger import get_logger
+from metrics import get_metrics
+from storage.backends import StorageBackend
+from storage.codec import STRINGS_TABLE, StringTable, Encoder, Decoder
+from storage.export import DEFAULT_TABLES as EXPORT_DEFAULT_TABLES, export_tables
+from storage.queries import QueryMixin, QUERY_INDEXES
+from storage.partitions import (PARTITIONS, LEGACY_SHARD, EVENT_COLUMNS, EVENT_JSON_COLUMNS, format_ts,
+                                shard_for, create_shard_sql, union_sql)
+
+_STOP = object()
+# queue item tag for save_replayed(): a chunk of events committed with its log position
+_REPLAY = object()
+
+log = get_logger("Storage")
+
+# Applied to every connection when it is opened (see https://sqlite.org/pragma.html).
+DEFAULT_PRAGMAS = {
+    "auto_vacuum": "INCREMENTAL",  # only takes effect on a new database; lets dropped shards be freed
+    "journal_mode": "WAL",     # readers and the writer don't block each other
+    "synchronous": "NORMAL",   # with WAL: fsync at checkpoints, not at every commit
+    "cache_size": -16000,      # negative = KiB, so 16 MB of page cache per connection
+    "mmap_size": 268435456,    # read up to 256 MB of the file through mmap
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,      # ms
+}
+# the subset that is per-connection and makes sense on read-only connections
+READER_PRAGMAS = ("cache_size", "mmap_size", "temp_store", "busy_timeout")
+# per-connection prepared statement cache (sqlite3 default is 128)
+STATEMENT_CACHE = 256
+
+# events per committed batch, for the honeypot_storage_batch_events histogram
+BATCH_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+_PRAGMA_VALUE = re.compile(r"^-?[\w.]+$")
+
+INSERT_EVENT = "INSERT INTO events (type, src_ip, src_port, payload, timestamp) VALUES (?, ?, ?, ?, ?)"
+SAVE_LOG_CHECKPOINT = "INSERT OR REPLACE INTO log_checkpoint (log_dir, segment, position) VALUES (?, ?, ?)"
+
+PAYLOAD_CODECS = ("binary", "json")
+
+# sessions columns added after the original schema (ALTER TABLE'd into older databases)
+SESSION_TOTALS = (("proto", "TEXT"), ("authenticated", "INTEGER"), ("auth_attempts", "INTEGER"),
+                  ("commands", "INTEGER"), ("bytes_in", "INTEGER"), ("bytes_out", "INTEGER"))
+
+
+def apply_pragmas(conn, pragmas, only=None):
+    """Run PRAGMA name=value for each item (names/values can't be bound as parameters)."""
+    for name, value in pragmas.items():
+        if only is not None and name not in only:
+            continue
+        if not name.isidentifier() or not _PRAGMA_VALUE.match(str(value)):
+            raise ValueError(f"Invalid pragma {name}={value!r}")
+        conn.execute(f"PRAGMA {name}={value}").fetchall()
+
+
+class SQLiteStorage(QueryMixin, StorageBackend):
+    """
+    Write-behind SQLite storage.
+
+    save_event() (called by BaseHandler.emit) only enqueues and returns immediately,
+    so handlers never wait on the database. A dedicated writer thread owns one
+    persistent connection and drains the queue in batches: up to batch_size events,
+    or whatever arrived within flush_interval seconds, are written in one transaction.
+
+    Readers (dashboards, exports, queries) borrow read-only connections from a small
+    pool via reader(); with the default WAL journal they see a consistent snapshot and
+    never block the writer. `pragmas` overrides/extends DEFAULT_PRAGMAS.
+
+    With partition="day" or "week", events are written to one table per period behind
+    an `events` view (see storage/partitions.py), and shards older than retention_days
+    are dropped whole.
+
+    Payloads are stored in the compact binary format of storage/codec.py (or as JSON
+    text with payload_codec="json"); the events_json view shows them as JSON.
+
+    Read queries (top credentials/commands, timelines, session replay, ...) come from
+    QueryMixin (storage/queries.py).
+
+    export() streams the rows added since the previous export to compressed JSONL and
+    Parquet files (storage/export.py).
+
+    Queue depth, dropped events and the writer's batch sizes and commit latency are
+    exported through the process-wide metrics registry (metrics.py).
+    """
+    def __init__(self, db_path="honeypot.db", batch_size=500, flush_interval=0.5, queue_size=100000,
+                 pragmas=None, read_pool_size=4, partition=None, retention_days=None,
+                 payload_codec="binary", intern_limit=100000):
+        if partition is not None and partition not in PARTITIONS:
+            raise ValueError(f"Unknown partition '{partition}', expected one of {PARTITIONS}")
+        if payload_codec not in PAYLOAD_CODECS:
+            raise ValueError(f"Unknown payload_codec '{payload_codec}', expected one of {PAYLOAD_CODECS}")
         self.db_path = db_path
-        self.lock = threading.Lock()
+        self.partition = partition
+        self.retention_days = retention_days
+        # writer-side shard state: (name, start, end, insert sql) and the next global event id
+        self._shard = None
+        self._next_id = 1
+        # writer-side string dictionary; the decoder is shared by all readers
+        self._strings = StringTable(intern_limit)
+        if payload_codec == "binary":
+            self._encode = Encoder(self._strings).encode
+        else:
+            self._encode = lambda etype, payload: json.dumps(payload)
+        self._decoder = Decoder(self._fetch_strings)
+        self.batch_size = int(batch_size)
+        self.flush_interval = float(flush_interval)
+        self.queue = queue.Queue(maxsize=int(queue_size))
+        self.pragmas = dict(DEFAULT_PRAGMAS, **(pragmas or {}))
+        self._readers = queue.LifoQueue(maxsize=int(read_pool_size))
+        self.dropped = 0
+        # batches rolled back so far (LogStorage checks it before moving its checkpoint)
+        self.commit_errors = 0
+        self._closed = False
+        self._init_metrics()
         self._init_db()
 
+        self._writer = threading.Thread(target=self._writer_loop, name="sqlite-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    @classmethod
+    def from_config(cls, db_path, cfg=None):
+        """Build from a config.STORAGE-style dict."""
+        cfg = cfg or {}
+        return cls(
+            db_path,
+            batch_size=cfg.get("batch_size", 500),
+            flush_interval=cfg.get("flush_interval", 0.5),
+            queue_size=cfg.get("queue_size", 100000),
+            pragmas=cfg.get("pragmas"),
+            read_pool_size=cfg.get("read_pool_size", 4),
+            partition=cfg.get("partition"),
+            retention_days=cfg.get("retention_days"),
+            payload_codec=cfg.get("payload_codec", "binary"),
+            intern_limit=cfg.get("intern_limit", 100000),
+        )
+
+    def _init_metrics(self):
+        metrics = get_metrics()
+        metrics.callback("honeypot_storage_queue_depth", "Events waiting for the writer thread", "gauge",
+                         self.queue.qsize)
+        metrics.callback("honeypot_storage_dropped_total", "Events dropped because the queue was full",
+                         "counter", lambda: self.dropped)
+        self._written = metrics.counter("honeypot_storage_events_written_total", "Events committed")
+        self._commit_errors = metrics.counter("honeypot_storage_commit_errors_total", "Batches rolled back")
+        self._commit_seconds = metrics.histogram("honeypot_storage_commit_seconds",
+                                                 "Time to write and commit one batch")
+        self._batch_events = metrics.histogram("honeypot_storage_batch_events", "Events per committed batch",
+                                               buckets=BATCH_BUCKETS)
 
     def _connect(self):
-        return sqlite3.connect(self.db_path, check_same_thread=False)
-    
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, cached_statements=STATEMENT_CACHE)
+        apply_pragmas(conn, self.pragmas)
+        conn.create_function("payload_json", 1, self._decoder.decode_json, deterministic=True)
+        return conn
+
+    def _connect_reader(self):
+        uri = f"file:{quote(self.db_path)}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False, cached_statements=STATEMENT_CACHE)
+        apply_pragmas(conn, self.pragmas, only=READER_PRAGMAS)
+        conn.execute("PRAGMA query_only=1")
+        conn.create_function("payload_json", 1, self._decoder.decode_json, deterministic=True)
+        return conn
+
+    @contextmanager
+    def reader(self):
+        """Borrow a read-only connection from the pool (opened on demand)."""
+        try:
+            conn = self._readers.get_nowait()
+        except queue.Empty:
+            conn = self._connect_reader()
+        try:
+            yield conn
+        finally:
+            # an open read transaction would pin the WAL and stop checkpoints
+            if conn.in_transaction:
+                conn.rollback()
+            try:
+                self._readers.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+    def query(self, sql, params=()):
+        """Run a read-only query on a pooled connection and return all rows."""
+        with self.reader() as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def export(self, out_dir, tables=EXPORT_DEFAULT_TABLES, formats=("jsonl",), full=False, **kwargs):
+        """
+        Export rows above each table's high-water mark (kept in out_dir) to rotating
+        compressed JSONL / Parquet files, reading pages on the read-only pool so the
+        writer thread is never blocked. Returns {table: (rows, [files])}.
+        """
+        return export_tables(self.reader, out_dir, tables, formats, decode=self._decoder.decode_json,
+                             full=full, **kwargs)
+
+    def _fetch_strings(self, min_id):
+        return self.query("SELECT id, value FROM strings WHERE id >= ?", (min_id,))
+
+    def decode_payload(self, payload):
+        """events.payload (binary record or legacy JSON text) -> dict."""
+        return self._decoder.decode(payload)
 
     def _init_db(self):
         conn = self._connect()
         cur = conn.cursor()
 
         # EVENTS TABLE (universal logs)
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS events (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                type TEXT NOT NULL,
-                src_ip TEXT NOT NULL,
-                src_port INTEGER,
-                payload TEXT,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-            );
-        """)
+        if self.partition is None:
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    type TEXT NOT NULL,
+                    src_ip TEXT NOT NULL,
+                    src_port INTEGER,
+                    payload BLOB,
+                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+                );
+            """)
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_events_ip ON events(src_ip)")
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_events_type_ip ON events(type, src_ip)")
+        else:
+            self._init_shards(cur)
+
+        # payload dictionary + decode view (payload_json() is registered by _connect/_connect_reader)
+        cur.execute(STRINGS_TABLE)
+        cur.execute("DROP VIEW IF EXISTS events_json")
+        cur.execute(f"CREATE VIEW events_json AS SELECT {EVENT_JSON_COLUMNS} FROM events")
 
         #Sessions
         cur.execute("""
@@ -43,6 +250,10 @@ class SQLiteStorage:
                 duration REAL
             );
         """)
+        have = {row[1] for row in cur.execute("PRAGMA table_info(sessions)")}
+        for column, ctype in SESSION_TOTALS:
+            if column not in have:
+                cur.execute(f"ALTER TABLE sessions ADD COLUMN {column} {ctype}")
 
         # AUTH ATTEMPTS
         cur.execute("""
@@ -57,7 +268,7 @@ class SQLiteStorage:
             );
         """)
 
-        
+
         # COMMANDS
         cur.execute("""
             CREATE TABLE IF NOT EXISTS commands (
@@ -86,74 +297,378 @@ class SQLiteStorage:
         """)
 
 
+        # CAPTURED PAYLOADS (content in storage/payloads.py, keyed by SHA-256)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS payloads (
+                sha256 TEXT PRIMARY KEY,
+                size INTEGER,
+                hits INTEGER,
+                first_seen DATETIME,
+                last_seen DATETIME
+            ) WITHOUT ROWID;
+        """)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS payload_links (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                sha256 TEXT NOT NULL,
+                session_id TEXT,
+                src_ip TEXT,
+                source TEXT,
+                name TEXT,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+            );
+        """)
+
+        # how far LogStorage has replayed its segment log, committed with the replayed rows
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS log_checkpoint (
+                log_dir TEXT PRIMARY KEY,
+                segment INTEGER NOT NULL,
+                position INTEGER NOT NULL
+            );
+        """)
+
         # INDEXES (important for performance)
-        cur.execute("CREATE INDEX IF NOT EXISTS idx_events_ip ON events(src_ip)")
         cur.execute("CREATE INDEX IF NOT EXISTS idx_auth_ip ON auth_attempts(src_ip)")
         cur.execute("CREATE INDEX IF NOT EXISTS idx_cmd_ip ON commands(src_ip)")
         cur.execute("CREATE INDEX IF NOT EXISTS idx_geoip_ip ON geoip(src_ip)")
+        for name, table, columns in QUERY_INDEXES:
+            cur.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table}({columns})")
 
         conn.commit()
         conn.close()
 
-    #MAIN event saver (called by baseHandler.emit)
-    def save_event(self, etype, ip, port, paylaod):
-        with self.lock:
-            conn = self._connect()
-            cur = conn.cursor()
-
-            #Insert JSON payload in event table
-            cur.execute("""
-                INSERT INTO events (type, src_ip, src_port, payload)
-                VALUES (?, ?, ?, ?)
-            """,(etype, ip, port, json.dumps(paylaod)))
+    # ---------------------------
+    # Event shards (partition mode)
+    # ---------------------------
+    def _init_shards(self, cur):
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS event_shards (
+                name TEXT PRIMARY KEY,
+                start_ts TEXT,
+                end_ts TEXT
+            );
+        """)
+        kind = cur.execute("SELECT type FROM sqlite_master WHERE name = 'events'").fetchone()
+        if kind is not None and kind[0] == "table":
+            # one-off migration: the old single table becomes a shard (a rename, no copy)
+            cur.execute(f"ALTER TABLE events RENAME TO {LEGACY_SHARD}")
+            # end is exclusive, like the other shards
+            lo, hi = cur.execute(f"SELECT min(timestamp), datetime(max(timestamp), '+1 second') "
+                                 f"FROM {LEGACY_SHARD}").fetchone()
+            cur.execute("INSERT OR REPLACE INTO event_shards VALUES (?, ?, ?)", (LEGACY_SHARD, lo or "", hi or ""))
+        # (the migration above registers it; on later opens `events` is the view)
+        if cur.execute("SELECT 1 FROM event_shards WHERE name = ?", (LEGACY_SHARD,)).fetchone():
+            # the legacy table predates the (type, src_ip) index the shards have
+            cur.execute(f"CREATE INDEX IF NOT EXISTS idx_events_type_ip ON {LEGACY_SHARD}(type, src_ip)")
+        # ids stay globally unique and increasing across shards
+        names = [n for (n,) in cur.execute("SELECT name FROM event_shards").fetchall()]
+        self._next_id = 1 + max([cur.execute(f"SELECT max(id) FROM {n}").fetchone()[0] or 0 for n in names] or [0])
+        self._rollover(cur, time.time())
+
+    def _rollover(self, cur, now):
+        """Make the shard for `now` current, apply retention and rebuild the view. Returns shards dropped."""
+        name, start, end = shard_for(now, self.partition)
+        for sql in create_shard_sql(name):
+            cur.execute(sql)
+        cur.execute("INSERT OR IGNORE INTO event_shards (name, start_ts, end_ts) VALUES (?, ?, ?)", (name, start, end))
+        self._shard = (name, start, end, f"INSERT INTO {name} ({EVENT_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?)")
+
+        dropped = 0
+        if self.retention_days is not None:
+            cutoff = format_ts(now - float(self.retention_days) * 86400)
+            old = cur.execute("SELECT name FROM event_shards WHERE end_ts <= ? AND name != ?", (cutoff, name)).fetchall()
+            for (old_name,) in old:
+                cur.execute(f"DROP TABLE IF EXISTS {old_name}")
+                cur.execute("DELETE FROM event_shards WHERE name = ?", (old_name,))
+                dropped += 1
+
+        names = [n for (n,) in cur.execute("SELECT name FROM event_shards ORDER BY start_ts").fetchall()]
+        cur.execute("DROP VIEW IF EXISTS events")
+        cur.execute(f"CREATE VIEW events AS {union_sql(names)}")
+        return dropped
+
+    def _widen_shard(self, cur, rows):
+        """
+        Events replayed late (LogStorage) keep their own timestamps but still go to the
+        current shard, so ids stay increasing shard after shard; its recorded range is
+        widened to cover them instead, keeping events_source() pruning correct.
+        """
+        name, start, end, _ = self._shard
+        lo = min(row[4] for row in rows)
+        hi = max(row[4] for row in rows)
+        if lo < start or hi >= end:
+            cur.execute("UPDATE event_shards SET start_ts = min(start_ts, ?), "
+                        "end_ts = max(end_ts, datetime(?, '+1 second')) WHERE name = ?", (lo, hi, name))
+
+    def shards(self):
+        """[(name, start, end)] of the event shards, oldest first ([] when not partitioned)."""
+        if self.partition is None:
+            return []
+        return self.query("SELECT name, start_ts, end_ts FROM event_shards ORDER BY start_ts")
+
+    def events_source(self, start=None, end=None):
+        """
+        FROM-clause source for events in [start, end) (UTC "YYYY-MM-DD HH:MM:SS", None =
+        unbounded) that reads only the overlapping shards. Callers still filter on timestamp.
+        """
+        if self.partition is None:
+            return "events"
+        sql, params = "SELECT name FROM event_shards WHERE 1 = 1", []
+        if start is not None:
+            sql += " AND end_ts > ?"
+            params.append(start)
+        if end is not None:
+            sql += " AND start_ts < ?"
+            params.append(end)
+        names = [n for (n,) in self.query(sql + " ORDER BY start_ts", params)]
+        if not names:
+            return f"(SELECT {EVENT_COLUMNS} FROM {self._shard[0]} WHERE 0)"
+        if len(names) == 1:
+            return names[0]
+        return f"({union_sql(names)})"
+
+    def select_events(self, start=None, end=None, where=None, params=(), limit=None):
+        """Rows of (id, type, src_ip, src_port, payload JSON, timestamp) in [start, end), by id."""
+        sql, args = f"SELECT {EVENT_JSON_COLUMNS} FROM {self.events_source(start, end)} WHERE 1 = 1", []
+        if start is not None:
+            sql += " AND timestamp >= ?"
+            args.append(start)
+        if end is not None:
+            sql += " AND timestamp < ?"
+            args.append(end)
+        if where:
+            sql += f" AND ({where})"
+            args.extend(params)
+        sql += " ORDER BY id"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        return self.query(sql, args)
 
-            conn.commit()
+    #MAIN event saver (called by baseHandler.emit)
+    def save_event(self, etype, ip, port, paylaod, ts=None):
+        """
+        Enqueue an event for the writer thread. Never blocks the caller. ts (epoch
+        seconds) is when it happened, for events replayed late; None = when committed.
+        """
+        if self._closed:
+            return False
+        try:
+            self.queue.put_nowait((etype, ip, port, paylaod, ts))
+            return True
+        except queue.Full:
+            # shedding is better than stalling the attacker-facing path
+            self.dropped += 1
+            return False
+
+    def save_replayed(self, events, position):
+        """
+        Enqueue events replayed from a log ((etype, ip, port, payload, ts) tuples) to be
+        committed in one transaction together with position (log_dir, segment, offset),
+        which log_checkpoint(log_dir) then returns. False if the queue is full.
+        """
+        if self._closed:
+            return False
+        try:
+            self.queue.put_nowait((_REPLAY, events, position, None, None))
+            return True
+        except queue.Full:
+            return False
+
+    def log_checkpoint(self, log_dir):
+        """(segment, offset) of the last committed save_replayed() chunk of log_dir, or None."""
+        rows = self.query("SELECT segment, position FROM log_checkpoint WHERE log_dir = ?", (log_dir,))
+        return tuple(rows[0]) if rows else None
+
+    def flush(self, timeout=None):
+        """Block until every event queued so far has been committed."""
+        if not self._writer.is_alive():
+            return
+        done = threading.Event()
+        self.queue.put((None, done, None, None, None))
+        done.wait(timeout)
+
+    def close(self):
+        """Flush pending events, stop the writer thread and close its connection."""
+        if self._closed:
+            return
+        self._closed = True
+        self.queue.put(_STOP)
+        self._writer.join()
+        while True:
+            try:
+                self._readers.get_nowait().close()
+            except queue.Empty:
+                break
+
+    # ---------------------------
+    # Writer thread
+    # ---------------------------
+    def _next_batch(self):
+        """Wait for one item, then gather more until batch_size, flush_interval or a flush() marker."""
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        # someone waits on a flush() marker: commit what is there instead of waiting for more
+        while len(batch) < self.batch_size and batch[-1] is not _STOP and batch[-1][0] is not None:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self.queue.get(timeout=remaining))
+                else:
+                    batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _writer_loop(self):
+        conn = self._connect()
+        self._strings.load(conn)
+        try:
+            while True:
+                batch = self._next_batch()
+                stop = batch[-1] is _STOP
+                if stop:
+                    batch.pop()
+                self._write_batch(conn, batch)
+                if stop:
+                    return
+        finally:
             conn.close()
 
-            #dispatch to specific tables
-
-            if etype == "connection":
-                self.save_geoip(paylaod)
-            if etype == "auth_attempt":
-                self.save_auth_attempt(paylaod)
-            if etype == "command":
-                self.save_command(paylaod)
-            if etype == "session_end":
-                self.close_session(paylaod)
-
+    def _write_batch(self, conn, batch):
+        waiters = []
+        rows = []
+        started = time.perf_counter()
+        cur = conn.cursor()
+        now = time.time()
+        now_ts = format_ts(now)
+        if self.partition is not None and now_ts >= self._shard[2]:
+            self._roll_to(conn, now)
+        stamps = {}
+        position = None
+        for item in batch:
+            if item[0] is None:
+                # flush() marker: released once everything before it is committed
+                waiters.append(item[1])
+                continue
+            if item[0] is _REPLAY:
+                _, events, position, _, _ = item
+            else:
+                events = (item,)
+            for etype, ip, port, payload, ts in events:
+                if ts is None:
+                    stamp = now_ts
+                else:
+                    # replayed events arrive in time order: one format_ts per second, not per event
+                    stamp = stamps.get(int(ts))
+                    if stamp is None:
+                        stamp = stamps[int(ts)] = format_ts(ts)
+                try:
+                    encoded = self._encode(etype, payload)
+                    self._apply(cur, etype, payload, stamp)
+                    # only once its table rows are in: a malformed event leaves no trace at all
+                    rows.append((etype, ip, port, encoded, stamp))
+                except Exception as e:
+                    log.error("Dropping malformed {etype} event from {ip}: {error}", etype=etype, ip=ip, error=e)
+        try:
+            self._strings.flush(cur)
+            self._insert_events(cur, rows)
+            if position is not None:
+                cur.execute(SAVE_LOG_CHECKPOINT, position)
+            conn.commit()
+            self._strings.commit()
+            if rows:
+                self._written.inc(len(rows))
+                self._batch_events.observe(len(rows))
+                self._commit_seconds.observe(time.perf_counter() - started)
+        except sqlite3.Error as e:
+            log.error("Batch commit failed ({events} events): {error}", events=len(batch), error=e)
+            self.commit_errors += 1
+            self._commit_errors.inc()
+            conn.rollback()
+            # forget the strings interned by the lost batch
+            self._strings.load(conn)
+        for done in waiters:
+            done.set()
+
+    def _roll_to(self, conn, now):
+        # committed on its own, so a failed batch can't roll back the new shard
+        try:
+            dropped = self._rollover(conn.cursor(), now)
+            conn.commit()
+        except sqlite3.Error as e:
+            log.error("Shard rollover failed: {error}", error=e)
+            conn.rollback()
+            return
+        if dropped:
+            # hand the dropped shards' pages back to the filesystem
+            conn.execute("PRAGMA incremental_vacuum").fetchall()
+
+    def _insert_events(self, cur, rows):
+        # one prepared statement stepped over the whole batch
+        if self.partition is None:
+            cur.executemany(INSERT_EVENT, rows)
+            return
+        if not rows:
+            return
+        self._widen_shard(cur, rows)
+        first = self._next_id
+        cur.executemany(self._shard[3], [(first + i,) + row for i, row in enumerate(rows)])
+        self._next_id = first + len(rows)
+
+    def _apply(self, cur, etype, paylaod, ts):
+        # the raw event row itself is inserted by _write_batch
+        #dispatch to specific tables
+
+        if etype == "connection":
+            self.save_geoip(cur, paylaod, ts)
+        if etype == "auth_attempt":
+            self.save_auth_attempt(cur, paylaod, ts)
+        if etype == "command":
+            self.save_command(cur, paylaod, ts)
+        if etype == "session_end":
+            self.close_session(cur, paylaod, ts)
+        if etype == "payload":
+            self.save_payload(cur, paylaod, ts)
+
+
+    # Table writers below run on the writer thread, inside the batch transaction.
+    # ts is the event's time as a UTC "YYYY-MM-DD HH:MM:SS" string.
+    def save_auth_attempt(self, cur, p, ts):
+            cur.execute("""
+                INSERT INTO auth_attempts (session_id, src_ip, username, password, attempt_number, timestamp)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (p["session_id"], p["src_ip"], p["user"], p["pass"], p["attempt"], ts))
 
-    def save_auth_attempt(self, p):
-            conn = self._connect()
-            cur = conn.cursor()
+    def save_command(self, cur, p, ts):
             cur.execute("""
-                INSERT INTO auth_attempts (session_id, src_ip, username, password, attempt_number)
+                INSERT INTO commands (session_id, src_ip, username, command, timestamp)
                 VALUES (?, ?, ?, ?, ?)
-            """, (p["session_id"], p["src_ip"], p["user"], p["pass"], p["attempt"]))
-            conn.commit()
-            conn.close()
+            """, (p["session_id"], p["src_ip"], p["user"], p["command"], ts))
 
-    def save_command(self, p):
-            conn = self._connect()
-            cur = conn.cursor()
-            cur.execute("""
-                INSERT INTO commands (session_id, src_ip, username, command)
-                VALUES (?, ?, ?, ?)
-            """, (p["session_id"], p["src_ip"], p["user"], p["command"]))
-            conn.commit()
-            conn.close()
 
+    def save_payload(self, cur, p, ts):
+            # one payloads row per distinct content, one link per capture
+            cur.execute("""
+                INSERT INTO payloads (sha256, size, hits, first_seen, last_seen) VALUES (?, ?, 1, ?, ?)
+                ON CONFLICT(sha256) DO UPDATE SET hits = hits + 1,
+                    first_seen = min(first_seen, excluded.first_seen),
+                    last_seen = max(last_seen, excluded.last_seen)
+            """, (p["sha256"], p.get("size"), ts, ts))
+            cur.execute("""
+                INSERT INTO payload_links (sha256, session_id, src_ip, source, name, timestamp)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (p["sha256"], p.get("session_id"), p.get("src_ip"), p.get("source"), p.get("name"), ts))
 
-    def save_geoip(self, p):
-            if "geo" not in p: 
+    def save_geoip(self, cur, p, ts):
+            if "geo" not in p:
                 return
 
             geo = p["geo"]
-            conn = self._connect()
-            cur = conn.cursor()
 
             cur.execute("""
-                INSERT OR IGNORE INTO geoip (src_ip, country, city, lat, lon, asn, org)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
+                INSERT OR IGNORE INTO geoip (src_ip, country, city, lat, lon, asn, org, first_seen)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
             """, (
                 p["src_ip"],
                 geo.get("country"),
@@ -161,42 +676,32 @@ class SQLiteStorage:
                 geo.get("lat"),
                 geo.get("lon"),
                 geo.get("asn"),
-                geo.get("org")
+                geo.get("org"),
+                ts
             ))
 
-            conn.commit()
-            conn.close()
-
-
-    def close_session(self, p):
-            conn = self._connect()
-            cur = conn.cursor()
 
+    def close_session(self, cur, p, ts):
+            # the one sessions row, written at the end with the totals kept by the
+            # live session registry (handlers/sessions.py)
+            duration = p.get("duration") or 0.0
+            start = p.get("start_time", time.time() - duration)
             cur.execute("""
-                UPDATE sessions SET
-                    end_time = CURRENT_TIMESTAMP,
-                    duration = ?
-                WHERE session_id = ?
-            """, (p["duration"], p["session_id"]))
-
-            conn.commit()
-            conn.close()
-
-
-
-    def start_session(self, payload):
-            conn = self._connect()
-            cur = conn.cursor()
-
-            cur.execute("""
-                INSERT OR IGNORE INTO sessions (session_id, src_ip, src_port, username)
-                VALUES (?, ?, ?, ?)
+                INSERT OR REPLACE INTO sessions (session_id, proto, src_ip, src_port, username,
+                    start_time, end_time, duration, authenticated, auth_attempts, commands, bytes_in, bytes_out)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             """, (
-                payload["session_id"],
-                payload["src_ip"],
-                payload["src_port"],
-                payload.get("user", "")
+                p["session_id"],
+                p.get("proto"),
+                p.get("src_ip"),
+                p.get("src_port"),
+                p.get("user", ""),
+                format_ts(start),
+                format_ts(start + duration),
+                duration,
+                p.get("authenticated"),
+                p.get("attempts"),
+                p.get("commands"),
+                p.get("bytes_in"),
+                p.get("bytes_out")
             ))
-
-            conn.commit()
-            conn.close()
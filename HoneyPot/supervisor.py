@@ -0,0 +1,153 @@
+# supervisor.py
+"""
+Process supervisor for run_honeypot --workers N.
+
+Layout:
+- N worker processes, each running every configured listener. Listen sockets are
+  bound with SO_REUSEPORT so the kernel load-balances accepts across workers and
+  parsing / fake-shell emulation runs on N interpreters instead of one GIL.
+- One writer process that owns SQLite; workers send events to it over a queue.
+- This process: (re)starts crashed children and coordinates a clean shutdown.
+
+A child that keeps dying soon after it starts (a port it cannot bind, a database it
+cannot open) is restarted with exponential backoff, reset once it stays up for
+stable_after seconds; after max_failures such deaths in a row the supervisor gives up.
+"""
+import multiprocessing
+import signal
+import time
+
+from logger import get_logger
+
+log = get_logger("Supervisor")
+
+
+class Supervisor:
+    def __init__(self, workers, worker_target, writer_target, writer_args=(), queue_size=100000,
+                 restart_delay=1.0, max_restart_delay=60.0, stable_after=30.0, max_failures=8, verbose=True):
+        self.n_workers = int(workers)
+        self.worker_target = worker_target
+        self.writer_target = writer_target
+        self.writer_args = tuple(writer_args)
+        self.restart_delay = float(restart_delay)
+        self.max_restart_delay = float(max_restart_delay)
+        self.stable_after = float(stable_after)
+        self.max_failures = int(max_failures)
+        self.verbose = verbose
+
+        self.ctx = multiprocessing.get_context("fork")
+        self.queue = self.ctx.Queue(maxsize=int(queue_size))
+        self.workers = [None] * self.n_workers
+        self.writer = None
+        self.restarts = 0
+        # set when a child failed max_failures times in a row and the supervisor gave up
+        self.failed = False
+        self._stopping = False
+        # per slot ("writer" or a worker index): start time, quick deaths in a row, and
+        # when a dead child is due to be started again
+        self._started = {}
+        self._failures = {}
+        self._due = {}
+
+    # ---------------------------
+    # Children
+    # ---------------------------
+    def _start_writer(self):
+        self.writer = self.ctx.Process(target=self.writer_target, args=(self.queue,) + self.writer_args,
+                                       name="honeypot-writer")
+        self.writer.start()
+        self._started["writer"] = time.monotonic()
+
+    def _start_worker(self, index):
+        p = self.ctx.Process(target=self.worker_target, args=(index, self.queue),
+                             name=f"honeypot-worker-{index}")
+        p.start()
+        self.workers[index] = p
+        self._started[index] = time.monotonic()
+        if self.verbose:
+            log.info("Worker {index} started (pid {pid})", index=index, pid=p.pid)
+
+    def start(self):
+        self._start_writer()
+        for i in range(self.n_workers):
+            self._start_worker(i)
+
+    def check(self):
+        """Restart any child that exited (once its backoff is over) while we are not shutting down."""
+        if self._stopping:
+            return
+        now = time.monotonic()
+        if not self.writer.is_alive() and self._restart_due("writer", "Writer", self.writer, now):
+            self._start_writer()
+        for i, p in enumerate(self.workers):
+            if self._stopping:
+                return
+            if not p.is_alive() and self._restart_due(i, f"Worker {i}", p, now):
+                self._start_worker(i)
+
+    def _restart_due(self, slot, name, p, now):
+        """True when the dead child of slot should be started again now."""
+        due = self._due.get(slot)
+        if due is None:
+            # first check since it died
+            if now - self._started[slot] >= self.stable_after:
+                self._failures[slot] = 0
+            failures = self._failures[slot] = self._failures.get(slot, 0) + 1
+            if failures >= self.max_failures:
+                log.error("{name} (pid {pid}) exited with code {code}, {failures} times in a row within "
+                          "{stable:.0f}s of starting: giving up",
+                          name=name, pid=p.pid, code=p.exitcode, failures=failures, stable=self.stable_after)
+                self.failed = True
+                self._stopping = True
+                return False
+            delay = min(self.restart_delay * 2 ** (failures - 1), self.max_restart_delay)
+            log.error("{name} (pid {pid}) exited with code {code}, restarting in {delay:.1f}s",
+                      name=name, pid=p.pid, code=p.exitcode, delay=delay)
+            due = self._due[slot] = now + delay
+        if now < due:
+            return False
+        del self._due[slot]
+        self.restarts += 1
+        return True
+
+    # ---------------------------
+    # Main loop / shutdown
+    # ---------------------------
+    def _on_signal(self, signum, frame):
+        self._stopping = True
+
+    def run(self):
+        """Supervise until a signal (returns True) or until a child keeps failing (returns False)."""
+        signal.signal(signal.SIGTERM, self._on_signal)
+        signal.signal(signal.SIGINT, self._on_signal)
+        self.start()
+        try:
+            while not self._stopping:
+                time.sleep(min(self.restart_delay, 1.0))
+                self.check()
+        finally:
+            self.stop()
+        return not self.failed
+
+    def stop(self, timeout=10.0):
+        self._stopping = True
+        if self.verbose:
+            log.info("Stopping workers")
+        # workers first, so nothing new is queued while the writer drains
+        for p in self.workers:
+            if p is not None and p.is_alive():
+                p.terminate()
+        for p in self.workers:
+            if p is not None:
+                p.join(timeout)
+                if p.is_alive():
+                    p.kill()
+                    p.join()
+        if self.writer is not None and self.writer.is_alive():
+            self.queue.put(None)
+            self.writer.join(timeout)
+            if self.writer.is_alive():
+                self.writer.terminate()
+                self.writer.join()
+        if self.verbose:
+            log.info("All workers stopped")
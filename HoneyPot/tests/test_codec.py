@@ -0,0 +1,37 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage.codec import Decoder, Encoder, StringTable
+
+
+class InterningTest(unittest.TestCase):
+    def setUp(self):
+        self.strings = StringTable(limit=100)
+        self.encoder = Encoder(self.strings)
+        self.decoder = Decoder(lambda min_id: [(i, v) for i, v in self.strings.pending if i >= min_id])
+
+    def roundtrip(self, etype, payload):
+        self.assertEqual(self.decoder.decode(self.encoder.encode(etype, payload)), payload)
+
+    def test_password_spray_does_not_fill_the_table(self):
+        for i in range(500):
+            self.roundtrip("auth_attempt", {"proto": "ssh", "src_ip": f"198.51.100.{i % 250}", "src_port": 40000 + i,
+                                            "user": "root", "pass": f"pw{i}", "attempt": 1,
+                                            "session_id": f"s{i}", "success": False})
+        self.assertEqual(sorted(v for _, v in self.strings.pending), ["root", "ssh"])
+
+    def test_only_fixed_header_names_are_interned(self):
+        for i in range(200):
+            self.roundtrip("http_request", {"proto": "http", "src_ip": "203.0.113.9", "src_port": i, "method": "GET",
+                                            "path": f"/p{i}", "version": "HTTP/1.1",
+                                            "headers": {"Host": f"h{i}", "User-Agent": f"ua{i}", f"X-Rand-{i}": "1"},
+                                            "status": 404, "extra": {"k": i}})
+        self.assertEqual(sorted(v for _, v in self.strings.pending),
+                         ["GET", "HTTP/1.1", "Host", "User-Agent", "http"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from deception import BaseImage, PseudoFS
+from deception.fs_image import FSImage, write_image
+
+
+class FSImageTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix="honeypot-fsimage-")
+        self.path = os.path.join(self.dir, "image.bin")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_template_overrides_image_file_in_the_way(self):
+        # files where the default template needs the /var/www and /home/user directories
+        write_image([("/var/www", False, 0, 0, 0, b"not a dir", False),
+                     ("/home/user", False, 0, 0, 0, b"not a dir", False),
+                     ("/etc/motd", False, 0, 0, 0, b"hello\n", False)], self.path)
+        fs = PseudoFS(image=BaseImage.get(image_path=self.path))
+        self.assertIn("Under Construction", fs.read_text("/var/www/index.html"))
+        self.assertEqual(fs.read_text("/home/user/README.txt"), "Welcome to HoneyPot demo.\n")
+        self.assertEqual(fs.read_text("/etc/motd"), "hello\n")
+
+    def test_concurrent_first_access_shares_one_children_dict(self):
+        write_image([(f"/srv/d/f{i}", False, 0, 0, 0, b"x", False) for i in range(2000)], self.path)
+        for _ in range(20):
+            node = FSImage(self.path).root().children["srv"].children["d"]
+            seen, barrier = [], threading.Barrier(8)
+
+            def load():
+                barrier.wait()
+                seen.append(node.children)
+
+            threads = [threading.Thread(target=load) for _ in range(8)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            self.assertEqual(len({id(c) for c in seen}), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
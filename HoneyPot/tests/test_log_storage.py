@@ -0,0 +1,116 @@
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage.backends import create_storage
+
+
+def command(i):
+    return {"session_id": "s1", "src_ip": "192.0.2.1", "user": "root", "command": f"c{i}"}
+
+
+class LogStorageRestartTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix="honeypot-logstorage-")
+        self.cfg = {"backend": "log", "partition": None,
+                    "log": {"dir": os.path.join(self.dir, "eventlog"), "segment_age": 0.2}}
+        self.db_path = os.path.join(self.dir, "test.db")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def run_once(self, first, n=3):
+        s = create_storage(self.cfg, self.db_path)
+        try:
+            for i in range(first, first + n):
+                self.assertTrue(s.save_event("command", "192.0.2.1", 22, command(i)))
+            s.flush()
+            return s.query("SELECT command FROM commands ORDER BY id")
+        finally:
+            s.close()
+
+    def test_events_after_clean_restart_are_compacted(self):
+        self.assertEqual(self.run_once(0), [("c0",), ("c1",), ("c2",)])
+        # everything was compacted and deleted; the checkpoint of the first run remains
+        rows = self.run_once(3)
+        self.assertEqual([c for (c,) in rows], [f"c{i}" for i in range(6)])
+        s = create_storage(self.cfg, self.db_path)
+        try:
+            self.assertEqual(s.query("SELECT count(*) FROM events"), [(6,)])
+        finally:
+            s.close()
+
+    def test_failed_commit_keeps_the_segment(self):
+        self.cfg["log"]["compact_interval"] = 0.1
+        s = create_storage(self.cfg, self.db_path)
+        try:
+            insert, failures = s.db._insert_events, [1]
+
+            def flaky(cur, rows):
+                if failures:
+                    failures.pop()
+                    raise sqlite3.OperationalError("disk I/O error")
+                insert(cur, rows)
+
+            s.db._insert_events = flaky
+            for i in range(3):
+                s.save_event("command", "192.0.2.1", 22, command(i))
+            s.flush()
+            # the first pass was rolled back; the segment is retried, not deleted
+            self.assertEqual(s.db.commit_errors, 1)
+            s.flush()
+            self.assertEqual(s.query("SELECT count(*) FROM events"), [(3,)])
+            self.assertEqual(s.query("SELECT count(*) FROM commands"), [(3,)])
+            self.assertEqual(s.pending_segments(), 0)
+        finally:
+            s.close()
+
+    def test_rolled_back_chunk_is_not_written_twice(self):
+        # chunks of 4 events, SQLite batches of 2: a chunk used to span several transactions
+        self.cfg["batch_size"] = 2
+        self.cfg["log"].update(compact_interval=0.1, compact_chunk=4)
+        s = create_storage(self.cfg, self.db_path)
+        try:
+            insert, calls = s.db._insert_events, []
+
+            def flaky(cur, rows):
+                calls.append(len(rows))
+                # the second transaction fails once
+                if len(calls) == 2:
+                    raise sqlite3.OperationalError("disk I/O error")
+                insert(cur, rows)
+
+            s.db._insert_events = flaky
+            for i in range(5):
+                s.save_event("command", "192.0.2.1", 22, command(i))
+            s.flush()
+            s.flush()
+            self.assertEqual(s.db.commit_errors, 1)
+            self.assertEqual(s.query("SELECT command FROM commands ORDER BY id"), [(f"c{i}",) for i in range(5)])
+            self.assertEqual(s.query("SELECT count(*) FROM events"), [(5,)])
+        finally:
+            s.close()
+
+    def test_segment_left_by_a_crash_is_not_replayed(self):
+        remove = os.remove
+        os.remove = lambda path: None
+        try:
+            self.run_once(0)
+        finally:
+            os.remove = remove
+        s = create_storage(self.cfg, self.db_path)
+        try:
+            s.flush()
+            self.assertEqual(s.query("SELECT count(*) FROM commands"), [(3,)])
+            self.assertEqual(s.pending_segments(), 0)
+        finally:
+            s.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
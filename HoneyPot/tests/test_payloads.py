@@ -0,0 +1,163 @@
+import asyncio
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from handlers.ssh_handler import SSHHandler
+from storage.payloads import PayloadStore
+
+
+class PayloadStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix="honeypot-payloads-")
+        self.store = PayloadStore(os.path.join(self.dir, "payloads"), spill_size=16)
+
+    def tearDown(self):
+        self.store.flush()
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_disk_work_runs_on_the_writer_thread(self):
+        release, temps = threading.Event(), []
+        temp = self.store._temp
+        self.store._temp = lambda: temps.append(threading.current_thread()) or temp()
+        self.store._submit(release.wait)
+        # the writer thread is busy: capturing still returns at once
+        ref = self.store.put(b"x" * 100)
+        self.assertTrue(ref.new)
+        self.assertFalse(self.store.exists(ref.sha256))
+        release.set()
+        self.store.flush()
+        self.assertTrue(self.store.exists(ref.sha256))
+        self.assertTrue(temps)
+        self.assertNotIn(threading.current_thread(), temps)
+
+    def test_spilled_capture_is_stored_once(self):
+        data = bytes(range(256)) * 4
+        for _ in range(2):
+            w = self.store.writer()
+            for i in range(0, len(data), 100):
+                w.write(data[i:i + 100])
+            ref = w.close()
+        self.store.flush()
+        self.assertEqual(ref.sha256, hashlib.sha256(data).hexdigest())
+        self.assertFalse(ref.new)
+        with self.store.open(ref.sha256) as f:
+            self.assertEqual(f.read(), data)
+        stats = self.store.stats()
+        self.assertEqual((stats["stored"], stats["deduped"], stats["pending_bytes"]), (1, 1, 0))
+        self.assertEqual(os.listdir(os.path.join(self.store.root, "tmp")), [])
+
+    def fail_once(self, name):
+        real, calls = getattr(self.store, name), []
+
+        def flaky(*args):
+            if not calls:
+                calls.append(args)
+                raise OSError(28, "No space left on device")
+            return real(*args)
+        setattr(self.store, name, flaky)
+
+    def test_failed_commit_is_retried_by_the_next_capture(self):
+        self.fail_once("_place")
+        first = self.store.put(b"dropper")
+        self.store.flush()
+        self.assertFalse(self.store.exists(first.sha256))
+        self.assertEqual(os.listdir(os.path.join(self.store.root, "tmp")), [])
+        second = self.store.put(b"dropper")
+        self.store.flush()
+        self.assertTrue(second.new)
+        self.assertTrue(self.store.exists(second.sha256))
+
+    def test_failed_spill_is_retried_by_the_next_capture(self):
+        self.fail_once("_temp")
+        refs = []
+        for _ in range(2):
+            w = self.store.writer()
+            w.write(b"z" * 100)
+            refs.append(w.close())
+            self.store.flush()
+        self.assertEqual([r.new for r in refs], [True, True])
+        self.assertTrue(self.store.exists(refs[1].sha256))
+        self.assertEqual(self.store.stats()["stored"], 1)
+
+    def test_truncated_capture_is_flagged(self):
+        w = self.store.writer(max_size=10)
+        w.write(b"a" * 8)
+        w.write(b"b" * 8)
+        ref = w.close()
+        self.assertEqual((ref.size, ref.truncated), (10, True))
+        self.assertFalse(self.store.put(b"complete").truncated)
+
+    def test_aborted_capture_leaves_no_temp_file(self):
+        w = self.store.writer()
+        w.write(b"y" * 100)
+        w.abort()
+        self.store.flush()
+        self.assertEqual(os.listdir(os.path.join(self.store.root, "tmp")), [])
+        self.assertEqual(self.store.stats()["stored"], 0)
+
+
+class FakeWriter:
+    def __init__(self):
+        self.data = bytearray()
+
+    def write(self, data):
+        self.data += data
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        pass
+
+    async def wait_closed(self):
+        pass
+
+    def is_closing(self):
+        return False
+
+    def get_extra_info(self, name):
+        return ("192.0.2.1", 40000) if name == "peername" else None
+
+
+class ShellCaptureTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix="honeypot-payloads-")
+        self.handler = SSHHandler("127.0.0.1", 0, {}, None, verbose=False)
+        self.handler.payloads = PayloadStore(os.path.join(self.dir, "payloads"))
+        self.events = []
+        emit = self.handler.emit
+        self.handler.emit = lambda etype, payload: (self.events.append((etype, payload)), emit(etype, payload))
+
+    def tearDown(self):
+        self.handler.payloads.flush()
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def run_shell(self, lines):
+        async def session():
+            reader = asyncio.StreamReader()
+            reader.feed_data("".join(line + "\n" for line in lines).encode())
+            reader.feed_eof()
+            await self.handler.run_shell_session(reader, FakeWriter(), "192.0.2.1", 40000, "root", "s1")
+        asyncio.run(session())
+
+    def test_appended_file_is_captured_once_at_session_end(self):
+        self.run_shell(["echo one > /tmp/x", "echo two >> /tmp/x", "echo three >> /tmp/x"])
+        types = [etype for etype, _ in self.events]
+        self.assertEqual(types, ["command"] * 3 + ["payload", "session_end"])
+        payload = self.events[3][1]
+        self.assertEqual((payload["source"], payload["name"]), ("shell_write", "/tmp/x"))
+        self.handler.payloads.flush()
+        with self.handler.payloads.open(payload["sha256"]) as f:
+            self.assertEqual(f.read(), b"one\ntwo\nthree\n")
+        self.assertEqual(self.handler.payloads.stats()["stored"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
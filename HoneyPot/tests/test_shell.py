@@ -0,0 +1,65 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from deception import PseudoFS, run_command
+
+
+class PipelineTest(unittest.TestCase):
+    def setUp(self):
+        self.fs = PseudoFS()
+
+    def run_line(self, line):
+        return run_command(line, self.fs, latency=None)
+
+    def test_wc_counts_the_last_line_of_plain_handlers(self):
+        self.assertEqual(self.run_line("uname -a | wc -l"), ("1\n", True))
+        self.assertEqual(self.run_line("uname -a | grep Linux | wc -l"), ("1\n", True))
+        ps, _ = self.run_line("ps")
+        self.assertEqual(self.run_line("ps | wc -l"), (f"{ps.count(chr(10))}\n", True))
+        self.assertEqual(self.run_line("ps | head -2 | wc -l"), ("2\n", True))
+
+    def test_redirected_plain_output_is_terminated(self):
+        self.run_line("uname -a > /tmp/u")
+        self.assertTrue(self.fs.read_text("/tmp/u").endswith("\n"))
+        self.assertEqual(self.run_line("wc -l < /tmp/u"), ("1\n", True))
+
+    def test_unterminated_file_line_is_not_counted(self):
+        self.fs.write_file("/tmp/partial", "one\ntwo")
+        self.assertEqual(self.run_line("cat /tmp/partial | wc -l"), ("1\n", True))
+        self.assertEqual(self.run_line("wc -l < /tmp/partial"), ("1\n", True))
+
+    def test_failing_handler_output_goes_to_stderr(self):
+        self.assertEqual(self.run_line("cat /nonexistent | wc -l"),
+                         ("cat: /nonexistent: No such file or directory\n0\n", True))
+
+
+class QuotaTest(unittest.TestCase):
+    def setUp(self):
+        self.fs = PseudoFS(max_file_size=1000, quota=2500)
+
+    def run_line(self, line):
+        return run_command(line, self.fs, latency=None)
+
+    def test_appending_past_the_file_limit_fails(self):
+        self.fs.write_file("/tmp/a", "x" * 300 + "\n")
+        self.assertEqual(self.run_line("cat /tmp/a /tmp/a >> /tmp/a"), ("", True))
+        self.assertEqual(self.run_line("cat /tmp/a /tmp/a >> /tmp/a"),
+                         ("bash: cat: write error: No space left on device\n", False))
+        self.assertEqual(len(self.fs.read_text("/tmp/a")), 903)
+
+    def test_session_quota_counts_growth_across_files(self):
+        for name in "abc":
+            self.fs.write_file(f"/tmp/{name}", "y" * 800)
+        # shrinking a file gives nothing back
+        self.fs.write_file("/tmp/a", "")
+        self.fs.write_file("/tmp/b", "y" * 800)
+        self.assertEqual(self.run_line("echo " + "z" * 200 + " > /tmp/d"),
+                         ("bash: echo: write error: No space left on device\n", False))
+        self.assertEqual(self.fs.used, 2400)
+
+
+if __name__ == "__main__":
+    unittest.main()
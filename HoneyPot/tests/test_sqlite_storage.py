@@ -0,0 +1,35 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage.sqlite_storage import SQLiteStorage
+
+
+class MalformedEventTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix="honeypot-sqlite-")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_malformed_event_leaves_no_event_row(self):
+        for partition in (None, "day"):
+            s = SQLiteStorage(os.path.join(self.dir, f"{partition}.db"), partition=partition)
+            try:
+                s.save_event("command", "192.0.2.1", 22,
+                             {"session_id": "s1", "src_ip": "192.0.2.1", "user": "root", "command": "id"})
+                # no src_ip: the commands row can't be written
+                s.save_event("command", "192.0.2.1", 22, {"session_id": "s1", "user": "root", "command": "w"})
+                s.flush()
+                self.assertEqual(s.query("SELECT count(*) FROM events"), [(1,)])
+                self.assertEqual(s.query("SELECT count(*) FROM commands"), [(1,)])
+            finally:
+                s.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from supervisor import Supervisor
+
+
+def crashing_worker(index, queue):
+    sys.exit(3)
+
+
+def writer(queue):
+    while queue.get() is not None:
+        pass
+
+
+class BackoffTest(unittest.TestCase):
+    def test_gives_up_on_a_child_that_keeps_failing_at_startup(self):
+        sup = Supervisor(1, crashing_worker, writer, restart_delay=0.05, max_restart_delay=0.2,
+                         stable_after=30, max_failures=4, verbose=False)
+        start = time.monotonic()
+        self.assertFalse(sup.run())
+        elapsed = time.monotonic() - start
+        # three restarts, each waiting twice as long as the one before (0.05 + 0.1 + 0.2)
+        self.assertEqual(sup.restarts, 3)
+        self.assertGreaterEqual(elapsed, 0.35)
+        self.assertFalse(sup.writer.is_alive())
+
+    def test_backoff_resets_after_a_stable_run(self):
+        sup = Supervisor(1, crashing_worker, writer, restart_delay=0.05, stable_after=0, max_failures=2,
+                         verbose=False)
+        sup.start()
+        try:
+            for _ in range(100):
+                time.sleep(0.05)
+                sup.check()
+                if sup.restarts >= 3:
+                    break
+            self.assertGreaterEqual(sup.restarts, 3)
+            self.assertFalse(sup.failed)
+        finally:
+            sup.stop()
+
+
+if __name__ == "__main__":
+    unittest.main()
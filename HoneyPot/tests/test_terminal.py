@@ -0,0 +1,68 @@
+import asyncio
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from handlers.ssh_handler import SSHHandler
+from handlers.terminal import EOF, INTERRUPT, LINE, LineDiscipline
+
+
+class FakeWriter:
+    def __init__(self):
+        self.writes = []
+
+    def write(self, data):
+        self.writes.append(bytes(data))
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        pass
+
+    async def wait_closed(self):
+        pass
+
+
+class LineDisciplineTest(unittest.TestCase):
+    def test_each_event_carries_its_own_echo(self):
+        term = LineDiscipline()
+        term.feed(b"ls\r\nwho\x7fami\nsleep\x03\x04una")
+        self.assertEqual(list(term.events), [
+            (LINE, "ls", b"ls\r\n"),
+            (LINE, "whami", b"who\x08 \x08ami\r\n"),
+            (INTERRUPT, None, b"sleep^C"),
+            (EOF, None, b""),
+        ])
+        self.assertEqual(term.take_echo(), b"una")
+
+    def test_no_echo_while_disabled(self):
+        term = LineDiscipline(echo=False)
+        term.feed(b"secret\r\n")
+        self.assertEqual(list(term.events), [(LINE, "secret", b"")])
+
+
+class PastedScriptTest(unittest.TestCase):
+    def test_output_follows_the_echo_of_its_line(self):
+        handler = SSHHandler("127.0.0.1", 0, {"capture_files": False}, None, verbose=False)
+        writer = FakeWriter()
+
+        async def session():
+            reader = asyncio.StreamReader()
+            reader.feed_data(b"whoami\r\npwd\r\n\r\nexit\r\n")
+            reader.feed_eof()
+            await handler.run_shell_session(reader, writer, "192.0.2.1", 40000, "root", "s1")
+        asyncio.run(session())
+
+        prompt = b"root@honeypot:~$ "
+        self.assertEqual(b"".join(writer.writes), prompt
+                         + b"whoami\r\nroot\n\r\n" + prompt
+                         + b"pwd\r\n/home/user\n\r\n" + prompt
+                         + b"\r\n" + prompt
+                         + b"exit\r\nlogout\r\n")
+
+
+if __name__ == "__main__":
+    unittest.main()